@@ -0,0 +1,325 @@
+import sys
+import time
+
+import numpy as np
+
+
+def _kmeans(points, num_clusters, num_iterations=20, seed=0):
+    """
+    Plain Lloyd's k-means.
+
+    Returns:
+        Centroids of shape (num_clusters, dim) and the cluster of every point.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = points[rng.choice(len(points), num_clusters, replace=False)].copy()
+    point_norms = np.einsum('ij,ij->i', points, points)
+
+    for _ in range(num_iterations):
+        distances = point_norms[:, None] - 2 * points @ centroids.T + np.einsum('ij,ij->i', centroids, centroids)
+        assignment = distances.argmin(axis=1)
+
+        counts = np.bincount(assignment, minlength=num_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, points)
+
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        if empty.any():
+            # Restart empty clusters on the points furthest from their centroid
+            furthest = np.argsort(-distances[np.arange(len(points)), assignment])[:empty.sum()]
+            centroids[empty] = points[furthest]
+
+    distances = point_norms[:, None] - 2 * points @ centroids.T + np.einsum('ij,ij->i', centroids, centroids)
+    return centroids, distances.argmin(axis=1)
+
+
+class IVFIndex:
+    """
+    Inverted-file (IVF) index for maximum inner product search, in pure NumPy.
+
+    Vectors are grouped into num_lists clusters by k-means. A query scores the
+    cluster centroids, then only the vectors of the num_probe closest clusters,
+    so a search touches roughly num_probe / num_lists of the catalog.
+
+    Inner products are turned into Euclidean distances by appending
+    sqrt(max_norm^2 - |x|^2) to every vector (and 0 to the query), so the
+    clustering and the probe order are plain L2 k-means while the final
+    ranking stays exact inner products.
+    """
+
+    def __init__(self, vectors, num_lists=None, num_iterations=20, seed=0):
+        """
+        Args:
+            vectors: Array of shape (num_vectors, dim).
+            num_lists (int): Number of clusters; defaults to about sqrt(num_vectors).
+            num_iterations (int): k-means iterations.
+            seed (int): Seed of the k-means initialization.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if num_lists is None:
+            num_lists = int(round(np.sqrt(len(vectors))))
+        num_lists = max(1, min(num_lists, len(vectors)))
+
+        norms = np.einsum('ij,ij->i', vectors, vectors)
+        extra = np.sqrt(np.maximum(norms.max() - norms, 0))
+        centroids, assignment = _kmeans(np.hstack([vectors, extra[:, None]]), num_lists, num_iterations, seed)
+
+        # Vectors stored grouped by list; list l is ids[offsets[l]:offsets[l + 1]]
+        order = np.argsort(assignment, kind='stable')
+        self.ids = order.astype(np.intp)
+        self.vectors = vectors[order]
+        self.offsets = np.zeros(num_lists + 1, dtype=np.intp)
+        np.cumsum(np.bincount(assignment, minlength=num_lists), out=self.offsets[1:])
+
+        # Distance from a query [q, 0] to centroid c is |q|^2 - 2 q.c[:dim] + |c|^2
+        self.centroids = np.ascontiguousarray(centroids[:, :-1])
+        self.centroid_norms = np.einsum('ij,ij->i', centroids, centroids)
+
+    @property
+    def num_lists(self):
+        return len(self.centroids)
+
+    def with_vectors(self, vectors):
+        """
+        Same lists over updated vectors (same count and order), without re-clustering.
+
+        Meant for small updates such as online training steps; results stay
+        exactly ranked, only the probe order may drift from the best one.
+        """
+        index = object.__new__(IVFIndex)
+        index.__dict__.update(self.__dict__)
+        index.vectors = np.ascontiguousarray(vectors, dtype=np.float32)[self.ids]
+        return index
+
+    def search(self, query, k, num_probe=None, mask=None):
+        """
+        Find the vectors with the largest inner product with a query.
+
+        Args:
+            query: Array of shape (dim,).
+            k (int): Number of results.
+            num_probe (int): Number of lists to scan; defaults to an eighth of them.
+            mask: Optional boolean array over vector ids; only ids where it is
+                True are returned. num_probe is scaled up by the share of
+                vectors the mask removes, so about as many allowed vectors are
+                scored as without a mask, and lists keep being probed until k
+                allowed vectors have been seen.
+
+        Returns:
+            Arrays of ids and inner products, best first (fewer than k if fewer
+            vectors are allowed).
+        """
+        query = np.asarray(query, dtype=np.float32)
+        if num_probe is None:
+            num_probe = max(1, self.num_lists // 8)
+        if mask is not None:
+            allowed = max(np.count_nonzero(mask), 1)
+            num_probe = min(self.num_lists, int(np.ceil(num_probe * len(mask) / allowed)))
+
+        list_order = np.argsort(self.centroid_norms - 2 * self.centroids @ query)
+
+        blocks, found = [], 0
+        for probed, list_id in enumerate(list_order):
+            if probed >= num_probe and found >= k:
+                break
+            start, stop = self.offsets[list_id], self.offsets[list_id + 1]
+            positions = np.arange(start, stop)
+            if mask is not None:
+                positions = positions[mask[self.ids[start:stop]]]
+            blocks.append(positions)
+            found += len(positions)
+
+        positions = np.concatenate(blocks) if blocks else np.empty(0, dtype=np.intp)
+        return _top_k(self.ids[positions], self.vectors[positions] @ query, k)
+
+
+def _top_k(ids, scores, k):
+    """The k highest scores and their ids, best first."""
+    if len(scores) > k:
+        best = np.argpartition(-scores, k - 1)[:k]
+        ids, scores = ids[best], scores[best]
+    order = np.argsort(-scores, kind='stable')
+    return ids[order], scores[order]
+
+
+def brute_force_search(vectors, query, k, mask=None):
+    """Exact counterpart of IVFIndex.search, scoring every (allowed) vector."""
+    ids = np.arange(len(vectors)) if mask is None else np.flatnonzero(mask)
+    return _top_k(ids, vectors[ids] @ np.asarray(query, dtype=np.float32), k)
+
+
+def recall_at_k(index, vectors, queries, k, num_probe=None, masks=None):
+    """
+    Mean share of the exact top-k found by the index.
+
+    Args:
+        index: IVFIndex built over vectors.
+        vectors: The indexed vectors.
+        queries: Array of shape (num_queries, dim).
+        k (int): Number of results per query.
+        num_probe (int): As in IVFIndex.search.
+        masks: Optional list of filter masks, one per query.
+
+    Returns:
+        Recall@k in [0, 1].
+    """
+    recalls = []
+    for position, query in enumerate(queries):
+        mask = masks[position] if masks is not None else None
+        exact, _ = brute_force_search(vectors, query, k, mask)
+        if len(exact) == 0:
+            continue
+        found, _ = index.search(query, k, num_probe, mask)
+        recalls.append(len(np.intersect1d(exact, found)) / len(exact))
+    return float(np.mean(recalls)) if recalls else 1.0
+
+
+class CandidateRetriever:
+    """
+    Top-N CF candidates of a user over the whole catalog, with optional filters.
+
+    The CF model predicts dot(user_vec, place_vec) + user_bias + place_bias.
+    The place bias is folded into the indexed vectors as an extra dimension
+    (queried with a 1), so the inner product search ranks places exactly by
+    predicted rating; the user bias does not change the order and is added
+    back to the returned scores.
+
+    City and category filters are resolved through the PlaceIndex and price
+    through the catalog, into a mask over the embedding rows. Filters that
+    leave only a few places are searched exhaustively, which is exact and
+    cheaper than probing lists that are mostly filtered out.
+    """
+
+    def __init__(self, scorer, places, place_index, place_id_to_index, num_lists=None,
+                 num_probe=None, exhaustive_below=4096):
+        """
+        Args:
+            scorer: EmbeddingScorer holding the CF embedding tables.
+            places: Catalog DataFrame with Place_Id and Price columns, the one
+                place_index was built on (e.g. merged_final).
+            place_index: PlaceIndex over places.
+            place_id_to_index: Place_Id -> embedding row of the CF model.
+            num_lists, num_probe: IVF settings (see IVFIndex).
+            exhaustive_below (int): Filters allowing fewer places than this are
+                searched exhaustively.
+        """
+        self.scorer = scorer
+        self.place_index = place_index
+        self.num_probe = num_probe
+        self.exhaustive_below = exhaustive_below
+
+        self.vectors = np.hstack([scorer.place_embeddings, scorer.place_bias[:, None]])
+        self.index = IVFIndex(self.vectors, num_lists)
+
+        # Embedding row of every catalog row (-1 if the model has no embedding for it)
+        self.embedding_rows = np.array([place_id_to_index.get(place_id, -1) for place_id in places['Place_Id']],
+                                       dtype=np.intp)
+        self.embedding_rows[self.embedding_rows >= scorer.num_places] = -1
+        self.prices = places['Price'].to_numpy(dtype=float)
+        self.place_ids = np.empty(scorer.num_places, dtype=places['Place_Id'].dtype)
+        known = self.embedding_rows >= 0
+        self.place_ids[self.embedding_rows[known]] = places['Place_Id'].to_numpy()[known]
+
+        # Embedding rows without a catalog entry are never returned
+        self.in_catalog = np.zeros(scorer.num_places, dtype=bool)
+        self.in_catalog[self.embedding_rows[known]] = True
+
+    def with_scorer(self, scorer):
+        """
+        Retriever over the updated tables of a scorer with the same places.
+
+        The IVF lists are reused, so this is cheap enough to run on every
+        online update.
+        """
+        if scorer.num_places != self.scorer.num_places:
+            raise ValueError("Scorer has a different number of places")
+
+        retriever = object.__new__(CandidateRetriever)
+        retriever.__dict__.update(self.__dict__)
+        retriever.scorer = scorer
+        retriever.vectors = np.hstack([scorer.place_embeddings, scorer.place_bias[:, None]])
+        retriever.index = self.index.with_vectors(retriever.vectors)
+        return retriever
+
+    def filter_mask(self, city=None, categories=None, max_price=None):
+        """Mask over embedding rows of the catalog places passing the filters."""
+        if not city and not categories and max_price is None:
+            return self.in_catalog
+
+        rows = self.place_index.lookup(city, categories)
+        if max_price is not None:
+            rows = rows[self.prices[rows] <= max_price]
+        embedding_rows = self.embedding_rows[rows]
+
+        mask = np.zeros(self.scorer.num_places, dtype=bool)
+        mask[embedding_rows[embedding_rows >= 0]] = True
+        return mask
+
+    def retrieve(self, user_index, k=20, city=None, categories=None, max_price=None, num_probe=None):
+        """
+        Best-rated places for a user.
+
+        Args:
+            user_index: Row of the user in the CF user embedding table.
+            k (int): Number of places to return.
+            city (str): City name, matched like filter_places (optional).
+            categories: List of categories to keep (optional).
+            max_price (float): Highest ticket price to keep (optional).
+            num_probe (int): Overrides the IVF num_probe of this retriever.
+
+        Returns:
+            Arrays of Place_Id and predicted CF ratings, best first.
+        """
+        mask = self.filter_mask(city, categories, max_price)
+        query = np.append(self.scorer.user_embeddings[user_index], np.float32(1))
+
+        if np.count_nonzero(mask) < self.exhaustive_below:
+            rows, scores = brute_force_search(self.vectors, query, k, mask)
+        else:
+            rows, scores = self.index.search(query, k, num_probe or self.num_probe, mask)
+
+        return self.place_ids[rows], scores + self.scorer.user_bias[user_index]
+
+
+if __name__ == '__main__':
+    # Recall and latency of the IVF index against brute force on the CF place
+    # embeddings:  python ann_index.py [num_places]
+    # With num_places, the catalog is enlarged with jittered copies of the
+    # embeddings to see how the index scales.
+    from context import ServingContext
+
+    ctx = ServingContext()
+    retriever = ctx.candidate_retriever
+    vectors = retriever.vectors
+    queries = np.hstack([ctx.cf_scorer.user_embeddings, np.ones((ctx.cf_scorer.num_users, 1), dtype=np.float32)])
+
+    if len(sys.argv) > 1:
+        rng = np.random.default_rng(0)
+        copies = rng.choice(len(vectors), int(sys.argv[1]))
+        vectors = vectors[copies] + rng.normal(0, vectors.std() / 2, (len(copies), vectors.shape[1])).astype(np.float32)
+
+    index = IVFIndex(vectors)
+    k = 10
+    print(f"{len(vectors)} places, {index.num_lists} lists, k={k}")
+
+    start = time.perf_counter()
+    for query in queries:
+        brute_force_search(vectors, query, k)
+    exact_ms = (time.perf_counter() - start) / len(queries) * 1000
+    print(f"brute force: {exact_ms:.3f} ms/query")
+
+    for num_probe in [2 ** power for power in range(int(np.log2(index.num_lists)))]:
+        start = time.perf_counter()
+        for query in queries:
+            index.search(query, k, num_probe)
+        ivf_ms = (time.perf_counter() - start) / len(queries) * 1000
+        recall = recall_at_k(index, vectors, queries, k, num_probe)
+        print(f"num_probe={num_probe:4d}: recall@{k}={recall:.3f}  {ivf_ms:.3f} ms/query")
+
+    if len(sys.argv) == 1:
+        # Filtered search: one city
+        for city in ctx.place_index.by_city:
+            masks = [retriever.filter_mask(city=city)] * len(queries)
+            recall = recall_at_k(retriever.index, retriever.vectors, queries, k, masks=masks)
+            print(f"city={city}: recall@{k}={recall:.3f}")
@@ -1,185 +1,110 @@
 import pandas as pd
 import numpy as np
-import tensorflow as tf
-from tensorflow.keras.layers import Input, Embedding, Flatten, Dot, Dense, Add
-from tensorflow.keras.models import Model, load_model
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.metrics import mean_squared_error
-import googlemaps
+import hmac
+import logging
 import math
+import os
+import threading
+import time
 
-train = 0
+from flask import Blueprint, Flask, Response, g, has_app_context, request, jsonify, stream_with_context
+from werkzeug.exceptions import HTTPException
 
-# Load dataset
-place = pd.read_csv('Data/tourism_with_id.csv')
-rating = pd.read_csv('Data/tourism_rating.csv')
-user = pd.read_csv('Data/user.csv')
-data_image = pd.read_csv('Data/tourism_data_img.csv')
+from flight_index import parse_departure_time
+from itinerary import plan_itinerary, plan_optimized_itinerary
+from metrics import (REGISTRY, REQUEST_SECONDS, REQUESTS, RequestProfiler, end_trace, observe_candidates, span,
+                     start_trace)
+from online_updates import RATING_MAX, RATING_MIN, OnlineUpdater, RatingLog
+from ranking import RankingWeights
+from registry import ContextRegistry
+from response_format import build_response, compress, dumps, parse_response_options
+from result_cache import ResultCache
 
-# Ensure that the 'Place_Ratings' and 'Rating' columns are numeric
-rating['Place_Ratings'] = pd.to_numeric(rating['Place_Ratings'], errors='coerce')  # Convert to numeric, coercing errors to NaN
-place['Rating'] = pd.to_numeric(place['Rating'], errors='coerce')  # Similarly for place['Rating']
+logger = logging.getLogger(__name__)
 
-# Calculate the median 'Time_Minutes' for each location
-city_median = place.groupby('City')['Time_Minutes'].median()
+# Weights of the hybrid ranking score, e.g. RANKING_WEIGHTS="cf=2,distance=0.25" (see RankingWeights)
+ranking_weights = RankingWeights.from_spec(os.environ.get('RANKING_WEIGHTS'))
 
-# Check if there are any missing 'City' values
-missing_cities = place[place['City'].isnull()]
-if not missing_cities.empty:
-    print(f"Warning: There are missing 'City' values in the 'place' dataset:\n{missing_cities}")
-
-# Fill in the blank value based on the median location
-place['Time_Minutes'] = place.apply(
-    lambda row: city_median.get(row['City'], row['Time_Minutes']) if pd.isnull(row['Time_Minutes']) else row['Time_Minutes'],
-    axis=1
-)
-
-# Combining the dataset
-rating = pd.read_csv('Data/tourism_rating.csv')
-merge_data = pd.merge(rating, place[['Place_Id', 'Rating', 'Place_Name', 'Description', 'Category', 'City', 'Price', 'Time_Minutes', 'Coordinate', 'Lat', 'Long']], on='Place_Id', how='left')
-
-# Calculate the mean rating for each place
-merge_data = merge_data.groupby('Place_Id').agg(
-    Mean_Rating=('Place_Ratings', 'mean'),
-    Rating=('Rating', 'first'),
-    Place_Name=('Place_Name', 'first'),
-    Description=('Description', 'first'),
-    Category=('Category', 'first'),
-    City=('City', 'first'),
-    Price=('Price', 'first'),
-    Time_Minutes=('Time_Minutes', 'first'),
-    Coordinate=('Coordinate', 'first'),
-    Lat=('Lat', 'first'),
-    Long=('Long', 'first')
-).reset_index()
-
-merged_final = pd.merge(
-    merge_data,
-    data_image[['Place_Id', 'image_url']],  # Include only relevant columns from data_image
-    on='Place_Id',  # Column to merge on
-    how='left'      # Use 'left' to keep all rows from merge_data
-)
-
-# Display the first few rows of the 'place' dataframe
-print(place.head())
-
-user_ids = rating['User_Id'].unique().tolist()
-place_ids = place['Place_Id'].unique().tolist()
-
-user_id_to_index = {user_id: index for index, user_id in enumerate(user_ids)}
-place_id_to_index = {place_id: index for index, place_id in enumerate(place_ids)}
-
-rating['User_Index'] = rating['User_Id'].map(user_id_to_index)
-rating['Place_Index'] = rating['Place_Id'].map(place_id_to_index)
-
-num_users = len(user_ids)
-num_places = len(place_ids)
-embedding_size = 50
-
-user_input = Input(shape=(1,))
-user_embedding = Embedding(num_users, embedding_size, embeddings_regularizer=tf.keras.regularizers.l2(1e-6))(user_input)
-user_vec = Flatten()(user_embedding)
-
-place_input = Input(shape=(1,))
-place_embedding = Embedding(num_places, embedding_size, embeddings_regularizer=tf.keras.regularizers.l2(1e-6))(place_input)
-place_vec = Flatten()(place_embedding)
-
-dot_product = Dot(axes=1)([user_vec, place_vec])
-
-# Add bias terms for users and places
-user_bias = Embedding(num_users, 1)(user_input)
-user_bias = Flatten()(user_bias)
+def get_context_version():
+    """
+    The registry version to serve from: the one bound to the current request
+    when it started, or the current one outside requests.
+    """
+    if has_app_context():
+        version = g.get('context_version')
+        if version is not None:
+            return version
+    return registry.current
 
-place_bias = Embedding(num_places, 1)(place_input)
-place_bias = Flatten()(place_bias)
+def get_context():
+    """The ServingContext to serve from (see get_context_version)."""
+    return get_context_version().context
 
-prediction = Add()([dot_product, user_bias, place_bias])
+def scorable_places(place_ids, place_id_to_index, num_places):
+    """
+    Find the places the CF model has an embedding row for.
 
-cf_model = Model([user_input, place_input], prediction)
-cf_model.compile(optimizer='adam', loss='mean_squared_error')
+    The id map is built from the catalog, which can hold more places than the
+    model was trained on, so a mapped row is only valid below num_places.
 
-def load_or_train_cf_model():
-    model_path = 'Model/cf_model.h5'
-    
-    try:
-        # Try loading the pre-trained model
-        cf_model = load_model(model_path)
-    except:
-        # If model does not exist, train it
-        print("Model not found, training a new model...")
-        cf_model.fit(
-            [rating['User_Index'], rating['Place_Index']],
-            rating['Place_Ratings'],
-            epochs=20,
-            verbose=1
-        )
-        # Save the model after training
-        cf_model.save(model_path)  # Save the model for future use
-    return cf_model
+    Returns:
+        The positions in place_ids of the scorable places, and their rows.
+    """
+    rows = np.array([place_id_to_index.get(place_id, -1) for place_id in place_ids], dtype=np.intp)
+    positions = np.flatnonzero((rows >= 0) & (rows < num_places))
+    return positions, rows[positions]
 
 def predict_ratings(user_id, place_ids):
-    user_index = user_id_to_index[user_id]
-    place_indices = [place_id_to_index[place_id] for place_id in place_ids if place_id in place_id_to_index]
-    predictions = cf_model.predict([np.array([user_index] * len(place_indices)), np.array(place_indices)])
-    return predictions.flatten()
-
-# Vectorizer di luar fungsi, dapat digunakan di berbagai bagian
-vectorizer = TfidfVectorizer(stop_words='english')
+    """
+    Predict the ratings of an existing user for places.
 
-# Cosine similarity di tingkat global, belum dihitung
-cosine_sim = None
+    Returns:
+        A float array aligned with place_ids, NaN for places the CF model
+        cannot score (the ranker falls back to their popularity).
+    """
+    ctx = get_context()
+    scorer, user_id_to_index = ctx.cf_model()
+    positions, place_rows = scorable_places(place_ids, ctx.place_id_to_index, scorer.num_places)
+    ratings = np.full(len(place_ids), np.nan, dtype=np.float32)
+    ratings[positions] = scorer.score(user_id_to_index[user_id], place_rows)
+    return ratings
+
+def predict_ratings_batch(user_ids, place_ids):
+    """Predict ratings of several existing users for the same places, as a (users, places) array (see predict_ratings)."""
+    ctx = get_context()
+    scorer, user_id_to_index = ctx.cf_model()
+    user_indices = [user_id_to_index[user_id] for user_id in user_ids]
+    positions, place_rows = scorable_places(place_ids, ctx.place_id_to_index, scorer.num_places)
+    ratings = np.full((len(user_ids), len(place_ids)), np.nan, dtype=np.float32)
+    ratings[:, positions] = scorer.score_batch(user_indices, place_rows)
+    return ratings
 
 def calculate_cbf_scores(filtered_places):
     """
     Calculate content-based filtering (CBF) scores for the places based on categories or descriptions.
 
+    Similarities come from the precomputed CBF index, sliced to the places in
+    filtered_places, so nothing is vectorized at request time.
+
     Args:
         filtered_places: DataFrame of places to filter based on categories.
 
     Returns:
         A DataFrame of places with their CBF scores and other relevant details.
     """
-    global cosine_sim  # Menyatakan bahwa cosine_sim adalah variabel global
-
     # Check if filtered_places is empty
     if filtered_places.empty:
-        print("Warning: No places found after filtering!")
+        logger.debug("No places found after filtering")
         return pd.DataFrame(columns=['Place_Id', 'name', 'category', 'similarity_score'])
 
-    # Ensure 'Features' column creation works
-    filtered_places['Features'] = filtered_places['Place_Name'] + ' ' + filtered_places['Category']
-
-    try:
-        # Vektorisasi fitur menggunakan TF-IDF
-        tfidf_matrix = vectorizer.fit_transform(filtered_places['Features'])
-        cosine_sim = cosine_similarity(tfidf_matrix, tfidf_matrix)  # Hitung cosine similarity
-    except ValueError as e:
-        print(f"Error in vectorization: {e}")
-        print(f"Unique features: {filtered_places['Features'].unique()}")
-        return pd.DataFrame(columns=['Place_Id', 'name', 'category', 'similarity_score'])
-
-    # For each place, recommend places with highest similarity scores (top 10)
-    recommendations = []
-    for idx in range(len(filtered_places)):
-        num_similar = min(10, len(filtered_places))  # Avoid out-of-bounds indices
-        similar_indices = cosine_sim[idx].argsort()[-(num_similar -1):][::-1]  # Get top N similar places
-
-        for similar_idx in similar_indices:
-            if similar_idx != idx:  # Avoid recommending the same place
-                recommendations.append({
-                    'Place_Id': filtered_places.iloc[similar_idx]['Place_Id'],
-                    'name': filtered_places.iloc[similar_idx]['Place_Name'],
-                    'category': filtered_places.iloc[similar_idx]['Category'],
-                    'similarity_score': cosine_sim[idx][similar_idx]
-                })
+    # For each place, recommend places with highest similarity scores
+    recommendations = get_context().cbf_index.recommend(filtered_places)
 
     # If no recommendations found
-    if not recommendations:
-        print("No recommendations could be generated!")
-        return pd.DataFrame(columns=['Place_Id', 'name', 'category', 'similarity_score'])
+    if recommendations.empty:
+        logger.debug("No recommendations could be generated")
 
-    return pd.DataFrame(recommendations)
+    return recommendations
 
 # Function to calculate distance using Google Maps API
 def calculate_distance(start_lat, start_lng, end_lat, end_lng):
@@ -213,8 +138,8 @@ def calculate_distance(start_lat, start_lng, end_lat, end_lng):
         return distance_km, travel_time_minutes
 
     except Exception as e:
-        print(f"Error calculating distance between coordinates: ({start_lat}, {start_lng}) and ({end_lat}, {end_lng})")
-        print(f"Error details: {str(e)}")
+        logger.warning("Error calculating distance between coordinates (%s, %s) and (%s, %s): %s",
+                       start_lat, start_lng, end_lat, end_lng, e)
         return None
 
 def map_city_to_airport(city):
@@ -237,22 +162,30 @@ def map_city_to_airport(city):
     }
     return airport_mapping.get(city, city)
 
-flights_data = pd.read_csv('Data/flightsCapstone_cleaned.csv')
+def filter_flights(departure_city, destination_city, max_budget=None, limit=None, offset=0,
+                   departure_after=None, departure_before=None):
+    """
+    Flights between two cities, cheapest first.
 
-def filter_flights(departure_city, destination_city, max_budget=None):
+    Args:
+        departure_city (str): Departure city or airport name.
+        destination_city (str): Destination city or airport name.
+        max_budget (float): Highest price to include (if applicable).
+        limit (int): Maximum number of flights to return (if applicable).
+        offset (int): Number of matching flights to skip.
+        departure_after: Earliest departure_time to include (if applicable).
+        departure_before: Latest departure_time to include (if applicable).
+
+    Returns:
+        Filtered DataFrame of flights.
+    """
     # Convert city names to full airport names
     departure_airport = map_city_to_airport(departure_city)
     destination_airport = map_city_to_airport(destination_city)
 
-    filtered_flights = flights_data[
-        (flights_data['departure_airport_name'] == departure_airport) &
-        (flights_data['arrival_airport_name'] == destination_airport)
-    ]
-
-    if max_budget:
-        filtered_flights = filtered_flights[filtered_flights['price'] <= max_budget]
-
-    return filtered_flights.sort_values(by='price')
+    return get_context().flight_index.search(
+        departure_airport, destination_airport, max_budget, limit, offset, departure_after, departure_before
+    )
 
 def filter_places(city=None, categories=None):
     """
@@ -265,25 +198,193 @@ def filter_places(city=None, categories=None):
     Returns:
         Filtered DataFrame.
     """
-    print(f"Filtering places - City: {city}, Categories: {categories}")
+    logger.debug("Filtering places - City: %s, Categories: %s", city, categories)
 
-    filtered = merged_final.copy()
-    if city:
-        filtered = filtered[filtered['City'].str.contains(city, case=False, na=False)]
+    ctx = get_context()
+    filtered = ctx.merged_final.iloc[ctx.place_index.lookup(city, categories)]
 
-    if categories:
-        print(f"Categories before filtering: {filtered['Category'].unique()}")
-        filtered = filtered[filtered['Category'].isin(categories)]
-        print(f"Categories after filtering: {filtered['Category'].unique()}")
-        print(f"Number of places after category filtering: {len(filtered)}")
+    if categories and logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Categories after filtering: %s", filtered['Category'].unique())
+        logger.debug("Number of places after category filtering: %d", len(filtered))
 
     return filtered
 
+def recommend_flights(departure_city, destination_city, budget=None, departure_after=None, departure_before=None):
+    """Flights between the two cities, cheapest first, relaxing the budget if nothing fits."""
+    # Rekomendasi penerbangan
+    recommended_flights = pd.DataFrame()  # Default empty DataFrame
+    if departure_city and destination_city:
+      recommended_flights = filter_flights(
+          departure_city, destination_city, budget,
+          departure_after=departure_after, departure_before=departure_before
+      )
+
+      # If no flights found within budget, try without budget constraint
+      if recommended_flights.empty and budget:
+          recommended_flights = filter_flights(
+              departure_city, destination_city,
+              departure_after=departure_after, departure_before=departure_before
+          )
+
+    return recommended_flights
+
+def resolve_user_categories(user_id, user_city, user_exists):
+    """
+    Pick the categories to recommend from when the request does not name any.
+
+    Existing users get their most frequently rated categories, new users the
+    best-rated categories of the city.
+
+    Returns:
+        A list of categories.
+    """
+    if user_exists:
+        # Get the user's most frequently rated categories, precomputed by the profile store
+        user_categories = get_context().user_profiles.top_categories(user_id)
+        logger.debug("User's most frequent category: %s", user_categories)
+
+    else:
+        # Mean rating per category in the city, precomputed by the place index
+        category_ratings = get_context().place_index.category_ratings(user_city)
+        # Select top 3 categories with highest average ratings in the city
+        user_categories = category_ratings.head(3).index.tolist()
+
+        logger.debug("New user - selecting top-rated categories in %s:\n%s", user_city, category_ratings)
+        logger.debug("Selected categories: %s", user_categories)
+
+    return user_categories
+
+def add_cf_candidates(cbf_recommendations, user_id, user_city, count, budget=None):
+    """
+    Append the user's best CF-rated places in the city that the CBF step did not pick.
+
+    Candidates come from the ANN index over the CF place embeddings, so they
+    can be from any category of the city.
+
+    Args:
+        cbf_recommendations: DataFrame returned by calculate_cbf_scores.
+        user_id: Existing user known to the CF model.
+        user_city (str): City to retrieve from.
+        count (int): Number of places to add.
+        budget (float): Skip places whose ticket price exceeds it (if applicable).
+
+    Returns:
+        cbf_recommendations with up to count extra rows (similarity_score 0).
+    """
+    ctx = get_context()
+    picked = set(cbf_recommendations['Place_Id'])
+
+    retriever, user_id_to_index = ctx.cf_retriever()
+    place_ids, _ = retriever.retrieve(
+        user_id_to_index[user_id], count + len(picked), city=user_city, max_price=budget or None
+    )
+    place_ids = [place_id for place_id in place_ids if place_id not in picked][:count]
+    if not place_ids:
+        return cbf_recommendations
+
+    places = ctx.merged_final.set_index('Place_Id').loc[place_ids]
+    cf_candidates = pd.DataFrame({
+        'Place_Id': place_ids,
+        'name': places['Place_Name'].to_numpy(),
+        'category': places['Category'].to_numpy(),
+        'similarity_score': 0.0
+    })
+    return pd.concat([cbf_recommendations, cf_candidates], ignore_index=True)
+
+def fallback_cf_ratings(place_ids):
+    """Stand-in CF ratings for users the model has not seen: jittered global average ratings."""
+    merged_final = get_context().merged_final
+
+    # Calculate weighted global average ratings
+    global_avg_ratings = merged_final.groupby('Place_Id')['Rating'].mean()
+
+    return [
+        global_avg_ratings.get(pid, merged_final['Rating'].mean()) + np.random.uniform(-0.5, 0.5)
+        for pid in place_ids
+        ]
+
+def build_itineraries(cbf_recommendations, cf_recommendations, user_lat, user_lng,
+                      days=None, time=8, budget=None, optimize_route=False):
+    """
+    Rank the CBF/CF candidates and split them into daily itineraries.
+
+    Candidates are ordered by the hybrid ranker (CBF similarity, CF rating,
+    popularity and distance from the user, weighted by ranking_weights), and
+    the whole ranking is handed to the itinerary planner: a day ends by
+    looking for a place that still fits among all the remaining ones, so
+    cutting the ranking short can leave days emptier.
+
+    Args:
+        cbf_recommendations: DataFrame returned by calculate_cbf_scores.
+        cf_recommendations: DataFrame with Place_Id and cf_rating columns.
+        user_lat, user_lng, days, time, budget, optimize_route: As in
+            recommend_tourist_destinations.
+
+    Returns:
+        Recommended destinations for each day, total time used per day, total
+        budget spent per day, and the CBF/CF MSE.
+    """
+    ranker = get_context().ranker
+
+    # Step 4: Score every candidate place and put them in ranking order
+    ranking = ranker.rank(
+        cbf_recommendations['Place_Id'].to_numpy(),
+        cbf_recommendations['similarity_score'].to_numpy(),
+        cf_recommendations['Place_Id'].to_numpy(),
+        cf_recommendations['cf_rating'].to_numpy(),
+        user_lat, user_lng, ranking_weights
+        )
+
+    places = ranker.columns
+    rows = ranking.rows
+    combined_recommendations = pd.DataFrame({
+        'Place_Id': ranking.place_ids,
+        'name': places['Place_Name'][rows],
+        'category': places['Category'][rows],
+        'similarity_score': ranking.similarity,
+        'Rating': places['Rating'][rows],
+        'Time_Minutes': places['Time_Minutes'][rows],
+        'Price': places['Price'][rows],
+        'Lat': places['Lat'][rows],
+        'Long': places['Long'][rows],
+        'image_url': places['image_url'][rows],
+        'cf_rating': ranking.cf_ratings,
+        'mse': ranking.mse
+        })
+
+    # Step 5: Split the ranked places into daily itineraries
+    itinerary_args = (
+        ranker.lats[rows], ranker.lngs[rows], places['Time_Minutes'][rows], places['Price'][rows],
+        user_lat, user_lng, days, time, budget
+        )
+
+    if optimize_route:
+        place_distances = get_context().route_distances.pairwise(ranking.place_ids, ranker.lats[rows], ranker.lngs[rows])
+        day_plans, total_time_per_day, total_budget_per_day = plan_optimized_itinerary(
+            *itinerary_args, place_distances=place_distances
+            )
+    else:
+        day_plans, total_time_per_day, total_budget_per_day = plan_itinerary(*itinerary_args)
+
+    recommendations_per_day = []
+    for positions, distances, travel_times in day_plans:
+        day_recommendations_df = combined_recommendations.iloc[positions].copy()
+        day_recommendations_df['distance_km'] = distances
+        day_recommendations_df['travel_time'] = travel_times
+        recommendations_per_day.append(day_recommendations_df)
+
+    # MSE between the catalog ratings and the CF ratings of all candidates
+    mse = ranking.mean_mse
+
+    return recommendations_per_day, total_time_per_day, total_budget_per_day, mse
+
 # Tambahkan kode ini di dalam fungsi utama rekomendasi
 def recommend_tourist_destinations(
     user_id, user_lat, user_lng, user_city, user_categories,
     days=None, time=8, budget=None, is_new_user=False,
-    departure_city=None, destination_city=None
+    departure_city=None, destination_city=None,
+    optimize_route=False, departure_after=None, departure_before=None,
+    cf_candidates=0
 
     ):
 
@@ -300,236 +401,624 @@ def recommend_tourist_destinations(
         days: Number of days for splitting recommendations (if applicable).
         time (float): Fixed daily time limit set to 8 hours.
         budget (float): Budget preference for the user (if applicable).
+        optimize_route (bool): Order each day by nearest-neighbor + 2-opt routing
+            instead of following the ranking order.
+        departure_after, departure_before: Departure time window for the
+            recommended flights (if applicable).
+        cf_candidates (int): Number of places from anywhere in the city to add
+            to the CBF candidates by CF retrieval (existing users only).
 
     Returns:
         A list of recommended destinations for each day, total time used, and total budget spent.
     """
 
-    # Rekomendasi penerbangan
-    recommended_flights = pd.DataFrame()  # Default empty DataFrame
-    if departure_city and destination_city:
-      recommended_flights = filter_flights(departure_city, destination_city, budget)
+    with span('flights'):
+        recommended_flights = recommend_flights(departure_city, destination_city, budget, departure_after, departure_before)
 
-      # If no flights found within budget, try without budget constraint
-      if recommended_flights.empty and budget:
-          recommended_flights = filter_flights(departure_city, destination_city)
+    ctx = get_context()
 
     # Check if existing user
-    user_exists = user_id in rating['User_Id'].unique()
+    user_exists = ctx.user_profiles.exists(user_id)
 
     # Determine categories
     if user_categories is None:
-      if user_exists:
-        # Get user's past ratings
-        user_ratings = rating[rating['User_Id'] == user_id]
-
-        # Merge ratings with place data to get categories
-        user_rated_places = pd.merge(rating, merged_final[['Place_Id', 'Category']], on='Place_Id', how='left')
-
-        # Count category frequencies and sort
-        category_counts = user_rated_places['Category'].value_counts().reset_index()
-        category_counts.columns = ['Category', 'Frequency']
-
-        # Get the most frequent category
-        user_categories = category_counts.head(2)['Category'].tolist()
-        print(f"User's most frequent category: {user_categories}")
-
-      else:
-        city_places = merged_final[merged_final['City'].str.contains(user_city, case=False, na=False)]
-        # Group by category and calculate mean rating
-        category_ratings = city_places.groupby('Category')['Rating'].mean().sort_values(ascending=False)
-        # Select top 3 categories with highest average ratings in the city
-        user_categories = category_ratings.head(3).index.tolist()
-
-        print(f"New user - selecting top-rated categories in {user_city}:")
-        print(category_ratings)
-        print(f"Selected categories: {user_categories}")
+      user_categories = resolve_user_categories(user_id, user_city, user_exists)
 
     # Ensure category is a list
     if not isinstance(user_categories, list):
       user_categories = [user_categories]
 
-    print(f"Final categories: {user_categories}")
+    logger.debug("Final categories: %s", user_categories)
 
     # Step 1: Filter places based on city and categories (if provided)
-    filtered_places = filter_places(
-        city=user_city,
-        categories=user_categories
-        )
+    with span('filter'):
+        filtered_places = filter_places(
+            city=user_city,
+            categories=user_categories
+            )
+    observe_candidates('filter', len(filtered_places))
 
     # Step 2: Get Content-Based Filtering recommendations
-    cbf_recommendations = calculate_cbf_scores(filtered_places)
+    with span('cbf'):
+        cbf_recommendations = calculate_cbf_scores(filtered_places)
+    observe_candidates('cbf', len(cbf_recommendations))
 
     # Step 3: Get Collaborative Filtering recommendations
-    place_ids = cbf_recommendations['Place_Id'].unique()
+    with span('cf'):
+        has_cf = user_exists and user_id in ctx.user_id_to_index
+        if has_cf and cf_candidates:
+            cbf_recommendations = add_cf_candidates(cbf_recommendations, user_id, user_city, cf_candidates, budget)
 
-    if user_exists:
-        cf_recommendations = predict_ratings(user_id, place_ids)
+        place_ids = cbf_recommendations['Place_Id'].unique()
+
+        if has_cf:
+            cf_ratings = predict_ratings(user_id, place_ids)
+        else:
+            cf_ratings = fallback_cf_ratings(place_ids)
 
         # Convert to DataFrame
-        cf_recommendations = pd.DataFrame({'Place_Id': place_ids, 'cf_rating': cf_recommendations})
+        cf_recommendations = pd.DataFrame({'Place_Id': place_ids, 'cf_rating': cf_ratings})
+    observe_candidates('cf', len(place_ids))
 
-    else:
-        # Calculate weighted global average ratings
-        global_avg_ratings = merged_final.groupby('Place_Id')['Rating'].mean()
-
-        cf_recommendations = pd.DataFrame({
-            'Place_Id': place_ids,
-            'cf_rating': [
-                global_avg_ratings.get(pid, merged_final['Rating'].mean()) + np.random.uniform(-0.5, 0.5)
-                for pid in place_ids
-                ]
-        })
+    # Step 4 and 5: Combine recommendations and plan the days
+    with span('itinerary'):
+        recommendations_per_day, total_time_per_day, total_budget_per_day, mse = build_itineraries(
+            cbf_recommendations, cf_recommendations, user_lat, user_lng, days, time, budget, optimize_route
+            )
 
-    # Convert to DataFrame
-    cbf_recommendations = pd.DataFrame(cbf_recommendations)
+    return recommendations_per_day, total_time_per_day, total_budget_per_day, mse, recommended_flights
 
-    # Step 4: Combine recommendations
-    combined_recommendations = pd.merge(
-        cbf_recommendations,
-        merged_final[['Place_Id', 'Rating', 'Time_Minutes', 'Price', 'Lat', 'Long', 'image_url']],
-        on='Place_Id',
-        how='left'
-        )
-    combined_recommendations = pd.merge(
-        combined_recommendations,
-        cf_recommendations,
-        on='Place_Id',
-        how='left'
-        )
+def recommend_batch(payloads):
+    """
+    Recommend tourist destinations for many requests at once.
 
-    # Calculate MSE between CBF and CF recommendations
-    combined_recommendations['mse'] = (
-        combined_recommendations['Rating'] - combined_recommendations['cf_rating'])**2
+    Requests are grouped by city and categories, so filtering and CBF run
+    once per group, and the CF ratings of all existing users in a group are
+    scored with a single matrix multiply. Results are yielded as soon as their
+    group is done, so they do not come back in input order.
 
-    # Sort recommendations by MSE to prioritize consistent recommendations
-    combined_recommendations = combined_recommendations.sort_values('mse')
+    Args:
+        payloads: List of request dicts with the same keys as /recommend.
 
-    # Remove duplicates, if any
-    combined_recommendations = combined_recommendations.drop_duplicates(subset='Place_Id')
+    Yields:
+        (index, result) tuples, where index is the position of the request in
+        payloads and result is either the recommend_tourist_destinations tuple
+        or the exception raised while serving that request.
+    """
+    ctx = get_context()
+
+    groups = {}
+    for index, data in enumerate(payloads):
+        try:
+            params = parse_recommend_request(data)
+            user_exists = ctx.user_profiles.exists(params['user_id'])
+
+            user_categories = params['user_categories']
+            if user_categories is None:
+                user_categories = resolve_user_categories(params['user_id'], params['user_city'], user_exists)
+            if not isinstance(user_categories, list):
+                user_categories = [user_categories]
+
+            has_cf = user_exists and params['user_id'] in ctx.user_id_to_index
+            groups.setdefault((params['user_city'], tuple(user_categories)), []).append((index, params, has_cf))
+        except Exception as e:
+            yield index, e
+
+    for (user_city, user_categories), members in groups.items():
+        try:
+            # Shared candidate set for the whole group
+            with span('filter'):
+                filtered_places = filter_places(city=user_city, categories=list(user_categories))
+            observe_candidates('filter', len(filtered_places))
+            with span('cbf'):
+                cbf_recommendations = calculate_cbf_scores(filtered_places)
+            observe_candidates('cbf', len(cbf_recommendations))
+            place_ids = cbf_recommendations['Place_Id'].unique()
+        except Exception as e:
+            for index, _, _ in members:
+                yield index, e
+            continue
+
+        # One matrix multiply for every existing user in the group (users asking
+        # for CF candidates get their own candidate list, scored separately). If it
+        # fails, each user is scored on their own below, so an error only fails the
+        # requests it belongs to; new users do not need CF scores at all
+        existing_members = [params['user_id'] for _, params, has_cf in members
+                            if has_cf and not params['cf_candidates']]
+        cf_matrix = None
+        if existing_members:
+            try:
+                with span('cf'):
+                    cf_matrix = predict_ratings_batch(existing_members, place_ids)
+            except Exception:
+                logger.exception("Batch CF scoring failed, scoring %d users one at a time", len(existing_members))
+
+        cf_row = 0
+        for index, params, has_cf in members:
+            try:
+                member_cbf_recommendations, member_place_ids = cbf_recommendations, place_ids
+                with span('cf'):
+                    if has_cf and params['cf_candidates']:
+                        member_cbf_recommendations = add_cf_candidates(
+                            cbf_recommendations, params['user_id'], user_city, params['cf_candidates'], params['budget']
+                            )
+                        member_place_ids = member_cbf_recommendations['Place_Id'].unique()
+                        cf_ratings = predict_ratings(params['user_id'], member_place_ids)
+                    elif has_cf and cf_matrix is not None:
+                        cf_ratings = cf_matrix[cf_row]
+                        cf_row += 1
+                    elif has_cf:
+                        cf_ratings = predict_ratings(params['user_id'], place_ids)
+                    else:
+                        cf_ratings = fallback_cf_ratings(place_ids)
+                    cf_recommendations = pd.DataFrame({'Place_Id': member_place_ids, 'cf_rating': cf_ratings})
+                observe_candidates('cf', len(member_place_ids))
+
+                with span('itinerary'):
+                    recommendations_per_day, total_time_per_day, total_budget_per_day, mse = build_itineraries(
+                        member_cbf_recommendations, cf_recommendations, params['user_lat'], params['user_lng'],
+                        params['days'], params['time'], params['budget'], params['optimize_route']
+                        )
+                with span('flights'):
+                    recommended_flights = recommend_flights(
+                        params['departure_city'], params['destination_city'], params['budget'],
+                        params['departure_after'], params['departure_before']
+                        )
+                yield index, (recommendations_per_day, total_time_per_day, total_budget_per_day, mse, recommended_flights)
+            except Exception as e:
+                yield index, e
+
+def parse_recommend_request(data):
+    """
+    Extract the recommend_tourist_destinations arguments from a /recommend payload.
 
-    # Track recommendations per day
-    recommendations_per_day = []
-    total_time_per_day = []
-    total_budget_per_day = []
+    Raises:
+        ValueError: If the departure window or cf_candidates is malformed.
+    """
+    departure_after = parse_departure_time(data.get('departure_after'), 'departure_after')
+    departure_before = parse_departure_time(data.get('departure_before'), 'departure_before')
+    if departure_after is not None and departure_before is not None and departure_after > departure_before:
+        raise ValueError(f"'departure_after' ({departure_after}) is later than 'departure_before' ({departure_before})")
+
+    return {
+        'user_id': data.get('user_id'),
+        'user_lat': data.get('user_lat'),
+        'user_lng': data.get('user_lng'),
+        'user_city': data.get('user_city'),
+        'user_categories': data.get('user_categories'),
+        'days': data.get('days', None),
+        'time': data.get('time', 8),
+        'budget': data.get('budget', None),
+        'is_new_user': data.get('is_new_user', False),
+        'departure_city': data.get('departure_city', None),
+        'destination_city': data.get('destination_city', None),
+        'optimize_route': data.get('optimize_route', False),
+        'departure_after': departure_after,
+        'departure_before': departure_before,
+        'cf_candidates': int(data.get('cf_candidates', 0) or 0)
+    }
 
-    # Track visited places across days
-    visited_places = set()
+# recommend_tourist_destinations results, keyed on the normalized request parameters;
+# projection, pagination and encoding are applied per response
+result_cache = ResultCache(
+    max_size=int(os.environ.get('RESULT_CACHE_SIZE', 1024)),
+    ttl=float(os.environ.get('RESULT_CACHE_TTL', 300))
+)
 
-    if days:
-        for day in range(days):
-            day_recommendations = []
-            day_total_time = 0
-            day_total_budget = 0
+def recommendation_cache_key(data):
+    """
+    Build the result cache key of a /recommend payload.
 
-            # IMPORTANT: Reset to original starting point for each day
-            current_lat = user_lat
-            current_lng = user_lng
+    Parameters that do not change the result are dropped or normalized
+    (city case, category order, coordinate noise below ~1 m).
 
-            # Iterate through sorted recommendations
-            for _, place in combined_recommendations.iterrows():
-                # Skip if place has been visited in previous days
-                if place['Place_Id'] in visited_places:
-                    continue
+    Returns:
+        A hashable key, or None if the payload cannot be normalized (it is
+        then served without the cache).
+    """
+    try:
+        params = parse_recommend_request(data)
+
+        user_categories = params['user_categories']
+        if user_categories is not None:
+            if not isinstance(user_categories, list):
+                user_categories = [user_categories]
+            user_categories = tuple(sorted(user_categories))
+
+        user_city = params['user_city']
+        if isinstance(user_city, str):
+            user_city = user_city.lower()  # filter_places matches the city case-insensitively
+
+        key = (
+            get_context_version().number,  # Entries of an older version are never served after a reload
+            params['user_id'],
+            round(float(params['user_lat']), 5),
+            round(float(params['user_lng']), 5),
+            user_city,
+            user_categories,
+            params['days'],
+            float(params['time']),
+            float(params['budget']) if params['budget'] else None,
+            params['departure_city'],
+            params['destination_city'],
+            bool(params['optimize_route']),
+            params['departure_after'],
+            params['departure_before'],
+            params['cf_candidates']
+        )
+        hash(key)
+        return key
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
 
-                # Calculate distance from current location to this destination
-                distance_km, travel_time = calculate_distance(current_lat, current_lng, place['Lat'], place['Long'])
+def invalidate_recommendation_cache():
+    """Drop cached responses; call whenever the rating or place data is reloaded."""
+    result_cache.clear()
+
+# Ratings posted to /ratings, folded into the CF model by each process's online updater,
+# which checkpoints the updated model next to the log
+rating_log = RatingLog(os.environ.get('RATINGS_LOG', 'Data/ratings_log.ndjson'))
+online_checkpoint = os.environ.get('ONLINE_CHECKPOINT', os.path.splitext(rating_log.path)[0] + '.checkpoint.npz')
+online_updater = None
+
+def prepare_context(context):
+    """Replay the rating log into a reloaded context before it is published."""
+    if online_updater is not None:
+        online_updater.switch_to(context)
+
+def on_context_swap(old, new):
+    logger.info("Switched from version %d to %d", old.number, new.number)
+    invalidate_recommendation_cache()
+
+# Versions of the data and models; each request is served from the version
+# that was current when it started, even if a reload publishes a new one meanwhile
+registry = ContextRegistry(prepare=prepare_context, on_swap=on_context_swap)
+
+def start_registry_watcher():
+    """Reload when Data/ or Model/ artifacts change, polling every RELOAD_INTERVAL seconds (0 disables)."""
+    interval = float(os.environ.get('RELOAD_INTERVAL', 60))
+    if interval > 0:
+        registry.start_watcher(interval)
+
+def start_online_updater():
+    """Start the online updater of this process, once (in each worker when forked)."""
+    global online_updater
+    if online_updater is None:
+        online_updater = OnlineUpdater(
+            get_context(), rating_log,
+            interval=float(os.environ.get('ONLINE_UPDATE_INTERVAL', 60)),
+            on_update=invalidate_recommendation_cache,
+            checkpoint_path=online_checkpoint,
+            checkpoint_interval=float(os.environ.get('ONLINE_CHECKPOINT_INTERVAL', 300))
+        )
+        online_updater.start()
+    return online_updater
+
+def collect_serving_metrics():
+    """Result cache and online updater counters, for the /metrics registry."""
+    cache = result_cache.stats()
+    yield 'recommender_result_cache_hits_total', 'counter', 'Result cache hits.', {(): cache['hits']}
+    yield 'recommender_result_cache_misses_total', 'counter', 'Result cache misses.', {(): cache['misses']}
+    yield 'recommender_result_cache_evictions_total', 'counter', 'Result cache evictions.', {(): cache['evictions']}
+    yield 'recommender_result_cache_entries', 'gauge', 'Responses held by the result cache.', {(): cache['size']}
+
+    versions = registry.stats()
+    yield 'recommender_context_version', 'gauge', 'Version of the data and models being served.', {
+        (): versions['version']}
+    yield 'recommender_reloads_total', 'counter', 'Data and model reloads.', {
+        (('result', 'success'),): versions['reloads'], (('result', 'failure'),): versions['failed_reloads']}
+
+    if online_updater is not None:
+        updates = online_updater.stats()
+        yield 'recommender_ratings_applied_total', 'counter', 'Logged ratings folded into the CF model.', {
+            (): updates['applied']}
+        yield 'recommender_rating_log_offset_bytes', 'gauge', 'Position of the online updater in the rating log.', {
+            (): updates['log_offset']}
+
+REGISTRY.add_collector(collect_serving_metrics)
+
+# Opt-in: PROFILE_SAMPLE_RATE=0.01 profiles 1% of requests into PROFILE_DIR
+request_profiler = RequestProfiler(
+    sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', 0)),
+    output_dir=os.environ.get('PROFILE_DIR', 'profiles')
+)
 
-                # Calculate total time for this place (travel time + visit time in hours)
-                place_total_time = (place['Time_Minutes'] / 60) + (travel_time / 60)
+def parse_ratings(data):
+    """
+    Validate a /ratings payload.
 
-                # Check if adding this place would exceed 8-hour limit
-                if day_total_time + place_total_time > time:
-                    continue
+    Args:
+        data: A rating {"user_id", "place_id", "rating"}, a list of them, or
+            {"ratings": [...]}.
 
-                # Check budget constraint if provided
-                if budget and day_total_budget + place['Price'] > budget:
-                    continue
+    Returns:
+        A list of rating log entries.
 
-                # Add place to daily recommendations
-                place_with_distance = place.copy()
-                place_with_distance['distance_km'] = distance_km
-                place_with_distance['travel_time'] = travel_time
-                day_recommendations.append(place_with_distance)
+    Raises:
+        ValueError: If any rating is malformed or names an unknown place.
+    """
+    items = data['ratings'] if isinstance(data, dict) and 'ratings' in data else data
+    if isinstance(items, dict):
+        items = [items]
+    if not isinstance(items, list) or not items:
+        raise ValueError('Expected a rating or a list of ratings')
+
+    catalog = get_context().user_profiles.place_category  # Place_Id of every catalog place
+    entries = []
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError(f'Invalid rating: {item!r}')
+
+        user_id, place_id, rating = item.get('user_id'), item.get('place_id'), item.get('rating')
+        if not isinstance(user_id, (int, str)) or isinstance(user_id, bool):
+            raise ValueError(f'Invalid user_id: {user_id!r}')
+        if not isinstance(place_id, int) or place_id not in catalog:
+            raise ValueError(f'Unknown place_id: {place_id!r}')
+        if not isinstance(rating, (int, float)) or not RATING_MIN <= rating <= RATING_MAX:
+            raise ValueError(f'Rating must be between {RATING_MIN} and {RATING_MAX}, got {rating!r}')
+
+        entries.append({'user_id': user_id, 'place_id': place_id, 'rating': float(rating), 'time': time.time()})
+    return entries
+
+def format_recommendations(recommendations_per_day, total_time_per_day, total_budget_per_day, mse, recommended_flights):
+    """Convert recommend_tourist_destinations output to a JSON-serializable response with every field."""
+    return build_response(
+        (recommendations_per_day, total_time_per_day, total_budget_per_day, mse, recommended_flights)
+    )
+
+def json_response(body, status=200):
+    """Wrap an encoded JSON body, compressed with gzip or brotli if the client accepts it."""
+    with span('compress'):
+        body, content_encoding = compress(body, request.headers.get('Accept-Encoding'))
+
+    response = Response(body, status=status, content_type='application/json')
+    response.vary.add('Accept-Encoding')
+    if content_encoding is not None:
+        response.headers['Content-Encoding'] = content_encoding
+    return response
+
+api = Blueprint('api', __name__)
+
+@api.before_request
+def bind_context_version():
+    # Read once: the whole request, including a streamed body, uses this version
+    g.context_version = registry.current
+
+@api.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    g.profiler = request_profiler.start()
+    start_trace()
+
+@api.after_request
+def record_request_metrics(response):
+    """
+    Count the request, record its latency, and report its stage spans in a
+    Server-Timing header. Streamed responses (/recommend/batch) are counted
+    when streaming starts; their stages still reach the stage histograms.
+    """
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    elapsed = time.perf_counter() - g.request_start
+    REQUESTS.inc(endpoint, request.method, str(response.status_code))
+    REQUEST_SECONDS.observe(elapsed, endpoint)
+
+    spans = end_trace()
+    if spans:
+        response.headers['Server-Timing'] = ', '.join(f'{stage};dur={seconds * 1000:.2f}' for stage, seconds in spans)
+        logger.debug("%s %s %d in %.1f ms: %s", request.method, endpoint, response.status_code, elapsed * 1000,
+                     ' '.join(f'{stage}={seconds * 1000:.2f}ms' for stage, seconds in spans))
+    return response
+
+@api.errorhandler(HTTPException)
+def http_error(e):
+    # Errors raised by Flask itself (e.g. a body that is not JSON), in the shape of the endpoints' own errors
+    return jsonify({'error': e.description}), e.code
+
+@api.teardown_request
+def stop_request_profiler(exc=None):
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        path = request_profiler.stop(profiler, request.endpoint or 'unmatched')
+        logger.info("Wrote request profile to %s", path)
 
-                # Update tracking variables
-                day_total_time += place_total_time
-                day_total_budget += place['Price']
+# Define Flask routes
+@api.route('/recommend', methods=['POST'])
+def recommend():
+    """
+    Recommend daily itineraries and flights.
 
-                # Update current location for next distance calculation
-                current_lat = place['Lat']
-                current_lng = place['Long']
+    Besides the recommend_tourist_destinations parameters, the payload can
+    shape the response (see parse_response_options): `fields` and
+    `flight_fields` select columns, `limit` and `cursor` page through every
+    day and the flights together, and `format: "columnar"` returns one list
+    per column instead of one object per row.
+    """
+    try:
+        data = request.get_json()
+        if not isinstance(data, dict):
+            raise ValueError('Expected a JSON object')
+        options = parse_response_options(data)
 
-                # Mark place as visited
-                visited_places.add(place['Place_Id'])
+        # Extract parameters from the POST request
+        params = parse_recommend_request(data)
+    except HTTPException:
+        raise  # A body that is not JSON, answered by http_error
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-            # Convert to DataFrame
-            day_recommendations_df = pd.DataFrame(day_recommendations)
-            recommendations_per_day.append(day_recommendations_df)
-            total_time_per_day.append(day_total_time)
-            total_budget_per_day.append(day_total_budget)
+    try:
+        # Serve repeated requests from memory
+        cache_key = recommendation_cache_key(data)
+        result = result_cache.get(cache_key) if cache_key is not None else None
+        if result is None:
+            # Get recommendations
+            result = recommend_tourist_destinations(**params)
+            if cache_key is not None:
+                result_cache.put(cache_key, result)
 
-            # Calculate MSE
-            mse = combined_recommendations['mse'].mean()
+    except Exception as e:
+        logger.exception("Recommendation failed")
+        return jsonify({'error': str(e)}), 500
 
-    return recommendations_per_day, total_time_per_day, total_budget_per_day, mse, recommended_flights
+    try:
+        with span('serialize'):
+            body = dumps(build_response(result, **options))
+    except ValueError as e:  # Unknown fields
+        return jsonify({'error': str(e)}), 400
 
-from flask import Flask, request, jsonify
+    return json_response(body)
 
-app = Flask(__name__)
-port = "4000"
+@api.route('/recommend/batch', methods=['POST'])
+def recommend_batch_route():
+    """
+    Serve many /recommend payloads in one call.
 
+    Accepts a JSON list of payloads (or {"requests": [...]}) and streams one
+    JSON object per line (NDJSON), each tagged with the index of its payload.
+    Each payload can shape its own response like a /recommend payload.
+    """
+    data = request.get_json()
+    payloads = data.get('requests') if isinstance(data, dict) else data
+    if not isinstance(payloads, list):
+        return jsonify({'error': 'Expected a list of recommendation requests'}), 400
+
+    def encode_line(index, result, options):
+        with span('serialize'):
+            try:
+                if isinstance(result, Exception):
+                    raise result
+                line = {'index': index, **build_response(result, **options)}
+            except Exception as e:
+                line = {'index': index, 'error': str(e)}
+            return dumps(line) + b'\n'
+
+    def generate():
+        # Cached payloads are answered right away, the rest go through recommend_batch
+        misses = []
+        for index, data in enumerate(payloads):
+            try:
+                options = parse_response_options(data)
+            except Exception as e:
+                yield encode_line(index, e, None)
+                continue
+
+            cache_key = recommendation_cache_key(data)
+            result = result_cache.get(cache_key) if cache_key is not None else None
+            if result is not None:
+                yield encode_line(index, result, options)
+            else:
+                misses.append((index, data, cache_key, options))
+
+        for position, result in recommend_batch([data for _, data, _, _ in misses]):
+            index, _, cache_key, options = misses[position]
+            if cache_key is not None and not isinstance(result, Exception):
+                result_cache.put(cache_key, result)
+            yield encode_line(index, result, options)
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@api.route('/ratings', methods=['POST'])
+def ingest_ratings():
+    """
+    Record new ratings.
 
-# ... Update inbound traffic via APIs to use the public-facing ngrok URL
+    They are appended to the rating log and picked up by the online updater,
+    which folds them into the CF model and the user profiles within seconds.
+    """
+    try:
+        entries = parse_ratings(request.get_json())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
+    log_offset = rating_log.append(entries)
+    start_online_updater().notify()
+    return jsonify({'accepted': len(entries), 'log_offset': log_offset}), 202
 
-# Define Flask routes
-@app.route('/recommend', methods=['POST'])
-def recommend():
-    try:
-        data = request.get_json()
+@api.route('/ratings/stats', methods=['GET'])
+def rating_stats():
+    """Progress of this process's online updater through the rating log."""
+    return jsonify(start_online_updater().stats()), 200
 
-        # Extract parameters from the POST request
-        user_id = data.get('user_id')
-        user_lat = data.get('user_lat')
-        user_lng = data.get('user_lng')
-        user_city = data.get('user_city')
-        user_categories = data.get('user_categories')
-        days = data.get('days', None)
-        time = data.get('time', 8)
-        budget = data.get('budget', None)
-        departure_city = data.get('departure_city', None) 
-        is_new_user = data.get('is_new_user', False)
-        destination_city = data.get('destination_city', None)
-
-        # Get recommendations
-        recommendations_per_day, total_time_per_day, total_budget_per_day, mse, recommended_flights = recommend_tourist_destinations(
-            user_id, user_lat, user_lng, user_city, user_categories, days, time, budget, False, departure_city, destination_city
-        )
-        recommendations_per_day, total_time_per_day, total_budget_per_day, mse, recommended_flights = recommend_tourist_destinations(
-            user_id, user_lat, user_lng, user_city, user_categories,
-            days, time, budget, is_new_user, departure_city, destination_city
-        )
+@api.route('/metrics', methods=['GET'])
+def metrics():
+    """Request, stage, candidate set and cache metrics of this process, in the Prometheus text format."""
+    return Response(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
-        # Convert recommendations to JSON-serializable format
-        recommendations_json = []
-        for day_recommendations in recommendations_per_day:
-            recommendations_json.append(day_recommendations.to_dict(orient='records'))
+@api.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    """
+    Reload the data and models of this process in the background.
 
-        flights_json = recommended_flights.to_dict(orient='records')
+    Requires the ADMIN_TOKEN environment variable, sent as a bearer token.
+    The new version is published once it loads and validates; poll /version
+    for progress. {"force": true} reloads even if no artifact changed.
+    """
+    token = os.environ.get('ADMIN_TOKEN')
+    if not token or not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return jsonify({'error': 'Forbidden'}), 403
 
-        response_data = {
-            'recommendations': recommendations_json,
-            'total_time_per_day': total_time_per_day,
-            'total_budget_per_day': total_budget_per_day,
-            'mse': mse,
-            'recommended_flights': flights_json
-        }
+    if registry.stats()['reloading']:
+        return jsonify({'error': 'A reload is already running'}), 409
 
+    data = request.get_json(silent=True) or {}
+    threading.Thread(target=registry.reload, kwargs={'force': bool(data.get('force', False))},
+                     name='admin-reload', daemon=True).start()
+    return jsonify({'status': 'reloading', 'version': registry.current.number}), 202
 
-        return jsonify(response_data), 200
+@api.route('/version', methods=['GET'])
+def version():
+    """Version of the data and models this process serves, and reload counters."""
+    return jsonify(registry.stats()), 200
 
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-    
-app.run(debug=False, host='0.0.0.0', port=8080)
\ No newline at end of file
+@api.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss counters of the /recommend result cache."""
+    return jsonify(result_cache.stats()), 200
+
+def warm_up():
+    """
+    Load every dataset, index and model and run one recommendation, so the
+    first real request does not pay for any lazy initialization.
+    """
+    ctx = get_context()
+    ctx.warm_up()
+
+    sample_user = ctx.user_ids[0] if ctx.user_ids else None
+    sample_city = ctx.merged_final['City'].dropna().iloc[0]
+    recommend_tourist_destinations(sample_user, 0.0, 0.0, sample_city, None, days=1)
+
+def create_app(context=None, warm_up_on_start=None):
+    """
+    Create the Flask app serving the recommendation API.
+
+    Args:
+        context: ServingContext to serve from, published as a new registry
+            version; by default the registry creates one lazily on first use.
+        warm_up_on_start (bool): Run warm_up() before returning; defaults to
+            the WARM_UP environment variable ('1' to enable).
+
+    Returns:
+        The Flask app.
+    """
+    if context is not None:
+        registry.install(context)
+
+    app = Flask(__name__)
+    app.register_blueprint(api)
+
+    if warm_up_on_start is None:
+        warm_up_on_start = os.environ.get('WARM_UP', '0') == '1'
+    if warm_up_on_start:
+        warm_up()
+
+    return app
+
+if __name__ == '__main__':
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
+                        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    app = create_app(warm_up_on_start=True)
+    start_online_updater()
+    start_registry_watcher()
+    app.run(debug=False, host='0.0.0.0', port=8080)
@@ -0,0 +1,235 @@
+import argparse
+import json
+import math
+import os
+import platform
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import app
+from build_info import git_commit
+from cf_engine import EmbeddingScorer
+from context import EMBEDDING_SIZE, WARM_UP_ATTRIBUTES, ServingContext
+from response_format import dumps
+
+# Routes with flights in flightsCapstone_cleaned.csv
+FLIGHT_ROUTES = [('Jakarta', 'Surabaya'), ('Surabaya', 'Jakarta'), ('Jakarta', 'Yogyakarta'),
+                 ('Jakarta', 'Semarang'), ('Semarang', 'Jakarta')]
+
+
+def make_synthetic_data(scale, data_dir, model_dir, source_dir='Data', seed=0):
+    """
+    Write a catalog scale times the size of the real one, for benchmarking.
+
+    Places are resampled from tourism_with_id.csv with jittered coordinates
+    and spread over more cities (ceil(sqrt(scale)) per real city, named e.g.
+    Jakarta007), so places per city grow with sqrt(scale). Users, ratings and
+    flights grow with scale. Random CF embeddings matching the ids are
+    written to model_dir/cf_embeddings.npz, so nothing has to be trained.
+
+    Returns:
+        The list of synthetic city names.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(data_dir, exist_ok=True)
+    os.makedirs(model_dir, exist_ok=True)
+
+    real = pd.read_csv(os.path.join(source_dir, 'tourism_with_id.csv'))
+    real = real[real['Place_Id'].notna() & real['City'].isin(['Jakarta', 'Yogyakarta', 'Bandung', 'Semarang', 'Surabaya'])]
+    real = real.reset_index(drop=True)
+
+    num_places = len(real) * scale
+    groups = math.ceil(math.sqrt(scale))
+    places = real.iloc[rng.integers(0, len(real), num_places)].reset_index(drop=True)
+    group = rng.integers(0, groups, num_places)
+    places['Place_Id'] = np.arange(1, num_places + 1)
+    places['Place_Name'] = places['Place_Name'] + ' ' + places['Place_Id'].astype(str)
+    places['City'] = places['City'] + pd.Series(group).map(lambda g: f'{g:03d}')
+    places['Lat'] += rng.uniform(-0.05, 0.05, num_places)
+    places['Long'] += rng.uniform(-0.05, 0.05, num_places)
+    places.to_csv(os.path.join(data_dir, 'tourism_with_id.csv'), index=False)
+
+    images = pd.DataFrame({'Place_Id': places['Place_Id'], 'image_url': 'https://example.com/place.jpg'})
+    images.to_csv(os.path.join(data_dir, 'tourism_data_img.csv'), index=False)
+
+    num_users = 300 * scale
+    users = pd.DataFrame({
+        'User_Id': np.arange(1, num_users + 1),
+        'Location': 'Jakarta, DKI Jakarta',
+        'Age': rng.integers(18, 40, num_users)
+    })
+    users.to_csv(os.path.join(data_dir, 'user.csv'), index=False)
+
+    num_ratings = 10000 * scale
+    ratings = pd.DataFrame({
+        'User_Id': np.concatenate([users['User_Id'], rng.integers(1, num_users + 1, num_ratings - num_users)]),
+        'Place_Id': rng.integers(1, num_places + 1, num_ratings),
+        'Place_Ratings': rng.integers(1, 6, num_ratings)
+    })
+    ratings.to_csv(os.path.join(data_dir, 'tourism_rating.csv'), index=False)
+
+    flights = pd.read_csv(os.path.join(source_dir, 'flightsCapstone_cleaned.csv'))
+    flights = flights.iloc[np.tile(np.arange(len(flights)), scale)].reset_index(drop=True)
+    flights['price'] = flights['price'] * rng.uniform(0.8, 1.2, len(flights))
+    flights['departure_time'] = (pd.to_datetime(flights['departure_time'], format='mixed')
+                                 + pd.to_timedelta(rng.integers(0, 90, len(flights)), unit='D')).astype(str)
+    flights.to_csv(os.path.join(data_dir, 'flightsCapstone_cleaned.csv'), index=False)
+
+    # Random CF tables over the ids the context will derive from these files
+    context = ServingContext(data_dir=data_dir, model_dir=model_dir, use_snapshot=False)
+    user_ids, place_ids = context.user_ids, context.place_ids
+    scorer = EmbeddingScorer(
+        rng.normal(0, 0.3, (len(user_ids), EMBEDDING_SIZE)),
+        rng.normal(0, 0.3, (len(place_ids), EMBEDDING_SIZE)),
+        rng.normal(1.5, 0.1, len(user_ids)),
+        rng.normal(1.5, 0.1, len(place_ids))
+    )
+    scorer.save(os.path.join(model_dir, 'cf_embeddings.npz'), user_ids, place_ids)
+
+    return sorted(places['City'].unique())
+
+
+def summarize(samples):
+    """Milliseconds statistics of a list of durations in seconds."""
+    samples = np.asarray(samples) * 1000
+    return {
+        'count': len(samples),
+        'mean_ms': float(samples.mean()),
+        'p50_ms': float(np.percentile(samples, 50)),
+        'p95_ms': float(np.percentile(samples, 95)),
+        'max_ms': float(samples.max())
+    }
+
+
+def benchmark_stages(context, cities, repeat=50, seed=0):
+    """
+    Time every stage of the /recommend pipeline on a context.
+
+    Each of `repeat` sampled requests (existing user, city, 1-3 days) runs
+    the stages in order, feeding each the previous stage's output:
+    filter_places, calculate_cbf_scores, predict_ratings, build_itineraries
+    (the itinerary loop), filter_flights, and the JSON serialization done by
+    recommend(). The whole recommend_tourist_destinations call is timed too.
+
+    Returns:
+        A dict of stage name -> summarize() statistics.
+    """
+    flask_app = app.create_app(context=context, warm_up_on_start=False)
+    rng = np.random.default_rng(seed)
+    user_ids = [user_id for user_id in context.user_ids if user_id in context.user_id_to_index]
+    timings = {stage: [] for stage in ['filter_places', 'calculate_cbf_scores', 'predict_ratings', 'itinerary',
+                                       'filter_flights', 'serialization', 'end_to_end']}
+
+    def timed(stage, function, *args, **kwargs):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        timings[stage].append(time.perf_counter() - start)
+        return result
+
+    with flask_app.app_context():
+        for _ in range(repeat):
+            user_id = user_ids[rng.integers(len(user_ids))]
+            city = cities[rng.integers(len(cities))]
+            days = int(rng.integers(1, 4))
+            departure_city, destination_city = FLIGHT_ROUTES[rng.integers(len(FLIGHT_ROUTES))]
+            user_categories = app.resolve_user_categories(user_id, city, True) or None
+
+            filtered_places = timed('filter_places', app.filter_places, city=city, categories=user_categories)
+            cbf_recommendations = timed('calculate_cbf_scores', app.calculate_cbf_scores, filtered_places)
+            place_ids = cbf_recommendations['Place_Id'].unique()
+            cf_ratings = timed('predict_ratings', app.predict_ratings, user_id, place_ids)
+            cf_recommendations = pd.DataFrame({'Place_Id': place_ids, 'cf_rating': cf_ratings})
+            per_day, time_per_day, budget_per_day, mse = timed(
+                'itinerary', app.build_itineraries, cbf_recommendations, cf_recommendations, -7.0, 110.0, days
+            )
+            flights = timed('filter_flights', app.filter_flights, departure_city, destination_city, 5000000)
+            timed('serialization', lambda: dumps(
+                app.format_recommendations(per_day, time_per_day, budget_per_day, mse, flights)
+            ))
+            timed('end_to_end', app.recommend_tourist_destinations, user_id, -7.0, 110.0, city, None, days,
+                  departure_city=departure_city, destination_city=destination_city)
+
+    return {stage: summarize(samples) for stage, samples in timings.items()}
+
+
+def benchmark_scale(scale, repeat=50, seed=0):
+    """
+    Build the catalog for one scale (1 = the real Data directory) and time startup and stages.
+
+    Returns:
+        A JSON-serializable dict of sizes, startup times and stage timings.
+    """
+    with tempfile.TemporaryDirectory() as workdir:
+        if scale == 1:
+            context = ServingContext()
+            cities = ['Jakarta', 'Yogyakarta', 'Bandung', 'Semarang', 'Surabaya']
+            generate_seconds = 0.0
+        else:
+            start = time.perf_counter()
+            data_dir, model_dir = os.path.join(workdir, 'Data'), os.path.join(workdir, 'Model')
+            cities = make_synthetic_data(scale, data_dir, model_dir, seed=seed)
+            generate_seconds = time.perf_counter() - start
+            context = ServingContext(data_dir=data_dir, model_dir=model_dir, use_snapshot=False)
+
+        # Startup cost: everything warm_up() loads before serving
+        startup = {}
+        for name in WARM_UP_ATTRIBUTES:
+            start = time.perf_counter()
+            getattr(context, name)
+            startup[name] = (time.perf_counter() - start) * 1000
+
+        return {
+            'scale': scale,
+            'places': len(context.merged_final),
+            'ratings': len(context.rating),
+            'users': len(context.user_ids),
+            'flights': len(context.flights_data),
+            'cities': len(cities),
+            'generate_seconds': generate_seconds,
+            'startup_ms': startup,
+            'stages': benchmark_stages(context, cities, repeat, seed)
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time each stage of the recommendation pipeline at several catalog sizes.")
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100, 1000],
+                        help="Catalog sizes as multiples of the real data (1 = the real data)")
+    parser.add_argument('--repeat', type=int, default=50, help="Sampled requests per scale")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_results.json')
+    args = parser.parse_args()
+
+    results = {
+        'commit': git_commit(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'cpu_count': os.cpu_count(),
+        'repeat': args.repeat,
+        'scales': []
+    }
+
+    for scale in args.scales:
+        result = benchmark_scale(scale, args.repeat, args.seed)
+        results['scales'].append(result)
+
+        print(f"scale {scale}x: {result['places']} places, {result['ratings']} ratings, "
+              f"{result['cities']} cities (generated in {result['generate_seconds']:.1f} s)")
+        for name, milliseconds in result['startup_ms'].items():
+            print(f"  load {name:<22} {milliseconds:10.1f} ms")
+        for stage, stats in result['stages'].items():
+            print(f"  {stage:<27} p50 {stats['p50_ms']:8.3f} ms  p95 {stats['p95_ms']:8.3f} ms")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == '__main__':
+    # Stage benchmarks:  python benchmark.py [--scales 1 10 100 1000] [--output benchmark_results.json]
+    main()
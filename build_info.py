@@ -0,0 +1,10 @@
+import subprocess
+
+
+def git_commit():
+    """Short hash of the checked-out commit, recorded with benchmark results; None outside a git checkout."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,203 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+CBF_INDEX_DIR = 'Model/cbf_index'
+CBF_NUM_NEIGHBORS = 9
+
+
+class CBFIndex:
+    """
+    Precomputed content-based filtering (CBF) neighbor table.
+
+    The TF-IDF vectorizer is fitted once over every place, and for each place
+    the top-k most similar places are stored separately for every category of
+    its city. Any city/category subset requested by /recommend is a union of
+    those (city, category) blocks, so the nearest neighbors inside the subset
+    are found by merging the stored lists instead of refitting TF-IDF and
+    computing a dense cosine similarity per request.
+
+    Attributes:
+        place_ids: Sorted array of Place_Id, one row per place.
+        categories: List of category names, indexing the second axis of the table.
+        neighbors: int32 array (num_places, num_categories, k) of row positions
+            into place_ids, -1 where a block has fewer than k places.
+        scores: float32 array of the same shape with the cosine similarities.
+    """
+
+    def __init__(self, place_ids, categories, neighbors, scores):
+        self.place_ids = place_ids
+        self.categories = list(categories)
+        self.category_to_code = {category: code for code, category in enumerate(self.categories)}
+        self.neighbors = neighbors
+        self.scores = scores
+
+    @property
+    def num_neighbors(self):
+        return self.neighbors.shape[2]
+
+    def matches(self, places):
+        """Check whether the index was built for exactly these places."""
+        place_ids = np.sort(places['Place_Id'].to_numpy())
+        return len(place_ids) == len(self.place_ids) and np.array_equal(place_ids, self.place_ids)
+
+    def recommend(self, filtered_places, num_similar=CBF_NUM_NEIGHBORS):
+        """
+        Find the most similar places inside a filtered subset.
+
+        Args:
+            filtered_places: DataFrame of candidate places (output of filter_places).
+            num_similar: Number of neighbors to return per place.
+
+        Returns:
+            A DataFrame with columns Place_Id, name, category and
+            similarity_score, in the order of filtered_places and by
+            descending similarity for each place.
+        """
+        columns = ['Place_Id', 'name', 'category', 'similarity_score']
+        num_similar = min(num_similar, self.num_neighbors)
+
+        rows = np.searchsorted(self.place_ids, filtered_places['Place_Id'].to_numpy())
+        rows = np.clip(rows, 0, len(self.place_ids) - 1)
+        known = self.place_ids[rows] == filtered_places['Place_Id'].to_numpy()
+        rows = rows[known]
+
+        category_codes = [self.category_to_code[category]
+                          for category in filtered_places['Category'].dropna().unique()
+                          if category in self.category_to_code]
+        if len(rows) == 0 or not category_codes:
+            return pd.DataFrame(columns=columns)
+
+        # Gather the stored lists of every requested category: (rows, categories * k)
+        candidates = self.neighbors[rows][:, category_codes, :].reshape(len(rows), -1)
+        candidate_scores = np.array(self.scores[rows][:, category_codes, :].reshape(len(rows), -1))
+
+        # Only keep neighbors that are themselves part of the subset
+        in_subset = np.zeros(len(self.place_ids), dtype=bool)
+        in_subset[rows] = True
+        valid = (candidates >= 0) & in_subset[np.maximum(candidates, 0)]
+        candidate_scores[~valid] = -np.inf
+
+        order = np.argsort(-candidate_scores, axis=1, kind='stable')[:, :num_similar]
+        top = np.take_along_axis(candidates, order, axis=1)
+        top_scores = np.take_along_axis(candidate_scores, order, axis=1)
+        keep = np.isfinite(top_scores)
+
+        neighbor_ids = self.place_ids[top[keep]]
+        details = filtered_places.drop_duplicates('Place_Id').set_index('Place_Id')
+        return pd.DataFrame({
+            'Place_Id': neighbor_ids,
+            'name': details['Place_Name'].reindex(neighbor_ids).to_numpy(),
+            'category': details['Category'].reindex(neighbor_ids).to_numpy(),
+            'similarity_score': top_scores[keep]
+        }, columns=columns)
+
+
+def build_cbf_index(places, num_neighbors=CBF_NUM_NEIGHBORS, chunk_size=1024):
+    """
+    Fit TF-IDF over all places and build the per-category neighbor table.
+
+    Args:
+        places: DataFrame with Place_Id, Place_Name, Category and City columns
+            (e.g. merged_final).
+        num_neighbors: Neighbors kept per place and category.
+        chunk_size: Rows of the similarity matrix computed at a time, to bound
+            memory on large catalogs.
+
+    Returns:
+        A CBFIndex.
+    """
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    places = places.drop_duplicates('Place_Id').sort_values('Place_Id').reset_index(drop=True)
+    place_ids = places['Place_Id'].to_numpy()
+    categories = sorted(places['Category'].dropna().unique())
+    num_places = len(places)
+
+    neighbors = np.full((num_places, len(categories), num_neighbors), -1, dtype=np.int32)
+    scores = np.zeros((num_places, len(categories), num_neighbors), dtype=np.float32)
+
+    indexed = places['City'].notna() & places['Category'].notna()
+    features = places.loc[indexed, 'Place_Name'] + ' ' + places.loc[indexed, 'Category']
+    vectorizer = TfidfVectorizer(stop_words='english')
+    tfidf_matrix = vectorizer.fit_transform(features)  # Rows are L2-normalised, so dot product == cosine
+    tfidf_rows = np.flatnonzero(indexed.to_numpy())
+
+    indexed_places = places.loc[indexed]
+    for city, city_places in indexed_places.groupby('City'):
+        city_rows = city_places.index.to_numpy()
+        city_matrix = tfidf_matrix[np.searchsorted(tfidf_rows, city_rows)]
+
+        for start in range(0, len(city_rows), chunk_size):
+            chunk = slice(start, start + chunk_size)
+            similarity = (city_matrix[chunk] @ city_matrix.T).toarray()
+            chunk_positions = np.arange(similarity.shape[0])
+            similarity[chunk_positions, chunk_positions + start] = -np.inf  # A place is not its own neighbor
+
+            for code, category in enumerate(categories):
+                columns = np.flatnonzero(city_places['Category'].to_numpy() == category)
+                if len(columns) == 0:
+                    continue
+
+                block = similarity[:, columns]
+                k = min(num_neighbors, len(columns))
+                top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+                top_scores = np.take_along_axis(block, top, axis=1)
+                order = np.argsort(-top_scores, axis=1, kind='stable')
+                top = np.take_along_axis(top, order, axis=1)
+                top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+                valid = np.isfinite(top_scores)
+                neighbors[city_rows[chunk], code, :k] = np.where(valid, city_rows[columns[top]], -1)
+                scores[city_rows[chunk], code, :k] = np.where(valid, top_scores, 0)
+
+    return CBFIndex(place_ids, categories, neighbors, scores)
+
+
+def save_cbf_index(index, path=CBF_INDEX_DIR):
+    """Write the index as .npy arrays plus a JSON manifest."""
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, 'place_ids.npy'), index.place_ids)
+    np.save(os.path.join(path, 'neighbors.npy'), index.neighbors)
+    np.save(os.path.join(path, 'scores.npy'), index.scores)
+    with open(os.path.join(path, 'manifest.json'), 'w') as f:
+        json.dump({'categories': index.categories, 'num_neighbors': index.num_neighbors}, f, indent=2)
+
+
+def load_cbf_index(path=CBF_INDEX_DIR):
+    """
+    Load an index written by save_cbf_index, memory-mapping the arrays read-only.
+
+    Returns:
+        A CBFIndex, or None if no index exists at path.
+    """
+    manifest_path = os.path.join(path, 'manifest.json')
+    if not os.path.exists(manifest_path):
+        return None
+
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    return CBFIndex(
+        np.load(os.path.join(path, 'place_ids.npy'), mmap_mode='r'),
+        manifest['categories'],
+        np.load(os.path.join(path, 'neighbors.npy'), mmap_mode='r'),
+        np.load(os.path.join(path, 'scores.npy'), mmap_mode='r')
+    )
+
+
+if __name__ == '__main__':
+    # Offline build step:  python cbf_index.py build [output_dir]
+    if len(sys.argv) < 2 or sys.argv[1] != 'build':
+        print("Usage: python cbf_index.py build [output_dir]")
+        sys.exit(1)
+
+    output_dir = sys.argv[2] if len(sys.argv) > 2 else CBF_INDEX_DIR
+
+    from context import ServingContext
+    index = build_cbf_index(ServingContext().merged_final)
+    save_cbf_index(index, output_dir)
+    print(f"Wrote CBF index for {len(index.place_ids)} places to {output_dir}")
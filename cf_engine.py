@@ -0,0 +1,379 @@
+import json
+import threading
+
+import numpy as np
+
+
+class EmbeddingScorer:
+    """
+    Serve collaborative filtering (CF) predictions without going through Keras.
+
+    The CF model in app.py predicts a rating as
+    dot(user_vec, place_vec) + user_bias + place_bias, so once the embedding
+    tables are pulled out of the trained model, scoring a whole candidate list
+    is a single matrix-vector product plus the two biases.
+    """
+
+    def __init__(self, user_embeddings, place_embeddings, user_bias, place_bias):
+        """
+        Args:
+            user_embeddings: Array of shape (num_users, embedding_size).
+            place_embeddings: Array of shape (num_places, embedding_size).
+            user_bias: Array of shape (num_users,) or (num_users, 1).
+            place_bias: Array of shape (num_places,) or (num_places, 1).
+        """
+        self.user_embeddings = np.ascontiguousarray(user_embeddings, dtype=np.float32)
+        self.place_embeddings = np.ascontiguousarray(place_embeddings, dtype=np.float32)
+        self.user_bias = np.ascontiguousarray(user_bias, dtype=np.float32).reshape(-1)
+        self.place_bias = np.ascontiguousarray(place_bias, dtype=np.float32).reshape(-1)
+
+        if self.user_embeddings.shape[0] != self.user_bias.shape[0]:
+            raise ValueError("User embeddings and user bias have different row counts")
+        if self.place_embeddings.shape[0] != self.place_bias.shape[0]:
+            raise ValueError("Place embeddings and place bias have different row counts")
+        if self.user_embeddings.shape[1] != self.place_embeddings.shape[1]:
+            raise ValueError("User and place embeddings have different sizes")
+
+    @property
+    def num_users(self):
+        return self.user_embeddings.shape[0]
+
+    @property
+    def num_places(self):
+        return self.place_embeddings.shape[0]
+
+    @classmethod
+    def from_keras_model(cls, model):
+        """
+        Extract the embedding tables and biases from a trained CF model.
+
+        The model must have the two-input layout built in app.py: a user input
+        and a place input, each feeding one embedding layer for the vectors and
+        one single-unit embedding layer for the bias.
+
+        Args:
+            model: Keras model, e.g. the one returned by load_or_train_cf_model.
+
+        Returns:
+            An EmbeddingScorer holding copies of the model weights.
+        """
+        user_input, place_input = model.inputs[0], model.inputs[1]
+
+        weights = {}
+        for layer in model.layers:
+            if not hasattr(layer, 'output_dim') or not hasattr(layer, 'input_dim'):
+                continue  # Only Embedding layers carry the tables we need
+
+            if layer.input is user_input:
+                side = 'user'
+            elif layer.input is place_input:
+                side = 'place'
+            else:
+                continue
+
+            kind = 'bias' if layer.output_dim == 1 else 'embeddings'
+            weights[(side, kind)] = layer.get_weights()[0]
+
+        missing = [key for key in [('user', 'embeddings'), ('place', 'embeddings'), ('user', 'bias'), ('place', 'bias')]
+                   if key not in weights]
+        if missing:
+            raise ValueError(f"CF model is missing embedding layers: {missing}")
+
+        return cls(
+            weights[('user', 'embeddings')],
+            weights[('place', 'embeddings')],
+            weights[('user', 'bias')],
+            weights[('place', 'bias')]
+        )
+
+    def save(self, path, user_ids, place_ids):
+        """
+        Write the tables to an .npz file, the raw artifact the server loads without TensorFlow.
+
+        Args:
+            path (str): Output file.
+            user_ids: User_Id of every user row.
+            place_ids: Place_Id of every place row.
+        """
+        if len(user_ids) != self.num_users or len(place_ids) != self.num_places:
+            raise ValueError("Ids do not match the number of embedding rows")
+
+        np.savez(
+            path,
+            user_embeddings=self.user_embeddings,
+            place_embeddings=self.place_embeddings,
+            user_bias=self.user_bias,
+            place_bias=self.place_bias,
+            user_ids=np.asarray(user_ids),
+            place_ids=np.asarray(place_ids)
+        )
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read tables written by save().
+
+        Returns:
+            The EmbeddingScorer, and the lists of user and place ids of its rows.
+        """
+        with np.load(path, allow_pickle=False) as arrays:
+            scorer = cls(arrays['user_embeddings'], arrays['place_embeddings'], arrays['user_bias'], arrays['place_bias'])
+            return scorer, arrays['user_ids'].tolist(), arrays['place_ids'].tolist()
+
+    def score(self, user_index, place_indices):
+        """
+        Predict ratings of one user for a set of places.
+
+        Args:
+            user_index: Row of the user in the user embedding table.
+            place_indices: Rows of the places in the place embedding table.
+
+        Returns:
+            A float32 array of predicted ratings, aligned with place_indices.
+        """
+        place_indices = np.asarray(place_indices, dtype=np.intp)
+        user_vec = self.user_embeddings[user_index]
+        return (
+            self.place_embeddings[place_indices] @ user_vec
+            + self.place_bias[place_indices]
+            + self.user_bias[user_index]
+        )
+
+    def score_batch(self, user_indices, place_indices):
+        """
+        Predict ratings of several users for the same set of places.
+
+        Args:
+            user_indices: Rows of the users in the user embedding table.
+            place_indices: Rows of the places in the place embedding table.
+
+        Returns:
+            A float32 array of shape (len(user_indices), len(place_indices)).
+        """
+        user_indices = np.asarray(user_indices, dtype=np.intp)
+        place_indices = np.asarray(place_indices, dtype=np.intp)
+        return (
+            self.user_embeddings[user_indices] @ self.place_embeddings[place_indices].T
+            + self.place_bias[place_indices][None, :]
+            + self.user_bias[user_indices][:, None]
+        )
+
+
+def _load_tflite_interpreter_class():
+    """Return the lightest TFLite Interpreter class that is installed."""
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+def save_tflite_metadata(model_path, user_input, place_input, num_users, num_places):
+    """
+    Write what TFLiteScorer needs to know about a converted CF model, next to it (<model_path>.json).
+
+    Args:
+        model_path: Path of the .tflite model.
+        user_input, place_input: Names of the user and place inputs in the
+            model's serving signature (the names of the Keras inputs).
+        num_users, num_places: Rows of the user and place embedding tables.
+    """
+    with open(model_path + '.json', 'w') as f:
+        json.dump({'user_input': user_input, 'place_input': place_input,
+                   'num_users': int(num_users), 'num_places': int(num_places)}, f, indent=2)
+
+
+def load_tflite_metadata(model_path):
+    """
+    Read the metadata written by save_tflite_metadata.
+
+    Raises:
+        ValueError: If the model has no metadata.
+    """
+    try:
+        with open(model_path + '.json') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise ValueError(f"No metadata for {model_path}; export the model with train_cf.py") from None
+
+
+class TFLiteScorer:
+    """
+    Serve CF predictions through the TFLite interpreter (Model/cf_model.tflite).
+
+    The user and place inputs are looked up by name in the model's serving
+    signature, and the table sizes are read from the metadata exported with
+    the model (Model/cf_model.tflite.json).
+
+    TFLite interpreters are not thread-safe, so each thread that scores gets
+    its own interpreter, created on first use. Input tensors are resized to
+    hold a whole candidate list, rounded up to a power of two so that requests
+    of similar size reuse the same allocation, and scored with one invoke.
+    """
+
+    def __init__(self, model_path, num_threads=1):
+        """
+        Args:
+            model_path: Path to the converted CF model.
+            num_threads: Threads each interpreter may use for a single invoke.
+        """
+        self.model_path = model_path
+        self.num_threads = num_threads
+        self._interpreter_class = _load_tflite_interpreter_class()
+        self._local = threading.local()
+        self._pool_lock = threading.Lock()
+        self.pool_size = 0
+
+        # Valid user and place rows; the interpreter fails on ids past the tables
+        self.metadata = load_tflite_metadata(model_path)
+        self.num_users = self.metadata['num_users']
+        self.num_places = self.metadata['num_places']
+
+        # Fail fast on a missing or broken model instead of on the first request
+        self._get_slot()
+
+    def _get_slot(self):
+        slot = getattr(self._local, 'slot', None)
+        if slot is None:
+            interpreter = self._interpreter_class(model_path=self.model_path, num_threads=self.num_threads)
+            signature = interpreter.get_signature_runner()
+            inputs = signature.get_input_details()
+            outputs = list(signature.get_output_details().values())
+            expected = [self.metadata['user_input'], self.metadata['place_input']]
+            if not set(expected) <= set(inputs) or len(outputs) != 1:
+                raise ValueError(f"{self.model_path} has inputs {sorted(inputs)} and {len(outputs)} outputs, "
+                                 f"expected inputs {expected} and one output")
+
+            # The runner's tensors are driven directly, so the inputs are only
+            # resized when the batch size changes (see _score_pairs)
+            slot = {
+                'interpreter': interpreter,
+                'user_input': inputs[self.metadata['user_input']]['index'],
+                'place_input': inputs[self.metadata['place_input']]['index'],
+                'output': outputs[0]['index'],
+                'batch_size': 0
+            }
+            self._local.slot = slot
+            with self._pool_lock:
+                self.pool_size += 1
+        return slot
+
+    def score(self, user_index, place_indices):
+        """
+        Predict ratings of one user for a set of places.
+
+        Args:
+            user_index: Row of the user in the model's user embedding table.
+            place_indices: Rows of the places in the model's place embedding table.
+
+        Returns:
+            A float32 array of predicted ratings, aligned with place_indices.
+        """
+        place_indices = np.asarray(place_indices, dtype=np.float32).reshape(-1)
+        return self._score_pairs(np.full(len(place_indices), user_index, dtype=np.float32), place_indices)
+
+    def score_batch(self, user_indices, place_indices):
+        """
+        Predict ratings of several users for the same set of places in one invoke.
+
+        Args:
+            user_indices: Rows of the users in the model's user embedding table.
+            place_indices: Rows of the places in the model's place embedding table.
+
+        Returns:
+            A float32 array of shape (len(user_indices), len(place_indices)).
+        """
+        user_indices = np.asarray(user_indices, dtype=np.float32).reshape(-1)
+        place_indices = np.asarray(place_indices, dtype=np.float32).reshape(-1)
+        scores = self._score_pairs(np.repeat(user_indices, len(place_indices)), np.tile(place_indices, len(user_indices)))
+        return scores.reshape(len(user_indices), len(place_indices))
+
+    def _score_pairs(self, user_indices, place_indices):
+        num_places = len(place_indices)
+        if num_places == 0:
+            return np.empty(0, dtype=np.float32)
+
+        slot = self._get_slot()
+        interpreter = slot['interpreter']
+
+        batch_size = 1 << (num_places - 1).bit_length()
+        if batch_size != slot['batch_size']:
+            interpreter.resize_tensor_input(slot['user_input'], [batch_size, 1])
+            interpreter.resize_tensor_input(slot['place_input'], [batch_size, 1])
+            interpreter.allocate_tensors()
+            slot['batch_size'] = batch_size
+
+        user_batch = np.zeros((batch_size, 1), dtype=np.float32)  # Padding rows score user 0 / place 0 and are dropped
+        place_batch = np.zeros((batch_size, 1), dtype=np.float32)
+        user_batch[:num_places, 0] = user_indices
+        place_batch[:num_places, 0] = place_indices
+
+        interpreter.set_tensor(slot['user_input'], user_batch)
+        interpreter.set_tensor(slot['place_input'], place_batch)
+        interpreter.invoke()
+        return interpreter.get_tensor(slot['output']).reshape(-1)[:num_places].copy()
+
+
+def check_parity(reference, candidate, user_indices, place_indices, atol=1e-4):
+    """
+    Compare two scorers on every (user, place) pair.
+
+    Args:
+        reference: Scorer treated as ground truth, e.g. the Keras model wrapper.
+        candidate: Scorer under test.
+        user_indices: Users to score.
+        place_indices: Places scored for each user.
+        atol: Largest absolute difference still counted as a match.
+
+    Returns:
+        The largest absolute difference found.
+
+    Raises:
+        AssertionError: If any prediction differs by more than atol.
+    """
+    max_diff = 0.0
+    for user_index in user_indices:
+        expected = np.asarray(reference.score(user_index, place_indices), dtype=np.float32)
+        actual = np.asarray(candidate.score(user_index, place_indices), dtype=np.float32)
+        max_diff = max(max_diff, float(np.max(np.abs(expected - actual))))
+
+    if max_diff > atol:
+        raise AssertionError(f"Scorers disagree by up to {max_diff:.6f} (atol={atol})")
+    return max_diff
+
+
+class KerasScorer:
+    """Reference scorer that runs the full Keras model, used for parity checks."""
+
+    def __init__(self, model):
+        self.model = model
+
+    def score(self, user_index, place_indices):
+        place_indices = np.asarray(place_indices).reshape(-1)
+        user_batch = np.full(len(place_indices), user_index)
+        return self.model.predict([user_batch, place_indices], verbose=0).reshape(-1)
+
+
+if __name__ == '__main__':
+    # Parity check of the serving backends against the Keras model, over every
+    # user (tests/test_cf_engine.py runs it on a sample in CI):
+    #   python cf_engine.py [Model/cf_model.h5] [Model/cf_model.tflite]
+    import sys
+    from tensorflow.keras.models import load_model
+
+    h5_path = sys.argv[1] if len(sys.argv) > 1 else 'Model/cf_model.h5'
+    tflite_path = sys.argv[2] if len(sys.argv) > 2 else 'Model/cf_model.tflite'
+
+    keras_model = load_model(h5_path, compile=False)
+    keras_scorer = KerasScorer(keras_model)
+    embedding_scorer = EmbeddingScorer.from_keras_model(keras_model)
+    tflite_scorer = TFLiteScorer(tflite_path)
+
+    users = range(embedding_scorer.num_users)
+    places = np.arange(embedding_scorer.num_places)
+    print(f"embedding vs keras: max abs diff {check_parity(keras_scorer, embedding_scorer, users, places):.2e}")
+    print(f"tflite vs keras: max abs diff {check_parity(keras_scorer, tflite_scorer, users, places):.2e}")
@@ -0,0 +1,389 @@
+import functools
+import logging
+import os
+import threading
+
+import pandas as pd
+
+from ann_index import CandidateRetriever
+from cbf_index import build_cbf_index, load_cbf_index
+from cf_engine import EmbeddingScorer, TFLiteScorer
+from flight_index import FlightIndex
+from itinerary import RouteDistances
+from place_index import PlaceIndex
+from ranking import HybridRanker
+from snapshot import load_snapshot
+from user_profiles import UserProfileStore
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_SIZE = 50
+
+# Attributes loaded by ServingContext.warm_up(), in loading order
+WARM_UP_ATTRIBUTES = ['merged_final', 'place_index', 'ranker', 'user_profiles', 'route_distances', 'flight_index',
+                      'cbf_index', 'cf_scorer']
+
+
+def lazy(load):
+    """
+    Turn a loader method into an attribute computed on first access.
+
+    Loading is serialized by the context lock, so concurrent first requests
+    load each attribute once. The lock is re-entrant because loaders read
+    other lazy attributes.
+    """
+    name = load.__name__
+
+    @functools.wraps(load)
+    def getter(self):
+        try:
+            return self.__dict__[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self.__dict__:
+                self.__dict__[name] = load(self)
+            return self.__dict__[name]
+
+    return property(getter)
+
+
+class ServingContext:
+    """
+    Data and models behind /recommend, each loaded the first time it is used.
+
+    Nothing is read at construction, so importing the app or creating it in a
+    WSGI server is cheap; warm_up() loads everything ahead of the first request.
+    The preprocessed tables come from the catalog snapshot (python snapshot.py
+    build) when it matches the CSVs, and from the CSVs otherwise.
+    """
+
+    def __init__(self, data_dir='Data', model_dir='Model', cf_backend=None, use_snapshot=True):
+        """
+        Args:
+            data_dir (str): Directory with the catalog, rating and flight CSVs.
+            model_dir (str): Directory with the CF model, CBF index and catalog snapshot.
+            cf_backend (str): 'embedding' or 'tflite'; defaults to the
+                CF_BACKEND environment variable, then 'embedding'.
+            use_snapshot (bool): Read the catalog snapshot when it is up to date.
+        """
+        self.data_dir = data_dir
+        self.model_dir = model_dir
+        self.use_snapshot = use_snapshot
+        self.cf_backend = cf_backend or os.environ.get('CF_BACKEND', 'embedding')
+        if self.cf_backend not in ('embedding', 'tflite'):
+            raise ValueError(f"Unknown CF_BACKEND '{self.cf_backend}', expected 'embedding' or 'tflite'")
+        self._lock = threading.RLock()
+
+    # Load dataset
+
+    @lazy
+    def snapshot(self):
+        if not self.use_snapshot:
+            return None
+        return load_snapshot(os.path.join(self.model_dir, 'catalog_snapshot'), self.data_dir)
+
+    @lazy
+    def place(self):
+        if self.snapshot is not None:
+            return self.snapshot.table('place')
+
+        place = pd.read_csv(os.path.join(self.data_dir, 'tourism_with_id.csv'))
+        place['Rating'] = pd.to_numeric(place['Rating'], errors='coerce')
+
+        # Check if there are any missing 'City' values
+        missing_cities = place[place['City'].isnull()]
+        if not missing_cities.empty:
+            logger.warning("There are missing 'City' values in the 'place' dataset:\n%s", missing_cities)
+
+        # Fill in the blank 'Time_Minutes' values with the median of the city
+        city_median = place.groupby('City')['Time_Minutes'].median()
+        place['Time_Minutes'] = place['Time_Minutes'].fillna(place['City'].map(city_median))
+        return place
+
+    @lazy
+    def rating(self):
+        if self.snapshot is not None:
+            return self.snapshot.table('rating')
+
+        rating = pd.read_csv(os.path.join(self.data_dir, 'tourism_rating.csv'))
+        rating['Place_Ratings'] = pd.to_numeric(rating['Place_Ratings'], errors='coerce')
+        return rating
+
+    @lazy
+    def user(self):
+        if self.snapshot is not None:
+            return self.snapshot.table('user')
+        return pd.read_csv(os.path.join(self.data_dir, 'user.csv'))
+
+    @lazy
+    def data_image(self):
+        return pd.read_csv(os.path.join(self.data_dir, 'tourism_data_img.csv'))
+
+    @lazy
+    def flights_data(self):
+        if self.snapshot is not None:
+            return self.snapshot.table('flights_data')
+        return pd.read_csv(os.path.join(self.data_dir, 'flightsCapstone_cleaned.csv'))
+
+    @lazy
+    def merged_final(self):
+        if self.snapshot is not None:
+            return self.snapshot.table('merged_final')
+
+        # Combining the dataset
+        merge_data = pd.merge(
+            self.rating[['User_Id', 'Place_Id', 'Place_Ratings']],
+            self.place[['Place_Id', 'Rating', 'Place_Name', 'Description', 'Category', 'City', 'Price',
+                        'Time_Minutes', 'Coordinate', 'Lat', 'Long']],
+            on='Place_Id',
+            how='left'
+        )
+
+        # Calculate the mean rating for each place
+        merge_data = merge_data.groupby('Place_Id').agg(
+            Mean_Rating=('Place_Ratings', 'mean'),
+            Rating=('Rating', 'first'),
+            Place_Name=('Place_Name', 'first'),
+            Description=('Description', 'first'),
+            Category=('Category', 'first'),
+            City=('City', 'first'),
+            Price=('Price', 'first'),
+            Time_Minutes=('Time_Minutes', 'first'),
+            Coordinate=('Coordinate', 'first'),
+            Lat=('Lat', 'first'),
+            Long=('Long', 'first')
+        ).reset_index()
+
+        return pd.merge(
+            merge_data,
+            self.data_image[['Place_Id', 'image_url']],  # Include only relevant columns from data_image
+            on='Place_Id',
+            how='left'
+        )
+
+    # Id -> embedding row maps of the CF model
+
+    @lazy
+    def user_ids(self):
+        if self.snapshot is not None:
+            return self.snapshot.array('user_ids').tolist()
+        return self.rating['User_Id'].unique().tolist()
+
+    @lazy
+    def place_ids(self):
+        if self.snapshot is not None:
+            return self.snapshot.array('place_ids').tolist()
+        return self.place['Place_Id'].unique().tolist()
+
+    @lazy
+    def user_id_to_index(self):
+        return {user_id: index for index, user_id in enumerate(self.user_ids)}
+
+    @lazy
+    def place_id_to_index(self):
+        return {place_id: index for index, place_id in enumerate(self.place_ids)}
+
+    # Indexes
+
+    @lazy
+    def place_index(self):
+        # Row positions of merged_final by city and category, for filter_places
+        return PlaceIndex(self.merged_final)
+
+    @lazy
+    def ranker(self):
+        # Catalog columns by Place_Id, for scoring and ordering the candidates of a request
+        return HybridRanker(self.merged_final)
+
+    @lazy
+    def user_profiles(self):
+        # Rating history, top categories and existence of every user
+        return UserProfileStore(self.rating, self.user, self.merged_final)
+
+    @lazy
+    def route_distances(self):
+        # Pairwise distances between places of each city, used by the optimize_route mode
+        return RouteDistances(self.place)
+
+    @lazy
+    def flight_index(self):
+        # Price-sorted flights per (departure, arrival) airport pair
+        return FlightIndex(self.flights_data)
+
+    @lazy
+    def cbf_index(self):
+        # Load the offline CBF index (python cbf_index.py build), or build it in memory if it is missing or stale
+        cbf_index = load_cbf_index(os.path.join(self.model_dir, 'cbf_index'))
+        if cbf_index is None or not cbf_index.matches(self.merged_final):
+            logger.warning("CBF index missing or stale, building it in memory...")
+            cbf_index = build_cbf_index(self.merged_final)
+        return cbf_index
+
+    @lazy
+    def candidate_retriever(self):
+        # IVF index over the CF place embeddings, for retrieving CF candidates outside
+        # the CBF list. Only requests with cf_candidates use it, so it is built on the
+        # first of them rather than by warm_up()
+        scorer = self.cf_scorer
+        if not isinstance(scorer, EmbeddingScorer):
+            # The TFLite backend does not expose its tables; read the ones exported with it
+            scorer = self.load_cf_embeddings()
+            if scorer is None:
+                logger.warning("No CF embeddings exported with the TFLite model, reading the Keras model")
+                from tensorflow.keras.models import load_model
+                scorer = EmbeddingScorer.from_keras_model(
+                    load_model(os.path.join(self.model_dir, 'cf_model.h5'), compile=False)
+                )
+        return CandidateRetriever(scorer, self.merged_final, self.place_index, self.place_id_to_index)
+
+    # Models
+
+    @lazy
+    def cf_scorer(self):
+        if self.cf_backend == 'tflite':
+            return TFLiteScorer(os.path.join(self.model_dir, 'cf_model.tflite'))
+
+        scorer = self.load_cf_embeddings()
+        if scorer is not None:
+            return scorer
+
+        # Pull the embedding tables out of the trained model once, so serving is plain NumPy
+        return EmbeddingScorer.from_keras_model(self.load_or_train_cf_model())
+
+    def load_cf_embeddings(self):
+        """
+        Read the raw CF tables exported by train_cf.py, without importing TensorFlow.
+
+        The ids of the table rows must be the first ids of the context's id
+        maps; the model may have fewer places than the catalog (see
+        app.scorable_places).
+
+        Returns:
+            An EmbeddingScorer, or None if the tables are missing or were
+            trained on other users or places.
+        """
+        embeddings_path = os.path.join(self.model_dir, 'cf_embeddings.npz')
+        if not os.path.exists(embeddings_path):
+            return None
+
+        scorer, user_ids, place_ids = EmbeddingScorer.load(embeddings_path)
+        if (pd.Index(user_ids).equals(pd.Index(self.user_ids[:len(user_ids)]))
+                and pd.Index(place_ids).equals(pd.Index(self.place_ids[:len(place_ids)]))):
+            return scorer
+        logger.warning("CF embeddings in %s were trained on other users or places, ignoring them", embeddings_path)
+        return None
+
+    def cf_model(self):
+        """
+        The CF scorer with the user id map of the same update.
+
+        Both are read under the lock swap_cf_model() replaces them under, so a
+        request never looks a user up in one update's id map and scores them
+        with another update's tables.
+
+        Returns:
+            The scorer and the user_id_to_index dict.
+        """
+        with self._lock:
+            return self.cf_scorer, self.user_id_to_index
+
+    def cf_retriever(self):
+        """The candidate retriever with the user id map of the same update (see cf_model)."""
+        with self._lock:
+            return self.candidate_retriever, self.user_id_to_index
+
+    def swap_cf_model(self, scorer, user_ids):
+        """
+        Serve from updated CF embedding tables (see online_updates.py).
+
+        Readers that need a user's row take the tables and the id map together
+        through cf_model() or cf_retriever().
+
+        Args:
+            scorer: EmbeddingScorer with the same places as the current one and
+                the same users first, possibly followed by new ones.
+            user_ids: User ids of the scorer rows.
+        """
+        user_id_to_index = {user_id: index for index, user_id in enumerate(user_ids)}
+        retriever = self.__dict__.get('candidate_retriever')
+        if retriever is not None:
+            retriever = retriever.with_scorer(scorer)
+
+        with self._lock:
+            self.__dict__['cf_scorer'] = scorer
+            if retriever is not None:
+                self.__dict__['candidate_retriever'] = retriever
+            self.__dict__['user_ids'] = list(user_ids)
+            self.__dict__['user_id_to_index'] = user_id_to_index
+
+    def load_or_train_cf_model(self):
+        from tensorflow.keras.models import load_model
+
+        model_path = os.path.join(self.model_dir, 'cf_model.h5')
+
+        try:
+            # Try loading the pre-trained model
+            return load_model(model_path, compile=False)
+        except Exception:
+            # If model does not exist, train it
+            logger.warning("Model not found, training a new model...")
+            cf_model = build_cf_model(len(self.user_ids), len(self.place_ids))
+            cf_model.fit(
+                [self.rating['User_Id'].map(self.user_id_to_index), self.rating['Place_Id'].map(self.place_id_to_index)],
+                self.rating['Place_Ratings'],
+                epochs=20,
+                verbose=1
+            )
+            # Save the model after training
+            cf_model.save(model_path)  # Save the model for future use
+            return cf_model
+
+    def warm_up(self):
+        """
+        Load every dataset, index and model now instead of on the first request.
+
+        The CF candidate retriever is left out: it is only built when a
+        request asks for CF candidates.
+        """
+        for name in WARM_UP_ATTRIBUTES:
+            getattr(self, name)
+
+        # One scoring call, so lazily allocated scorer state (e.g. TFLite tensors) exists too
+        if self.user_ids and self.place_ids:
+            self.cf_scorer.score(0, [0])
+
+
+def build_cf_model(num_users, num_places, embedding_size=EMBEDDING_SIZE):
+    """
+    Build the (untrained) CF model: dot(user_vec, place_vec) + user_bias + place_bias.
+
+    TensorFlow is imported here rather than at module level, so serving
+    processes that never train do not pay for it.
+    """
+    import tensorflow as tf
+    from tensorflow.keras.layers import Input, Embedding, Flatten, Dot, Add
+    from tensorflow.keras.models import Model
+
+    user_input = Input(shape=(1,), name='user')
+    user_embedding = Embedding(num_users, embedding_size, embeddings_regularizer=tf.keras.regularizers.l2(1e-6))(user_input)
+    user_vec = Flatten()(user_embedding)
+
+    place_input = Input(shape=(1,), name='place')
+    place_embedding = Embedding(num_places, embedding_size, embeddings_regularizer=tf.keras.regularizers.l2(1e-6))(place_input)
+    place_vec = Flatten()(place_embedding)
+
+    dot_product = Dot(axes=1)([user_vec, place_vec])
+
+    # Add bias terms for users and places
+    user_bias = Embedding(num_users, 1)(user_input)
+    user_bias = Flatten()(user_bias)
+
+    place_bias = Embedding(num_places, 1)(place_input)
+    place_bias = Flatten()(place_bias)
+
+    prediction = Add()([dot_product, user_bias, place_bias])
+
+    cf_model = Model([user_input, place_input], prediction)
+    cf_model.compile(optimizer='adam', loss='mean_squared_error')
+    return cf_model
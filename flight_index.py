@@ -0,0 +1,99 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def parse_departure_time(value, name):
+    """
+    Read one bound of a requested departure window.
+
+    Returns:
+        A pd.Timestamp, or None if value is None.
+
+    Raises:
+        ValueError: If value is not a date and time string.
+    """
+    if value is None:
+        return None
+    try:
+        timestamp = pd.Timestamp(value) if isinstance(value, str) else pd.NaT
+    except ValueError:
+        timestamp = pd.NaT
+    if pd.isna(timestamp):
+        raise ValueError(f"'{name}' must be a date and time like '2024-12-12 09:00', got {value!r}")
+    return timestamp
+
+
+class FlightIndex:
+    """
+    Flights grouped by route and sorted by price, built once at load time.
+
+    A search is a dictionary lookup of the (departure, arrival) airport pair
+    followed by a binary search on the sorted prices for the budget, so it
+    does not scan the flight table.
+    """
+
+    def __init__(self, flights):
+        """
+        Args:
+            flights: DataFrame with departure_airport_name, arrival_airport_name,
+                departure_time and price columns (e.g. flightsCapstone_cleaned.csv).
+        """
+        self.flights = flights
+
+        prices = pd.to_numeric(flights['price'], errors='coerce').to_numpy(dtype=float)
+        # The CSV mixes '2024-11-27 15:20:00' and '2024-12-12 16:30', so the
+        # format is inferred per value rather than from the first row
+        departure_times = pd.to_datetime(flights['departure_time'], format='mixed', errors='coerce')
+        unparsed = departure_times.isna() & flights['departure_time'].notna()
+        if unparsed.any():
+            logger.warning("%d flights have an unreadable departure_time and never match a departure window, e.g. %r",
+                           unparsed.sum(), flights['departure_time'][unparsed].iloc[0])
+        departure_times = departure_times.to_numpy()
+
+        self.routes = {}  # (departure_airport, arrival_airport) -> (rows, prices, departure_times)
+        routes = flights.groupby(['departure_airport_name', 'arrival_airport_name'], sort=False).indices
+        for route, rows in routes.items():
+            rows = rows[np.argsort(prices[rows], kind='stable')]  # Missing prices sort last
+            self.routes[route] = (rows, prices[rows], departure_times[rows])
+
+    def search(self, departure_airport, arrival_airport, max_budget=None, limit=None, offset=0,
+               departure_after=None, departure_before=None):
+        """
+        Find flights of one route, cheapest first.
+
+        Args:
+            departure_airport (str): Full departure airport name.
+            arrival_airport (str): Full arrival airport name.
+            max_budget (float): Highest price to include (if applicable).
+            limit (int): Maximum number of flights to return (if applicable).
+            offset (int): Number of matching flights to skip.
+            departure_after: Earliest departure_time to include (if applicable).
+            departure_before: Latest departure_time to include (if applicable).
+
+        Returns:
+            A DataFrame with the matching rows of the flight table.
+        """
+        route = self.routes.get((departure_airport, arrival_airport))
+        if route is None:
+            return self.flights.iloc[0:0]
+
+        rows, prices, departure_times = route
+
+        if max_budget:
+            end = np.searchsorted(prices, max_budget, side='right')
+            rows, departure_times = rows[:end], departure_times[:end]
+
+        if departure_after is not None or departure_before is not None:
+            in_window = np.ones(len(rows), dtype=bool)
+            if departure_after is not None:
+                in_window &= departure_times >= pd.Timestamp(departure_after).to_datetime64()
+            if departure_before is not None:
+                in_window &= departure_times <= pd.Timestamp(departure_before).to_datetime64()
+            rows = rows[in_window]
+
+        stop = offset + limit if limit is not None else None
+        return self.flights.iloc[rows[offset:stop]]
@@ -0,0 +1,53 @@
+"""
+Gunicorn settings for the recommendation API (gunicorn -c gunicorn.conf.py wsgi:app).
+
+Every setting can be overridden through the environment:
+    PORT              Port to listen on (default 8080)
+    WEB_CONCURRENCY   Number of worker processes (default: number of CPU cores)
+    GUNICORN_THREADS  Request threads per worker (default 4)
+    GUNICORN_TIMEOUT  Seconds before a silent worker is killed and restarted (default 60)
+    GRACEFUL_TIMEOUT  Seconds in-flight requests get to finish on shutdown (default 30)
+    LOG_LEVEL         Level of gunicorn's and the app's logs (default INFO)
+"""
+import os
+
+# One BLAS thread per worker; parallelism comes from the workers, and the
+# per-request matrix products are too small to gain from more
+os.environ.setdefault('OMP_NUM_THREADS', '1')
+os.environ.setdefault('OPENBLAS_NUM_THREADS', '1')
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+
+workers = int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+
+# Load the app (and with it the catalog, indexes and embeddings) in the master
+# before forking, so workers share it copy-on-write
+preload_app = True
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '60'))
+graceful_timeout = int(os.environ.get('GRACEFUL_TIMEOUT', '30'))
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'INFO').lower()
+
+
+def when_ready(server):
+    server.log.info("Serving context loaded, starting %s workers with %s threads each", workers, threads)
+
+
+def post_fork(server, worker):
+    # Threads do not survive fork, so each worker starts its own online updater
+    # (it tails the shared rating log, see online_updates.py) and its own
+    # artifact watcher (RELOAD_INTERVAL, see registry.py). A reloaded version
+    # lives in the worker's own memory, no longer shared with the master
+    import app
+    app.start_online_updater()
+    app.start_registry_watcher()
+
+
+def worker_exit(server, worker):
+    server.log.info("Worker %s stopped", worker.pid)
@@ -0,0 +1,338 @@
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+AVERAGE_SPEED_KMH = 60
+
+
+def haversine(start_lat, start_lng, end_lats, end_lngs):
+    """
+    Vectorized Haversine distance from one point to many points.
+
+    Args:
+        start_lat (float): Latitude of the starting point in degrees.
+        start_lng (float): Longitude of the starting point in degrees.
+        end_lats: Array of destination latitudes in degrees.
+        end_lngs: Array of destination longitudes in degrees.
+
+    Returns:
+        Arrays of distances in kilometers and estimated travel times in minutes
+        (at AVERAGE_SPEED_KMH), aligned with the destinations.
+    """
+    start_lat_rad = np.radians(start_lat)
+    start_lng_rad = np.radians(start_lng)
+    end_lat_rad = np.radians(end_lats)
+    end_lng_rad = np.radians(end_lngs)
+
+    dlat = end_lat_rad - start_lat_rad
+    dlng = end_lng_rad - start_lng_rad
+    a = np.sin(dlat / 2)**2 + np.cos(start_lat_rad) * np.cos(end_lat_rad) * np.sin(dlng / 2)**2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    distance_km = EARTH_RADIUS_KM * c
+    travel_time_minutes = (distance_km / AVERAGE_SPEED_KMH) * 60
+    return distance_km, travel_time_minutes
+
+
+def plan_itinerary(lats, lngs, time_minutes, prices, start_lat, start_lng, days, time=8, budget=None):
+    """
+    Greedily split ranked candidates into daily itineraries.
+
+    Candidates are visited in the given order. Each day starts from the
+    original position, and a candidate is taken if it was not visited on an
+    earlier day and fits in the remaining daily time and budget; the travel
+    leg is measured from the previously taken place. Instead of walking the
+    candidates one by one, every step computes the distance to all remaining
+    candidates at once and jumps to the first one that fits.
+
+    Args:
+        lats, lngs: Arrays of candidate coordinates, in ranking order.
+        time_minutes: Array of visit durations in minutes.
+        prices: Array of ticket prices.
+        start_lat (float): Latitude of the daily starting point.
+        start_lng (float): Longitude of the daily starting point.
+        days (int): Number of days to plan.
+        time (float): Daily time limit in hours.
+        budget (float): Daily budget limit, or None for no limit.
+
+    Returns:
+        A list with one (positions, distances_km, travel_times) tuple of arrays
+        per day, where positions index the candidate arrays, followed by the
+        total time (hours) and total budget spent per day.
+    """
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+    visit_hours = np.asarray(time_minutes, dtype=float) / 60
+    prices = np.asarray(prices, dtype=float)
+    num_candidates = len(lats)
+
+    # Track visited places across days
+    visited = np.zeros(num_candidates, dtype=bool)
+
+    day_plans = []
+    total_time_per_day = []
+    total_budget_per_day = []
+
+    for _ in range(days or 0):
+        positions, distances, travel_times = [], [], []
+        day_total_time = 0
+        day_total_budget = 0
+
+        # Reset to original starting point for each day
+        current_lat = start_lat
+        current_lng = start_lng
+
+        # Candidates before `pointer` were already rejected today from an earlier position
+        pointer = 0
+        while pointer < num_candidates:
+            distance_km, travel_time = haversine(current_lat, current_lng, lats[pointer:], lngs[pointer:])
+            place_total_time = visit_hours[pointer:] + (travel_time / 60)
+
+            # Negated comparisons so that missing values behave like the scalar checks
+            fits = ~visited[pointer:] & ~(day_total_time + place_total_time > time)
+            if budget:
+                fits &= ~(day_total_budget + prices[pointer:] > budget)
+
+            offset = int(fits.argmax())
+            if not fits[offset]:
+                break
+
+            position = pointer + offset
+            positions.append(position)
+            distances.append(distance_km[offset])
+            travel_times.append(travel_time[offset])
+
+            day_total_time += place_total_time[offset]
+            day_total_budget += prices[position]
+            current_lat = lats[position]
+            current_lng = lngs[position]
+            visited[position] = True
+            pointer = position + 1
+
+        day_plans.append((np.array(positions, dtype=np.intp), np.array(distances), np.array(travel_times)))
+        total_time_per_day.append(day_total_time)
+        total_budget_per_day.append(day_total_budget)
+
+    return day_plans, total_time_per_day, total_budget_per_day
+
+
+def pairwise_haversine(lats, lngs):
+    """
+    Haversine distance matrix between all pairs of points.
+
+    Args:
+        lats: Array of latitudes in degrees.
+        lngs: Array of longitudes in degrees.
+
+    Returns:
+        A (n, n) array of distances in kilometers.
+    """
+    lat_rad = np.radians(np.asarray(lats, dtype=float))
+    lng_rad = np.radians(np.asarray(lngs, dtype=float))
+
+    dlat = lat_rad[None, :] - lat_rad[:, None]
+    dlng = lng_rad[None, :] - lng_rad[:, None]
+    a = np.sin(dlat / 2)**2 + np.cos(lat_rad)[:, None] * np.cos(lat_rad)[None, :] * np.sin(dlng / 2)**2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(np.clip(1 - a, 0, None)))
+    return EARTH_RADIUS_KM * c
+
+
+class RouteDistances:
+    """
+    Pairwise distance matrices between places, precomputed per city at startup.
+
+    Candidate sets are always drawn from one city, so looking up their
+    distances is a slice of that city's matrix instead of a fresh
+    Haversine computation per pair.
+    """
+
+    def __init__(self, places):
+        """
+        Args:
+            places: DataFrame with Place_Id, City, Lat and Long columns
+                (e.g. the tourism_with_id.csv catalog).
+        """
+        places = places.drop_duplicates('Place_Id').dropna(subset=['City', 'Lat', 'Long'])
+
+        self.matrices = {}
+        self.place_locations = {}  # Place_Id -> (city, row in that city's matrix)
+        for city, city_places in places.groupby('City'):
+            self.matrices[city] = pairwise_haversine(city_places['Lat'].to_numpy(), city_places['Long'].to_numpy())
+            for position, place_id in enumerate(city_places['Place_Id']):
+                self.place_locations[place_id] = (city, position)
+
+    def pairwise(self, place_ids, lats, lngs):
+        """
+        Distance matrix between the given places.
+
+        Args:
+            place_ids: Place_Id of each candidate.
+            lats, lngs: Candidate coordinates, used when the places are not
+                all in one precomputed city matrix.
+
+        Returns:
+            A (n, n) array of distances in kilometers.
+        """
+        locations = [self.place_locations.get(place_id) for place_id in place_ids]
+        cities = {location[0] for location in locations if location is not None}
+
+        if None in locations or len(cities) != 1:
+            return pairwise_haversine(lats, lngs)
+
+        positions = np.array([location[1] for location in locations], dtype=np.intp)
+        return self.matrices[cities.pop()][np.ix_(positions, positions)]
+
+
+def _two_opt(route, distances, max_iterations=100):
+    """
+    Shorten an open path that starts at node 0 by reversing segments.
+
+    Args:
+        route: List of node ids visited after the start node.
+        distances: Padded distance matrix whose last row/column is all zeros,
+            so that "no next node" costs nothing.
+
+    Returns:
+        The improved route.
+    """
+    end_node = len(distances) - 1
+    route = list(route)
+
+    for _ in range(max_iterations):
+        if len(route) < 2:
+            break
+
+        path = np.array([0] + route + [end_node])
+        i = np.arange(1, len(route) + 1)[:, None]  # First node of the reversed segment
+        j = np.arange(1, len(route) + 1)[None, :]  # Last node of the reversed segment
+
+        a, b = path[i - 1], path[i]
+        c, d = path[j], path[j + 1]
+        delta = distances[a, c] + distances[b, d] - distances[a, b] - distances[c, d]
+        delta = np.where(j > i, delta, 0)
+
+        best = np.unravel_index(np.argmin(delta), delta.shape)
+        if delta[best] >= -1e-9:
+            break
+
+        start, stop = best[0], best[1] + 1  # Slice of `route` to reverse
+        route[start:stop] = route[start:stop][::-1]
+
+    return route
+
+
+def plan_optimized_itinerary(lats, lngs, time_minutes, prices, start_lat, start_lng, days, time=8, budget=None,
+                             place_distances=None, pool_size=30):
+    """
+    Split ranked candidates into daily itineraries that minimise travel.
+
+    Each day draws from the best `pool_size` candidates not visited on an
+    earlier day. The route is seeded with nearest-neighbor search from the
+    starting point, shortened with 2-opt, and then grown by inserting further
+    pool candidates (in ranking order) at their cheapest position while they
+    still fit the time and budget limits, re-running 2-opt after each insert.
+
+    Args:
+        lats, lngs: Arrays of candidate coordinates, in ranking order.
+        time_minutes: Array of visit durations in minutes.
+        prices: Array of ticket prices.
+        start_lat (float): Latitude of the daily starting point.
+        start_lng (float): Longitude of the daily starting point.
+        days (int): Number of days to plan.
+        time (float): Daily time limit in hours.
+        budget (float): Daily budget limit, or None for no limit.
+        place_distances: (n, n) distance matrix between the candidates in
+            kilometers, e.g. from RouteDistances.pairwise. Computed when omitted.
+        pool_size (int): Number of top-ranked candidates considered per day.
+
+    Returns:
+        Same structure as plan_itinerary, with each day in visiting order.
+    """
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+    visit_hours = np.asarray(time_minutes, dtype=float) / 60
+    prices = np.asarray(prices, dtype=float)
+    if place_distances is None:
+        place_distances = pairwise_haversine(lats, lngs)
+
+    visited = np.zeros(len(lats), dtype=bool)
+    km_to_hours = 1 / AVERAGE_SPEED_KMH
+
+    day_plans = []
+    total_time_per_day = []
+    total_budget_per_day = []
+
+    for _ in range(days or 0):
+        pool = np.flatnonzero(~visited)[:pool_size]
+        num_nodes = len(pool) + 1
+
+        # Node 0 is the starting point, nodes 1..len(pool) are the pool, and a
+        # final zero-distance node stands for "end of route"
+        start_km, _ = haversine(start_lat, start_lng, lats[pool], lngs[pool])
+        distances = np.zeros((num_nodes + 1, num_nodes + 1))
+        distances[0, 1:num_nodes] = start_km
+        distances[1:num_nodes, 0] = start_km
+        distances[1:num_nodes, 1:num_nodes] = place_distances[np.ix_(pool, pool)]
+
+        node_hours = np.concatenate([[0], visit_hours[pool], [0]])
+        node_prices = np.concatenate([[0], prices[pool], [0]])
+        in_route = np.zeros(num_nodes + 1, dtype=bool)
+        in_route[0] = in_route[num_nodes] = True
+
+        # Nearest-neighbor seed
+        route = []
+        day_total_time = 0
+        day_total_budget = 0
+        current = 0
+        while True:
+            place_total_time = node_hours + distances[current] * km_to_hours
+            fits = ~in_route & ~(day_total_time + place_total_time > time)
+            if budget:
+                fits &= ~(day_total_budget + node_prices > budget)
+            if not fits.any():
+                break
+
+            current = int(np.argmin(np.where(fits, distances[current], np.inf)))
+            route.append(current)
+            in_route[current] = True
+            day_total_time += place_total_time[current]
+            day_total_budget += node_prices[current]
+
+        # 2-opt, then use the time it frees up for more places
+        route = _two_opt(route, distances)
+        while True:
+            path = np.array([0] + route)
+            travel_hours = distances[path[:-1], path[1:]].sum() * km_to_hours
+            day_total_time = node_hours[route].sum() + travel_hours
+
+            previous_nodes = path
+            next_nodes = np.array(route + [num_nodes])
+            inserted = False
+            for node in np.flatnonzero(~in_route):
+                added_km = (distances[node, previous_nodes] + distances[node, next_nodes]
+                            - distances[previous_nodes, next_nodes])
+                slot = int(np.argmin(added_km))
+                if day_total_time + node_hours[node] + added_km[slot] * km_to_hours > time:
+                    continue
+                if budget and day_total_budget + node_prices[node] > budget:
+                    continue
+
+                route.insert(slot, int(node))
+                in_route[node] = True
+                day_total_budget += node_prices[node]
+                inserted = True
+                break
+
+            if not inserted:
+                break
+            route = _two_opt(route, distances)
+
+        path = np.array([0] + route, dtype=np.intp)
+        leg_km = distances[path[:-1], path[1:]]
+        positions = pool[path[1:] - 1]
+        visited[positions] = True
+
+        day_plans.append((positions, leg_km, (leg_km / AVERAGE_SPEED_KMH) * 60))
+        total_time_per_day.append(float(visit_hours[positions].sum() + leg_km.sum() * km_to_hours))
+        total_budget_per_day.append(float(prices[positions].sum()))
+
+    return day_plans, total_time_per_day, total_budget_per_day
@@ -0,0 +1,173 @@
+import argparse
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+
+from build_info import git_commit
+
+CITIES = ['Jakarta', 'Yogyakarta', 'Bandung', 'Semarang', 'Surabaya']
+
+
+def read_requests(path):
+    """
+    Read the requests to replay, one JSON object per line.
+
+    A line is either a /recommend payload, or {"method", "path", "body"} for
+    any other endpoint.
+
+    Returns:
+        A list of (method, path, body) tuples.
+    """
+    replay = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if 'path' in entry:
+                replay.append((entry.get('method', 'POST'), entry['path'], entry.get('body')))
+            else:
+                replay.append(('POST', '/recommend', entry))
+    return replay
+
+
+def generate_requests(count, data_dir='Data', seed=0):
+    """Random /recommend payloads over the users and cities of the catalog."""
+    rng = np.random.default_rng(seed)
+    user_ids = pd.read_csv(f'{data_dir}/user.csv')['User_Id'].to_numpy()
+    replay = []
+    for _ in range(count):
+        replay.append(('POST', '/recommend', {
+            'user_id': int(rng.choice(user_ids)) if rng.random() < 0.9 else int(user_ids.max() + 1 + rng.integers(100)),
+            'user_lat': float(rng.uniform(-7.8, -6.1)),
+            'user_lng': float(rng.uniform(106.7, 112.8)),
+            'user_city': str(rng.choice(CITIES)),
+            'days': int(rng.integers(1, 4)),
+            'budget': [None, 50000, 200000][rng.integers(3)]
+        }))
+    return replay
+
+
+def run_load(url, replay, concurrency=8, duration=None, total=None):
+    """
+    Send the requests to a running server from `concurrency` threads.
+
+    Each thread keeps one HTTP connection open and takes the next request of
+    the replay list (cycling through it) until `total` requests were sent or
+    `duration` seconds passed; by default every request is sent once.
+
+    Returns:
+        A dict with latency percentiles, throughput and status counts.
+    """
+    target = urlparse(url)
+    total = total if total is not None else (None if duration else len(replay))
+    deadline = time.perf_counter() + duration if duration else None
+
+    lock = threading.Lock()
+    position = [0]
+    latencies, statuses, errors = [], {}, []
+
+    def next_request():
+        with lock:
+            if total is not None and position[0] >= total:
+                return None
+            if deadline is not None and time.perf_counter() >= deadline:
+                return None
+            request = replay[position[0] % len(replay)]
+            position[0] += 1
+            return request
+
+    def worker():
+        connection = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=60)
+        while True:
+            request = next_request()
+            if request is None:
+                break
+            method, path, body = request
+            data = json.dumps(body) if body is not None else None
+            start = time.perf_counter()
+            try:
+                connection.request(method, path, body=data, headers={'Content-Type': 'application/json'})
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                connection = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=60)
+                status = type(e).__name__
+            elapsed = time.perf_counter() - start
+
+            with lock:
+                latencies.append(elapsed)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+                if status != 200 and len(errors) < 10:
+                    errors.append(f'{method} {path}: {status}')
+        connection.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_seconds = time.perf_counter() - start
+
+    milliseconds = np.asarray(latencies) * 1000
+    return {
+        'requests': len(latencies),
+        'concurrency': concurrency,
+        'wall_seconds': wall_seconds,
+        'rps': len(latencies) / wall_seconds if wall_seconds else 0.0,
+        'mean_ms': float(milliseconds.mean()) if len(milliseconds) else None,
+        'p50_ms': float(np.percentile(milliseconds, 50)) if len(milliseconds) else None,
+        'p95_ms': float(np.percentile(milliseconds, 95)) if len(milliseconds) else None,
+        'p99_ms': float(np.percentile(milliseconds, 99)) if len(milliseconds) else None,
+        'max_ms': float(milliseconds.max()) if len(milliseconds) else None,
+        'statuses': statuses,
+        'sample_errors': errors
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay requests against a running server and report latency and throughput.")
+    parser.add_argument('requests_file', nargs='?',
+                        help="JSON lines of /recommend payloads or {method, path, body}; random payloads if omitted")
+    parser.add_argument('--url', default='http://localhost:8080')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=None, help="Seconds to run, cycling through the requests")
+    parser.add_argument('--requests', type=int, default=None, help="Requests to send, cycling through the file")
+    parser.add_argument('--generate', type=int, default=200, help="Random payloads to use without a requests file")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='load_test_results.json')
+    args = parser.parse_args()
+
+    replay = read_requests(args.requests_file) if args.requests_file else generate_requests(args.generate, seed=args.seed)
+    result = run_load(args.url, replay, args.concurrency, args.duration, args.requests)
+    result.update({
+        'commit': git_commit(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'url': args.url,
+        'requests_file': args.requests_file
+    })
+
+    print(f"{result['requests']} requests in {result['wall_seconds']:.1f} s with concurrency {args.concurrency}: "
+          f"{result['rps']:.1f} req/s")
+    if result['requests']:
+        print(f"latency p50 {result['p50_ms']:.1f} ms  p95 {result['p95_ms']:.1f} ms  p99 {result['p99_ms']:.1f} ms  "
+              f"max {result['max_ms']:.1f} ms")
+    print(f"statuses: {result['statuses']}")
+
+    with open(args.output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == '__main__':
+    # Load test against a running server (python app.py, or gunicorn -c gunicorn.conf.py wsgi:app):
+    #   python load_test.py [requests.jsonl] [--url http://localhost:8080] [--concurrency 8] [--duration 30]
+    main()
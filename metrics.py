@@ -0,0 +1,252 @@
+import bisect
+import cProfile
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram buckets of request and stage durations, in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Histogram buckets of candidate set sizes, in places
+SIZE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter, one value per combination of label values."""
+
+    type = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            yield self.name, list(zip(self.labels, label_values)), value
+
+
+class Histogram:
+    """
+    Cumulative histogram over fixed buckets, one per combination of label values.
+
+    Observing is a bisect and three additions under a lock, cheap enough
+    for every stage of every request.
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(label_values)
+            if counts is None:
+                counts = self._values[label_values] = [0] * (len(self.buckets) + 2)
+            counts[position] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = {label_values: list(counts) for label_values, counts in self._values.items()}
+        for label_values, counts in sorted(values.items()):
+            labels = list(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts[:-1]):
+                cumulative += count
+                yield f'{self.name}_bucket', labels + [('le', _format_value(float(bound)))], cumulative
+            yield f'{self.name}_count', labels, cumulative
+            yield f'{self.name}_sum', labels, counts[-1]
+
+
+class Registry:
+    """
+    The metrics of one process, rendered in the Prometheus text format.
+
+    Besides counters and histograms, collectors can report values kept
+    elsewhere (e.g. the result cache counters): each is called at render time
+    and returns (name, type, documentation, {((label, value), ...): value})
+    entries.
+
+    Under gunicorn every worker has its own registry, so each scrape reports
+    the worker that served it; the pid label tells them apart.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, documentation, labels=()):
+        metric = Counter(name, documentation, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, documentation, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        """Return the exposition text of every metric."""
+        pid = [('pid', os.getpid())]
+        lines = []
+
+        def add(name, metric_type, documentation, samples):
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            for sample_name, labels, value in samples:
+                lines.append(f'{sample_name}{_format_labels(labels + pid)} {_format_value(value)}')
+
+        for metric in self._metrics:
+            add(metric.name, metric.type, metric.documentation, metric.samples())
+        for collector in self._collectors:
+            for name, metric_type, documentation, values in collector():
+                add(name, metric_type, documentation,
+                    [(name, list(labels), value) for labels, value in values.items()])
+
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.counter('recommender_requests_total', 'HTTP requests served.', ['endpoint', 'method', 'status'])
+REQUEST_SECONDS = REGISTRY.histogram('recommender_request_duration_seconds', 'HTTP request latency.', ['endpoint'])
+STAGE_SECONDS = REGISTRY.histogram('recommender_stage_duration_seconds',
+                                   'Latency of each stage of the recommendation pipeline.', ['stage'])
+CANDIDATES = REGISTRY.histogram('recommender_candidate_set_size', 'Places entering each stage of a recommendation.',
+                                ['stage'], SIZE_BUCKETS)
+PROFILES = REGISTRY.counter('recommender_profiled_requests_total', 'Requests run under the sampling profiler.')
+
+# Spans of the request being served by each thread, when a trace was started
+_trace = threading.local()
+
+
+def start_trace():
+    """Collect the spans of the current thread from now on, until end_trace()."""
+    _trace.spans = []
+
+
+def end_trace():
+    """
+    Stop collecting spans on the current thread.
+
+    Returns:
+        The (stage, seconds) spans recorded since start_trace(), in order.
+    """
+    spans = getattr(_trace, 'spans', None)
+    _trace.spans = None
+    return spans or []
+
+
+@contextmanager
+def span(stage):
+    """
+    Time a block as one stage of the pipeline.
+
+    The duration goes to the stage histogram and, if a trace is active on
+    this thread, to the trace of the current request.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage)
+        spans = getattr(_trace, 'spans', None)
+        if spans is not None:
+            spans.append((stage, elapsed))
+
+
+def observe_candidates(stage, count):
+    CANDIDATES.observe(count, stage)
+
+
+class RequestProfiler:
+    """
+    Opt-in sampling profiler: runs a random share of requests under cProfile.
+
+    Each sampled request writes a .prof file (readable with pstats or
+    snakeviz) to the output directory. Only one request is profiled at a
+    time; requests sampled while another is being profiled run normally.
+    Profiling stops when the view returns, so streamed response bodies are
+    not covered.
+    """
+
+    def __init__(self, sample_rate=0.0, output_dir='profiles'):
+        """
+        Args:
+            sample_rate (float): Share of requests to profile, 0 to disable.
+            output_dir (str): Directory the profiles are written to.
+        """
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir
+        self._busy = threading.Lock()
+        self._written = 0
+
+    def start(self):
+        """
+        Start profiling the current request if it is sampled.
+
+        Returns:
+            The running profiler, or None if the request is not profiled.
+        """
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        if not self._busy.acquire(blocking=False):
+            return None
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def stop(self, profiler, name):
+        """
+        Stop a profiler returned by start() and write its profile.
+
+        Returns:
+            The path of the written profile.
+        """
+        profiler.disable()
+        try:
+            self._written += 1
+            os.makedirs(self.output_dir, exist_ok=True)
+            path = os.path.join(self.output_dir,
+                                f'{name}-{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-{self._written}.prof')
+            profiler.dump_stats(path)
+        finally:
+            self._busy.release()
+        PROFILES.inc()
+        return path
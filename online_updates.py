@@ -0,0 +1,448 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from cf_engine import EmbeddingScorer
+
+logger = logging.getLogger(__name__)
+
+RATING_MIN = 1
+RATING_MAX = 5
+
+# Ridge penalty of the least-squares fold-in of new users
+FOLD_IN_REG = 3.0
+
+
+class RatingLog:
+    """
+    Append-only write-ahead log of ingested ratings, one JSON object per line.
+
+    Each append is a single O_APPEND write followed by an fsync, so several
+    server processes can share one log file: every process tails it from its
+    own offset and applies each rating once. Only complete lines are read,
+    so a reader never sees a half-written entry.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Log file; created on the first append.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def append(self, entries):
+        """
+        Durably append entries to the log.
+
+        Args:
+            entries: List of JSON-serializable dicts.
+
+        Returns:
+            The size of the log after the write, in bytes.
+        """
+        data = ''.join(json.dumps(entry) + '\n' for entry in entries).encode('utf-8')
+        with self._lock:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                written = 0
+                while written < len(data):
+                    written += os.write(fd, data[written:])
+                os.fsync(fd)
+                return os.fstat(fd).st_size
+            finally:
+                os.close(fd)
+
+    def read(self, offset=0, end=None):
+        """
+        Read the entries written after a byte offset.
+
+        Args:
+            offset (int): Where to start reading.
+            end (int): Where to stop reading; defaults to the end of the log.
+
+        Returns:
+            The list of entries and the offset to continue reading from.
+        """
+        if not os.path.exists(self.path):
+            return [], offset
+
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            data = f.read() if end is None else f.read(max(end - offset, 0))
+
+        end = data.rfind(b'\n') + 1  # Skip a trailing line still being written
+        entries = [json.loads(line) for line in data[:end].splitlines() if line.strip()]
+        return entries, offset + end
+
+
+def fold_in_user(place_embeddings, place_bias, place_rows, ratings, reg=FOLD_IN_REG):
+    """
+    Fit a user vector and bias to their ratings, keeping the place embeddings fixed.
+
+    This is the user half of an ALS step: a ridge regression of
+    rating - place_bias on [place_vec, 1].
+
+    Args:
+        place_embeddings: Array of shape (num_places, embedding_size).
+        place_bias: Array of shape (num_places,).
+        place_rows: Embedding rows of the rated places.
+        ratings: The user's ratings, aligned with place_rows.
+        reg (float): Ridge penalty.
+
+    Returns:
+        The user vector and the user bias.
+    """
+    features = np.hstack([place_embeddings[place_rows], np.ones((len(place_rows), 1), dtype=np.float32)])
+    targets = np.asarray(ratings, dtype=np.float32) - place_bias[place_rows]
+    gram = features.T @ features + reg * np.eye(features.shape[1], dtype=np.float32)
+    solution = np.linalg.solve(gram, features.T @ targets)
+    return solution[:-1], solution[-1]
+
+
+def model_fingerprint(scorer):
+    """Hash of the embedding tables of a CF model, identifying it in checkpoints."""
+    digest = hashlib.sha256()
+    for table in (scorer.user_embeddings, scorer.place_embeddings, scorer.user_bias, scorer.place_bias):
+        digest.update(np.ascontiguousarray(table).tobytes())
+    return digest.hexdigest()
+
+
+def save_checkpoint(path, model, offset, scorer, user_ids, folded_in):
+    """
+    Atomically write the updated tables and the log offset they include.
+
+    Args:
+        path (str): Output .npz file.
+        model (str): model_fingerprint() of the trained tables the updates started from.
+        offset (int): Rating log offset up to which the tables include the ratings.
+        scorer: The updated EmbeddingScorer.
+        user_ids: User ids of the scorer rows.
+        folded_in: Users added after training.
+    """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            # Ids go through JSON: they mix ints and strings, which a numpy array would not keep apart
+            np.savez(
+                f,
+                model=np.array(model),
+                offset=np.array(offset),
+                user_embeddings=scorer.user_embeddings,
+                place_embeddings=scorer.place_embeddings,
+                user_bias=scorer.user_bias,
+                place_bias=scorer.place_bias,
+                user_ids=np.array(json.dumps(list(user_ids))),
+                folded_in=np.array(json.dumps(list(folded_in)))
+            )
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def load_checkpoint(path):
+    """
+    Read a checkpoint written by save_checkpoint().
+
+    Returns:
+        A dict with model, offset, scorer, user_ids and folded_in, or None
+        when there is no readable checkpoint.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as arrays:
+            return {
+                'model': str(arrays['model']),
+                'offset': int(arrays['offset']),
+                'scorer': EmbeddingScorer(arrays['user_embeddings'], arrays['place_embeddings'],
+                                          arrays['user_bias'], arrays['place_bias']),
+                'user_ids': json.loads(str(arrays['user_ids'])),
+                'folded_in': set(json.loads(str(arrays['folded_in'])))
+            }
+    except Exception:
+        logger.exception("Could not read the online update checkpoint %s", path)
+        return None
+
+
+class OnlineUpdater:
+    """
+    Background thread folding logged ratings into the live CF model.
+
+    Each update reads the rating log past the last applied offset. It then:
+      - adds the ratings to the user profile store (existence, top categories),
+      - fits users the trained model does not know by a least-squares fold-in
+        over all their ratings against the fixed place embeddings; such users
+        are refitted the same way whenever they rate more places,
+      - takes a few gradient steps on the rated places, and on the trained
+        users that rated them, over the new ratings only.
+
+    The updated tables form a new EmbeddingScorer that is swapped into the
+    context in one step. Requests keep using the old tables until then, and
+    user rows are only ever appended, so indices handed out before a swap
+    stay valid. Work per update is proportional to the new ratings, apart
+    from copying the embedding tables.
+
+    The gradient steps are not idempotent, so the updated tables are
+    checkpointed together with the log offset they include. A new process,
+    or a reloaded context of the same model, resumes from the checkpoint:
+    the ratings before its offset only go to the profile store, and the
+    model is updated with the later ones.
+    """
+
+    def __init__(self, context, log, interval=60, gradient_steps=3, learning_rate=0.01, reg=FOLD_IN_REG,
+                 gradient_reg=0.01, compact_after=256, on_update=None, checkpoint_path=None,
+                 checkpoint_interval=300):
+        """
+        Args:
+            context: ServingContext to update.
+            log: RatingLog to read.
+            interval (float): Seconds between updates when nothing calls notify().
+            gradient_steps (int): Gradient steps over the new ratings per update.
+            learning_rate (float): Step size of those steps.
+            reg (float): Ridge penalty of the fold-in.
+            gradient_reg (float): L2 penalty of the gradient steps.
+            compact_after (int): Compact the profile store once this many users
+                have ratings pending in it.
+            on_update: Called without arguments after each applied update
+                (e.g. to invalidate cached responses).
+            checkpoint_path (str): Checkpoint of the updated embedding tables to
+                resume from and write to; None disables checkpoints.
+            checkpoint_interval (float): Minimum seconds between checkpoints.
+        """
+        self.context = context
+        self.log = log
+        self.interval = interval
+        self.gradient_steps = gradient_steps
+        self.learning_rate = learning_rate
+        self.reg = reg
+        self.gradient_reg = gradient_reg
+        self.compact_after = compact_after
+        self.on_update = on_update
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+
+        self.offset = 0
+        self.applied = 0
+        self.last_update = None
+        self.last_checkpoint = None
+        self.folded_in = set()  # Users added after training, refitted by fold-in
+        self.model = None  # Fingerprint of the trained tables, set when resuming
+        self._resumed = False
+
+        self._update_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='online-updater', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def notify(self):
+        """Run the next update now instead of at the next interval."""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.update()
+            except Exception:
+                logger.exception("Online update failed")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def update(self):
+        """
+        Apply every logged rating not applied yet.
+
+        Returns:
+            The number of ratings applied.
+        """
+        with self._update_lock:
+            if not self._resumed:
+                self._resume()
+
+            entries, offset = self.log.read(self.offset)
+            if not entries:
+                self.offset = offset
+                return 0
+
+            user_ids, place_ids, ratings = self._add_to_profiles(entries)
+            if isinstance(self.context.cf_scorer, EmbeddingScorer):
+                self._update_embeddings(user_ids, place_ids, ratings)
+
+            self.offset = offset
+            self.applied += len(entries)
+            self.last_update = time.time()
+            if self.last_checkpoint is None or self.last_update - self.last_checkpoint >= self.checkpoint_interval:
+                self.checkpoint()
+
+        if self.on_update is not None:
+            self.on_update()
+        return len(entries)
+
+    def _add_to_profiles(self, entries):
+        user_ids = [entry['user_id'] for entry in entries]
+        place_ids = [entry['place_id'] for entry in entries]
+        ratings = np.array([entry['rating'] for entry in entries], dtype=np.float32)
+
+        profiles = self.context.user_profiles
+        profiles.add_ratings(user_ids, place_ids, ratings)
+        if len(profiles.pending) >= self.compact_after:
+            profiles.compact()
+        return user_ids, place_ids, ratings
+
+    def _resume(self):
+        """Start from the checkpoint, if it was written from the context's model and rating log."""
+        self._resumed = True
+        ctx = self.context
+        scorer = ctx.cf_scorer
+        if self.checkpoint_path is None or not isinstance(scorer, EmbeddingScorer):
+            return
+
+        self.model = model_fingerprint(scorer)
+        checkpoint = load_checkpoint(self.checkpoint_path)
+        if checkpoint is None:
+            return
+        if checkpoint['model'] != self.model or checkpoint['user_ids'][:len(ctx.user_ids)] != list(ctx.user_ids):
+            logger.info("Online update checkpoint %s is of another model, replaying the rating log",
+                        self.checkpoint_path)
+            return
+
+        # Ratings the checkpoint includes only go to the profiles
+        entries, offset = self.log.read(0, end=checkpoint['offset'])
+        if offset != checkpoint['offset']:
+            logger.warning("Rating log %s is shorter than its checkpoint, replaying it", self.log.path)
+            return
+        if entries:
+            self._add_to_profiles(entries)
+        ctx.swap_cf_model(checkpoint['scorer'], checkpoint['user_ids'])
+        self.folded_in = checkpoint['folded_in']
+        self.offset = offset
+        self.applied = len(entries)
+        logger.info("Resumed online updates at offset %d of %s", offset, self.log.path)
+
+    def checkpoint(self):
+        """Write the updated embedding tables and the log offset they include."""
+        scorer = self.context.cf_scorer
+        if self.checkpoint_path is None or self.model is None or not isinstance(scorer, EmbeddingScorer):
+            return
+        save_checkpoint(self.checkpoint_path, self.model, self.offset, scorer, self.context.user_ids,
+                        self.folded_in)
+        self.last_checkpoint = time.time()
+
+    def switch_to(self, context):
+        """
+        Continue on another context, e.g. a freshly reloaded one.
+
+        The rating log is first replayed into the new context, from the
+        checkpoint when it is of the same model, without holding up updates
+        of the current one; then, with updates paused, the
+        ratings logged meanwhile are applied and the updater moves over.
+        Call it before the new context starts serving, so it never serves
+        without the logged ratings.
+        """
+        replay = OnlineUpdater(context, self.log, gradient_steps=self.gradient_steps,
+                               learning_rate=self.learning_rate, reg=self.reg, gradient_reg=self.gradient_reg,
+                               compact_after=self.compact_after, checkpoint_path=self.checkpoint_path,
+                               checkpoint_interval=self.checkpoint_interval)
+        replay.update()
+
+        with self._update_lock:
+            replay.update()
+            self.context = context
+            self.offset = replay.offset
+            self.applied = replay.applied
+            self.folded_in = replay.folded_in
+            self.model = replay.model
+            self.last_checkpoint = replay.last_checkpoint
+
+    def _update_embeddings(self, user_ids, place_ids, ratings):
+        ctx = self.context
+        scorer = ctx.cf_scorer
+
+        def embedding_rows(ids):
+            rows = np.array([ctx.place_id_to_index.get(place_id, -1) for place_id in ids], dtype=np.intp)
+            rows[rows >= scorer.num_places] = -1
+            return rows
+
+        # Copies, so requests keep scoring against the current tables until the swap
+        user_embeddings, user_bias = scorer.user_embeddings, scorer.user_bias
+        place_embeddings, place_bias = scorer.place_embeddings.copy(), scorer.place_bias.copy()
+        user_id_list = list(ctx.user_ids)
+        user_index = dict(ctx.user_id_to_index)
+
+        # Least-squares fold-in of new users, and of users added by earlier updates
+        fold_in = [user_id for user_id in dict.fromkeys(user_ids)
+                   if user_id not in user_index or user_id in self.folded_in]
+        solved = {}
+        for user_id in fold_in:
+            rated_places, user_ratings = ctx.user_profiles.user_ratings(user_id)
+            rows = embedding_rows(rated_places)
+            known = rows >= 0
+            if known.any():
+                solved[user_id] = fold_in_user(place_embeddings, place_bias, rows[known], user_ratings[known], self.reg)
+
+        new_users = [user_id for user_id in solved if user_id not in user_index]
+        for user_id in new_users:
+            user_index[user_id] = len(user_id_list)
+            user_id_list.append(user_id)
+        user_embeddings = np.vstack([user_embeddings, np.zeros((len(new_users), user_embeddings.shape[1]),
+                                                               dtype=np.float32)])
+        user_bias = np.concatenate([user_bias, np.zeros(len(new_users), dtype=np.float32)])
+        for user_id, (vector, bias) in solved.items():
+            user_embeddings[user_index[user_id]] = vector
+            user_bias[user_index[user_id]] = bias
+        self.folded_in.update(solved)
+
+        # Gradient steps over the new ratings; folded-in users were just solved exactly
+        rows = embedding_rows(place_ids)
+        users = np.array([user_index.get(user_id, -1) for user_id in user_ids], dtype=np.intp)
+        known = (rows >= 0) & (users >= 0)
+        rows, users, targets = rows[known], users[known], ratings[known]
+        trained = np.array([user_ids[position] not in self.folded_in for position in np.flatnonzero(known)],
+                           dtype=bool)
+
+        for _ in range(self.gradient_steps):
+            errors = targets - (np.einsum('ij,ij->i', user_embeddings[users], place_embeddings[rows])
+                                + user_bias[users] + place_bias[rows])
+
+            user_vectors = user_embeddings[users]
+            place_gradient = errors[:, None] * user_vectors - self.gradient_reg * place_embeddings[rows]
+            user_gradient = (errors[:, None] * place_embeddings[rows] - self.gradient_reg * user_vectors)[trained]
+
+            np.add.at(place_embeddings, rows, self.learning_rate * place_gradient)
+            np.add.at(place_bias, rows, self.learning_rate * errors)
+            np.add.at(user_embeddings, users[trained], self.learning_rate * user_gradient)
+            np.add.at(user_bias, users[trained], self.learning_rate * errors[trained])
+
+        ctx.swap_cf_model(EmbeddingScorer(user_embeddings, place_embeddings, user_bias, place_bias), user_id_list)
+
+    def stats(self):
+        return {
+            'log_offset': self.offset,
+            'applied': self.applied,
+            'folded_in_users': len(self.folded_in),
+            'last_update': self.last_update,
+            'last_checkpoint': self.last_checkpoint,
+            'interval': self.interval
+        }
@@ -0,0 +1,102 @@
+import numpy as np
+
+
+def _read_only(positions):
+    positions = np.asarray(positions, dtype=np.intp)
+    positions.setflags(write=False)
+    return positions
+
+
+class PlaceIndex:
+    """
+    Row positions of the place catalog by city and category, built once at startup.
+
+    Candidate selection in filter_places becomes a dictionary lookup: the
+    positions of a (city, category) block are stored sorted, so a single block
+    is returned as-is and a multi-category request only merges a few small
+    arrays. Per-city category mean ratings, used to pick categories for new
+    users, are precomputed as well.
+
+    Cities are matched case-insensitively by substring, like the
+    str.contains filter this replaces, but against the handful of distinct
+    city names rather than every row.
+    """
+
+    def __init__(self, places):
+        """
+        Args:
+            places: DataFrame with City, Category and Rating columns (e.g.
+                merged_final). Returned positions index its rows.
+        """
+        self.places = places
+
+        categories = places['Category']
+        cities = places['City'].str.lower()
+
+        self.all_rows = _read_only(np.arange(len(places)))
+        self.by_category = {category: _read_only(rows)
+                            for category, rows in places.groupby(categories, sort=False).indices.items()}
+
+        self.by_city = {}  # normalized city -> category -> positions
+        self.city_rows = {}  # normalized city -> positions of every place in the city
+        for city, rows in places.groupby(cities, sort=False).indices.items():
+            self.city_rows[city] = _read_only(rows)
+
+            city_categories = categories.to_numpy()[rows]
+            self.by_city[city] = {category: _read_only(rows[city_categories == category])
+                                  for category in categories.iloc[rows].dropna().unique()}
+
+        # Same computation as the new-user branch of recommend_tourist_destinations, done once per city
+        self.city_category_ratings = {
+            city: places.iloc[rows].groupby('Category')['Rating'].mean().sort_values(ascending=False)
+            for city, rows in self.city_rows.items()
+        }
+
+    def match_cities(self, city):
+        """Normalized names of the cities that contain `city` (case-insensitive)."""
+        query = city.lower()
+        return [name for name in self.by_city if query in name]
+
+    def lookup(self, city=None, categories=None):
+        """
+        Positions of the places in a city and set of categories.
+
+        Args:
+            city (str): City name, matched case-insensitively by substring (optional).
+            categories: List of categories to keep (optional).
+
+        Returns:
+            A sorted, read-only array of row positions into the catalog.
+        """
+        if city:
+            blocks = []
+            for name in self.match_cities(city):
+                if categories:
+                    blocks.extend(self.by_city[name][category] for category in categories
+                                  if category in self.by_city[name])
+                else:
+                    blocks.append(self.city_rows[name])
+        elif categories:
+            blocks = [self.by_category[category] for category in categories if category in self.by_category]
+        else:
+            return self.all_rows
+
+        if not blocks:
+            return _read_only([])
+        if len(blocks) == 1:
+            return blocks[0]
+        return _read_only(np.unique(np.concatenate(blocks)))
+
+    def category_ratings(self, city):
+        """
+        Mean place rating per category in a city, highest first.
+
+        Returns:
+            A Series indexed by category.
+        """
+        cities = self.match_cities(city)
+        if len(cities) == 1:
+            return self.city_category_ratings[cities[0]]
+
+        rows = self.lookup(city)
+        return self.places.iloc[rows].groupby('Category')['Rating'].mean().sort_values(ascending=False)
@@ -0,0 +1,163 @@
+import numpy as np
+
+from itinerary import haversine
+
+# Ratings are on a 1-5 scale; they are mapped to [0, 1] before weighting
+RATING_MIN = 1.0
+RATING_MAX = 5.0
+
+
+class RankingWeights:
+    """
+    Weights of the hybrid ranking score of a candidate place:
+
+        similarity * max CBF similarity
+        + cf * CF rating (scaled to [0, 1])
+        + popularity * mean user rating (scaled to [0, 1])
+        - distance * d / (d + distance_scale_km), d = km from the user
+    """
+
+    NAMES = ('similarity', 'cf', 'popularity', 'distance', 'distance_scale_km')
+
+    def __init__(self, similarity=1.0, cf=1.0, popularity=0.5, distance=0.5, distance_scale_km=10.0):
+        self.similarity = similarity
+        self.cf = cf
+        self.popularity = popularity
+        self.distance = distance
+        self.distance_scale_km = distance_scale_km
+
+    @classmethod
+    def from_spec(cls, spec):
+        """
+        Parse weights like "cf=2,distance=0"; names that are left out keep their default.
+
+        Raises:
+            ValueError: If a name is unknown or a value is not a number.
+        """
+        weights = {}
+        for item in (spec or '').split(','):
+            if not item.strip():
+                continue
+            name, _, value = item.partition('=')
+            name = name.strip()
+            if name not in cls.NAMES:
+                raise ValueError(f"Unknown ranking weight {name!r}; expected one of {', '.join(cls.NAMES)}")
+            weights[name] = float(value)
+        return cls(**weights)
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.NAMES}
+
+
+class Ranking:
+    """Ranked unique candidates, best first, as aligned arrays."""
+
+    def __init__(self, place_ids, rows, similarity, cf_ratings, mse, scores, mean_mse):
+        self.place_ids = place_ids  # Place_Id of each ranked place
+        self.rows = rows  # Its row in the ranker's place table
+        self.similarity = similarity  # Highest CBF similarity of the place
+        self.cf_ratings = cf_ratings
+        self.mse = mse  # (Rating - cf_rating) ** 2
+        self.scores = scores
+        self.mean_mse = mean_mse  # Mean mse over all candidates, ranked or not
+
+
+def _scaled_rating(ratings):
+    return np.clip((ratings - RATING_MIN) / (RATING_MAX - RATING_MIN), 0.0, 1.0)
+
+
+class HybridRanker:
+    """
+    Ranks CBF/CF candidates in one pass over arrays aligned with the place catalog.
+
+    The catalog columns the ranking and the itinerary need are pulled out of
+    the places DataFrame once, by Place_Id order. A request then only maps
+    its candidate ids to rows (one searchsorted), folds the CBF rows of each
+    place into one (the max similarity), scores every candidate, and sorts
+    just the top k found by argpartition.
+    """
+
+    def __init__(self, places):
+        """
+        Args:
+            places: Place catalog with Place_Id, Rating, Mean_Rating, Lat and
+                Long columns (e.g. merged_final). Its other columns are kept
+                too, for building the ranked DataFrame.
+        """
+        places = places[places['Place_Id'].notna()]
+        order = np.argsort(places['Place_Id'].to_numpy(), kind='stable')
+
+        self.place_ids = places['Place_Id'].to_numpy()[order]
+        self.columns = {column: places[column].to_numpy()[order] for column in places.columns}
+
+        self.lats = self.columns['Lat'].astype(float)
+        self.lngs = self.columns['Long'].astype(float)
+        self.ratings = self.columns['Rating'].astype(float)
+        self.popularity = _scaled_rating(self.columns['Mean_Rating'].astype(float))
+
+    def rows(self, place_ids):
+        """Rows of place_ids in the catalog arrays, -1 for unknown ids."""
+        place_ids = np.asarray(place_ids)
+        if len(self.place_ids) == 0:
+            return np.full(len(place_ids), -1, dtype=np.intp)
+        rows = np.clip(np.searchsorted(self.place_ids, place_ids), 0, len(self.place_ids) - 1)
+        return np.where(self.place_ids[rows] == place_ids, rows, -1)
+
+    def rank(self, place_ids, similarity, cf_place_ids, cf_ratings, user_lat, user_lng, weights, top_k=None):
+        """
+        Score candidates and return the best ones in ranking order.
+
+        Args:
+            place_ids: Place_Id of each CBF row; places may repeat.
+            similarity: CBF similarity of each row.
+            cf_place_ids: Places with a CF rating.
+            cf_ratings: Their CF ratings.
+            user_lat, user_lng: Starting point, for the distance penalty.
+            weights: RankingWeights.
+            top_k (int): Number of places to return; None for all of them.
+
+        Returns:
+            A Ranking.
+        """
+        # One entry per distinct known place, with its best CBF similarity
+        unique_ids, inverse = np.unique(np.asarray(place_ids), return_inverse=True)
+        best_similarity = np.full(len(unique_ids), -np.inf)
+        np.maximum.at(best_similarity, inverse, np.asarray(similarity, dtype=float))
+
+        rows = self.rows(unique_ids)
+        known = rows >= 0
+        unique_ids, rows, best_similarity = unique_ids[known], rows[known], best_similarity[known]
+
+        # CF ratings aligned with unique_ids; missing ones fall back to popularity
+        cf = np.full(len(unique_ids), np.nan)
+        cf_place_ids = np.asarray(cf_place_ids)
+        if len(cf_place_ids) and len(unique_ids):
+            positions = np.clip(np.searchsorted(unique_ids, cf_place_ids), 0, len(unique_ids) - 1)
+            matched = unique_ids[positions] == cf_place_ids
+            cf[positions[matched]] = np.asarray(cf_ratings, dtype=float)[matched]
+
+        popularity = self.popularity[rows]
+        cf_score = np.where(np.isnan(cf), popularity, _scaled_rating(cf))
+        if user_lat is not None and user_lng is not None:
+            distance_km, _ = haversine(float(user_lat), float(user_lng), self.lats[rows], self.lngs[rows])
+            distance_penalty = distance_km / (distance_km + weights.distance_scale_km)
+        else:
+            distance_penalty = np.zeros(len(rows))
+
+        scores = (weights.similarity * np.maximum(best_similarity, 0.0)
+                  + weights.cf * cf_score
+                  + weights.popularity * popularity
+                  - weights.distance * distance_penalty)
+
+        mse = (self.ratings[rows] - cf) ** 2
+        mean_mse = float(np.nanmean(mse)) if np.isfinite(mse).any() else np.nan
+
+        # Top k by score, then a stable sort of just those (ties keep Place_Id order)
+        if top_k is not None and top_k < len(scores):
+            top = np.argpartition(-scores, top_k - 1)[:top_k] if top_k > 0 else np.empty(0, dtype=np.intp)
+            top = np.sort(top)
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+
+        return Ranking(unique_ids[top], rows[top], best_similarity[top], cf[top], mse[top], scores[top], mean_mse)
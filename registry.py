@@ -0,0 +1,226 @@
+import glob
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from context import ServingContext
+
+logger = logging.getLogger(__name__)
+
+
+# One published version of the serving data and models; replaced, never modified
+ContextVersion = namedtuple('ContextVersion', ['number', 'context', 'fingerprint', 'loaded_at'])
+
+
+def artifact_fingerprint(data_dir, model_dir):
+    """
+    Size and modification time of every artifact a ServingContext reads.
+
+    That is the CSVs of data_dir and every file under model_dir. Other files
+    in data_dir, such as the rating log, are not part of a version.
+
+    Returns:
+        A hashable tuple, equal for two calls iff no artifact changed.
+    """
+    paths = sorted(glob.glob(os.path.join(data_dir, '*.csv'))
+                   + glob.glob(os.path.join(model_dir, '**', '*'), recursive=True))
+    fingerprint = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:  # Removed while listing
+            continue
+        if os.path.isfile(path):
+            fingerprint.append((path, stat.st_size, stat.st_mtime_ns))
+    return tuple(fingerprint)
+
+
+def validate_context(context, num_users=8, num_places=32):
+    """
+    Check that a freshly loaded context can serve before it is published.
+
+    Scores a few users against a few places with the CF scorer and runs the
+    CBF index over one city.
+
+    Raises:
+        ValueError: If a table is empty or a score is not finite.
+    """
+    if context.merged_final.empty:
+        raise ValueError('The place catalog is empty')
+
+    # Rows the model has: the catalog can hold more places than it was trained on
+    scorer = context.cf_scorer
+    scored_users = min(scorer.num_users, len(context.user_ids))
+    scored_places = min(scorer.num_places, len(context.place_ids))
+    if not scored_users or not scored_places:
+        raise ValueError('The CF model has no users or no places')
+    user_rows = np.linspace(0, scored_users - 1, min(num_users, scored_users)).astype(int)
+    place_rows = np.linspace(0, scored_places - 1, min(num_places, scored_places)).astype(int)
+    scores = np.asarray(scorer.score_batch(user_rows.tolist(), place_rows.tolist()))
+    if scores.shape != (len(user_rows), len(place_rows)) or not np.isfinite(scores).all():
+        raise ValueError(f'CF validation scoring failed: got {scores.shape} scores, '
+                         f'{np.size(scores) - np.isfinite(scores).sum()} not finite')
+
+    city = context.merged_final['City'].dropna().iloc[0]
+    places = context.merged_final.iloc[context.place_index.lookup(city, None)]
+    if context.cbf_index.recommend(places).empty:
+        raise ValueError(f'The CBF index returned nothing for {city}')
+
+
+class ContextRegistry:
+    """
+    Versioned holder of the ServingContext requests are served from.
+
+    A reload builds a new context from the data and model directories in the
+    calling (background) thread, warms and validates it, and only then
+    publishes it by replacing one reference. Requests read that reference
+    once, when they start, and keep using the version they got, so in-flight
+    requests finish on the old version while new ones see the new one. A
+    context that fails to load or validate is dropped and the current
+    version keeps serving.
+
+    Reloads are triggered by reload() (e.g. from an admin endpoint) or by the
+    watcher thread, which polls the artifact fingerprint and reloads once a
+    change has been stable for one poll, so half-written files are not
+    picked up.
+    """
+
+    def __init__(self, data_dir='Data', model_dir='Model', context_factory=ServingContext,
+                 prepare=None, on_swap=None):
+        """
+        Args:
+            data_dir (str): Directory with the catalog, rating and flight CSVs.
+            model_dir (str): Directory with the models, indexes and snapshot.
+            context_factory: Called with data_dir and model_dir to build a context.
+            prepare: Called with a validated context right before it is
+                published (e.g. to replay logged ratings into it).
+            on_swap: Called with the old and new ContextVersion after a swap.
+        """
+        self.data_dir = data_dir
+        self.model_dir = model_dir
+        self.context_factory = context_factory
+        self.prepare = prepare
+        self.on_swap = on_swap
+
+        self._current = None
+        self._reload_lock = threading.Lock()
+        self._publish_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+
+        self.reloads = 0
+        self.failed_reloads = 0
+        self.last_error = None
+        self._failed_fingerprint = None  # Not retried until the artifacts change again
+
+    @property
+    def current(self):
+        """The published ContextVersion, creating the first one (lazily loaded) on first use."""
+        version = self._current
+        if version is None:
+            with self._publish_lock:
+                if self._current is None:
+                    self._current = ContextVersion(
+                        1, self.context_factory(data_dir=self.data_dir, model_dir=self.model_dir),
+                        artifact_fingerprint(self.data_dir, self.model_dir), time.time()
+                    )
+                version = self._current
+        return version
+
+    def install(self, context):
+        """Publish an already built context as a new version, without validation."""
+        return self._publish(context, artifact_fingerprint(self.data_dir, self.model_dir))
+
+    def _publish(self, context, fingerprint):
+        with self._publish_lock:
+            old = self._current
+            new = ContextVersion(old.number + 1 if old is not None else 1, context, fingerprint, time.time())
+            self._current = new
+
+        if old is not None and self.on_swap is not None:
+            self.on_swap(old, new)
+        return new
+
+    def reload(self, force=False):
+        """
+        Load, validate and publish a new version if the artifacts changed.
+
+        Runs in the calling thread; requests keep being served from the
+        current version meanwhile. Only one reload runs at a time, and
+        artifacts that failed once are only retried with force.
+
+        Args:
+            force (bool): Reload even if no artifact changed.
+
+        Returns:
+            The new ContextVersion, or None if nothing changed or the new
+            version failed to load or validate.
+        """
+        with self._reload_lock:
+            fingerprint = artifact_fingerprint(self.data_dir, self.model_dir)
+            if not force and fingerprint in (self.current.fingerprint, self._failed_fingerprint):
+                return None
+
+            start = time.perf_counter()
+            try:
+                context = self.context_factory(data_dir=self.data_dir, model_dir=self.model_dir)
+                context.warm_up()
+                validate_context(context)
+                if self.prepare is not None:
+                    self.prepare(context)
+            except Exception as e:
+                self.failed_reloads += 1
+                self.last_error = f'{type(e).__name__}: {e}'
+                self._failed_fingerprint = fingerprint
+                logger.exception("Reload failed, still serving version %d", self.current.number)
+                return None
+
+            version = self._publish(context, fingerprint)
+            self.reloads += 1
+            self.last_error = None
+            logger.info("Serving version %d, loaded and validated in %.1f s",
+                        version.number, time.perf_counter() - start)
+            return version
+
+    def start_watcher(self, interval=30):
+        """Poll the artifacts every `interval` seconds and reload when they change."""
+        if self._watcher is None:
+            self._stop.clear()
+            self._watcher = threading.Thread(target=self._watch, args=(interval,), name='registry-watcher',
+                                             daemon=True)
+            self._watcher.start()
+
+    def stop_watcher(self, timeout=None):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout)
+            self._watcher = None
+
+    def _watch(self, interval):
+        seen = self.current.fingerprint
+        while not self._stop.wait(interval):
+            try:
+                fingerprint = artifact_fingerprint(self.data_dir, self.model_dir)
+                # Reload once the artifacts stopped changing for a whole interval
+                if fingerprint == seen and fingerprint != self.current.fingerprint:
+                    self.reload()
+                seen = fingerprint
+            except Exception:
+                logger.exception("Watching %s and %s failed", self.data_dir, self.model_dir)
+
+    def stats(self):
+        version = self.current
+        return {
+            'version': version.number,
+            'loaded_at': version.loaded_at,
+            'artifacts': len(version.fingerprint),
+            'reloads': self.reloads,
+            'failed_reloads': self.failed_reloads,
+            'last_error': self.last_error,
+            'reloading': self._reload_lock.locked(),
+            'watching': self._watcher is not None
+        }
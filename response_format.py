@@ -0,0 +1,227 @@
+import base64
+import gzip
+import json
+
+import numpy as np
+import pandas as pd
+
+# orjson and brotli are optional: without them responses are encoded with the
+# json module and only gzip is offered
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+RESPONSE_FORMATS = ('records', 'columnar')
+
+# Responses smaller than this are sent uncompressed
+MIN_COMPRESS_SIZE = 1024
+
+
+def parse_fields(value, name):
+    """
+    Read a field projection: a list of column names or a comma-separated string.
+
+    Returns:
+        A list of names, or None to keep every column.
+
+    Raises:
+        ValueError: If the value is neither.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = [field.strip() for field in value.split(',') if field.strip()]
+    if not isinstance(value, list) or not value or not all(isinstance(field, str) for field in value):
+        raise ValueError(f"'{name}' must be a list of field names or a comma-separated string")
+    return value
+
+
+def encode_cursor(offset):
+    return base64.urlsafe_b64encode(json.dumps({'offset': offset}).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    Read a cursor returned as next_cursor by an earlier page.
+
+    Returns:
+        The offset of the page it points to.
+
+    Raises:
+        ValueError: If the cursor was not produced by encode_cursor.
+    """
+    try:
+        offset = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))['offset']
+    except (AttributeError, TypeError, KeyError, UnicodeError, ValueError):
+        raise ValueError(f'Invalid cursor: {cursor!r}') from None
+    if not isinstance(offset, int) or offset < 0:
+        raise ValueError(f'Invalid cursor: {cursor!r}')
+    return offset
+
+
+def parse_response_options(data):
+    """
+    Extract the response shaping options of a /recommend payload.
+
+    Keys:
+        fields: Columns to return for each recommended place.
+        flight_fields: Columns to return for each flight.
+        limit: Page size, applied to every day and to the flights.
+        cursor: next_cursor of the previous page.
+        format: 'records' (a list of objects per table, the default) or
+            'columnar' (one list per column).
+
+    Returns:
+        A dict of build_response keyword arguments.
+
+    Raises:
+        ValueError: If an option is malformed.
+    """
+    limit = data.get('limit')
+    if limit is not None and (not isinstance(limit, int) or isinstance(limit, bool) or limit < 1):
+        raise ValueError(f"'limit' must be a positive integer, got {limit!r}")
+
+    cursor = data.get('cursor')
+    response_format = data.get('format', 'records')
+    if response_format not in RESPONSE_FORMATS:
+        raise ValueError(f"'format' must be one of {', '.join(RESPONSE_FORMATS)}, got {response_format!r}")
+
+    return {
+        'fields': parse_fields(data.get('fields'), 'fields'),
+        'flight_fields': parse_fields(data.get('flight_fields'), 'flight_fields'),
+        'limit': limit,
+        'offset': decode_cursor(cursor) if cursor is not None else 0,
+        'columnar': response_format == 'columnar'
+    }
+
+
+def table(frame, fields=None, columnar=False, offset=0, stop=None):
+    """
+    Convert rows of a DataFrame to JSON-ready Python values.
+
+    The rows are taken out of pandas with a single to_numpy() call rather
+    than per column or per row; NaN becomes None (JSON null), and datetime
+    columns become strings.
+
+    Args:
+        frame: DataFrame to convert.
+        fields: Columns to keep, in order (if applicable).
+        columnar (bool): Return one list per column instead of one dict per row.
+        offset, stop: Range of rows to convert.
+
+    Returns:
+        A list of row dicts, or a dict of column name -> list.
+
+    Raises:
+        ValueError: If a field is not a column of the frame.
+    """
+    if fields is not None:
+        unknown = [field for field in fields if field not in frame.columns]
+        if unknown:
+            raise ValueError(f"Unknown fields {unknown}; available: {', '.join(map(str, frame.columns))}")
+        frame = frame[fields]
+    if offset or stop is not None:
+        frame = frame.iloc[offset:stop]
+
+    datetime_columns = [column for column, dtype in frame.dtypes.items() if dtype.kind == 'M']
+    if datetime_columns:
+        frame = frame.astype({column: str for column in datetime_columns})
+
+    values = frame.to_numpy(dtype=object)
+    missing = pd.isna(values)
+    if missing.any():
+        values = np.where(missing, None, values)  # np.where copies, the cached frame is left as is
+
+    names = [str(column) for column in frame.columns]
+    if columnar:
+        return dict(zip(names, values.T.tolist()))
+    return [dict(zip(names, row)) for row in values.tolist()]
+
+
+def _number(value):
+    value = float(value)
+    return None if np.isnan(value) else value
+
+
+def build_response(result, fields=None, flight_fields=None, limit=None, offset=0, columnar=False):
+    """
+    Build the /recommend response from recommend_tourist_destinations output.
+
+    Args:
+        result: The (recommendations_per_day, total_time_per_day,
+            total_budget_per_day, mse, recommended_flights) tuple.
+        fields, flight_fields, limit, offset, columnar: As returned by
+            parse_response_options.
+
+    Returns:
+        A dict of Python lists and scalars, ready for dumps(). It has a
+        next_cursor key when limit is set (None on the last page).
+    """
+    recommendations_per_day, total_time_per_day, total_budget_per_day, mse, recommended_flights = result
+
+    stop = offset + limit if limit is not None else None
+    response = {
+        'recommendations': [table(day, fields, columnar, offset, stop) for day in recommendations_per_day],
+        'total_time_per_day': [_number(value) for value in total_time_per_day],
+        'total_budget_per_day': [_number(value) for value in total_budget_per_day],
+        'mse': _number(mse),
+        'recommended_flights': table(recommended_flights, flight_fields, columnar, offset, stop)
+    }
+
+    if limit is not None:
+        has_more = any(len(day) > stop for day in recommendations_per_day) or len(recommended_flights) > stop
+        response['next_cursor'] = encode_cursor(stop) if has_more else None
+    return response
+
+
+def dumps(data):
+    """Encode a response as compact UTF-8 JSON bytes, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False, allow_nan=False).encode('utf-8')
+
+
+def _accepted_encodings(accept_encoding):
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+    return accepted
+
+
+def compress(body, accept_encoding):
+    """
+    Compress a response body with the best encoding the client accepts.
+
+    Brotli is preferred over gzip when the brotli package is installed.
+
+    Args:
+        body (bytes): Encoded response.
+        accept_encoding (str): The request's Accept-Encoding header.
+
+    Returns:
+        The (possibly compressed) body and its Content-Encoding, or None if
+        it was left uncompressed.
+    """
+    if len(body) < MIN_COMPRESS_SIZE:
+        return body, None
+
+    accepted = _accepted_encodings(accept_encoding)
+    if brotli is not None and accepted.get('br', 0) > 0:
+        return brotli.compress(body, quality=4), 'br'
+    if accepted.get('gzip', 0) > 0:
+        return gzip.compress(body, compresslevel=5), 'gzip'
+    return body, None
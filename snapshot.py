@@ -0,0 +1,202 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+
+SNAPSHOT_DIR = 'Model/catalog_snapshot'
+SNAPSHOT_VERSION = 1
+
+# Tables of ServingContext stored in the snapshot, and the CSVs they are derived from
+SNAPSHOT_TABLES = ['place', 'rating', 'user', 'flights_data', 'merged_final']
+SOURCE_FILES = [
+    'tourism_with_id.csv',
+    'tourism_rating.csv',
+    'user.csv',
+    'tourism_data_img.csv',
+    'flightsCapstone_cleaned.csv'
+]
+
+# String columns with at most this share of distinct values are dictionary-encoded
+DICTIONARY_RATIO = 0.5
+
+logger = logging.getLogger(__name__)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_column(path, name, values):
+    """Write one column as .npy files and return its manifest entry."""
+    if pd.api.types.is_numeric_dtype(values.dtype) or pd.api.types.is_bool_dtype(values.dtype):
+        np.save(os.path.join(path, f'{name}.npy'), values.to_numpy())
+        return {'name': name, 'kind': 'numeric'}
+
+    missing = values.isna().to_numpy()
+    strings = values.astype(object).where(~missing, '').astype(str)
+
+    if strings.nunique() <= DICTIONARY_RATIO * max(len(strings), 1):
+        codes, categories = pd.factorize(strings)
+        codes = np.where(missing, -1, codes).astype(np.int32)
+        np.save(os.path.join(path, f'{name}.codes.npy'), codes)
+        return {'name': name, 'kind': 'dictionary', 'categories': list(categories)}
+
+    encoded = [value.encode('utf-8') for value in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    np.save(os.path.join(path, f'{name}.offsets.npy'), offsets)
+    np.save(os.path.join(path, f'{name}.data.npy'), np.frombuffer(b''.join(encoded), dtype=np.uint8))
+    np.save(os.path.join(path, f'{name}.missing.npy'), missing)
+    return {'name': name, 'kind': 'text'}
+
+
+def _read_column(path, column):
+    """Read a column written by _write_column; numeric columns stay memory-mapped."""
+    name = column['name']
+    if column['kind'] == 'numeric':
+        return np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+
+    if column['kind'] == 'dictionary':
+        codes = np.load(os.path.join(path, f'{name}.codes.npy'), mmap_mode='r')
+        categories = np.array(column['categories'] + [np.nan], dtype=object)
+        return categories[codes]  # Code -1 picks the trailing NaN
+
+    offsets = np.load(os.path.join(path, f'{name}.offsets.npy'), mmap_mode='r')
+    data = np.load(os.path.join(path, f'{name}.data.npy'), mmap_mode='r').tobytes()
+    missing = np.load(os.path.join(path, f'{name}.missing.npy'))
+    values = np.empty(len(missing), dtype=object)
+    for row in range(len(missing)):
+        values[row] = np.nan if missing[row] else data[offsets[row]:offsets[row + 1]].decode('utf-8')
+    return values
+
+
+class CatalogSnapshot:
+    """Preprocessed tables of a ServingContext, read from a snapshot directory."""
+
+    def __init__(self, path, manifest):
+        self.path = path
+        self.manifest = manifest
+
+    def table(self, name):
+        """
+        Load one table.
+
+        Numeric columns are read-only memory maps, so forked workers share the
+        same pages instead of each holding its own copy.
+        """
+        table = self.manifest['tables'][name]
+        table_path = os.path.join(self.path, name)
+        columns = {column['name']: _read_column(table_path, column) for column in table['columns']}
+        return pd.DataFrame(columns, columns=[column['name'] for column in table['columns']], copy=False)
+
+    def array(self, name):
+        """Load an array stored with the snapshot (e.g. the CF id orderings)."""
+        return np.load(os.path.join(self.path, f'{name}.npy'), mmap_mode='r', allow_pickle=False)
+
+
+def write_snapshot(context, path=SNAPSHOT_DIR):
+    """
+    Write the preprocessed tables and id orderings of a ServingContext.
+
+    The snapshot is written to a temporary directory and renamed into place,
+    so a server never sees a half-written snapshot.
+
+    Args:
+        context: ServingContext reading the CSVs.
+        path (str): Snapshot directory.
+    """
+    tmp_path = path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    manifest = {'version': SNAPSHOT_VERSION, 'sources': {}, 'tables': {}}
+    for filename in SOURCE_FILES:
+        source = os.path.join(context.data_dir, filename)
+        stat = os.stat(source)
+        manifest['sources'][filename] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                                         'sha256': file_sha256(source)}
+
+    for name in SNAPSHOT_TABLES:
+        table = getattr(context, name).reset_index(drop=True)
+        table_path = os.path.join(tmp_path, name)
+        os.makedirs(table_path)
+        manifest['tables'][name] = {
+            'rows': len(table),
+            'columns': [_write_column(table_path, column, table[column]) for column in table.columns]
+        }
+
+    np.save(os.path.join(tmp_path, 'user_ids.npy'), np.asarray(context.user_ids))
+    np.save(os.path.join(tmp_path, 'place_ids.npy'), np.asarray(context.place_ids))
+
+    with open(os.path.join(tmp_path, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(tmp_path, path)
+
+
+def _source_unchanged(path, source):
+    """Compare a CSV with its manifest entry, hashing it only when the size matches but the mtime does not."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return False
+    if stat.st_size != source['size']:
+        return False
+    if stat.st_mtime_ns == source.get('mtime_ns'):
+        return True
+    return file_sha256(path) == source['sha256']
+
+
+def load_snapshot(path=SNAPSHOT_DIR, data_dir='Data'):
+    """
+    Open a snapshot if it exists and matches the current CSVs.
+
+    Args:
+        path (str): Snapshot directory.
+        data_dir (str): Directory of the CSVs the snapshot was built from.
+
+    Returns:
+        A CatalogSnapshot, or None if the snapshot is missing, was written by
+        another format version, or any source CSV changed since it was built.
+    """
+    manifest_path = os.path.join(path, 'manifest.json')
+    if not os.path.exists(manifest_path):
+        return None
+
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    if manifest.get('version') != SNAPSHOT_VERSION:
+        logger.warning("Catalog snapshot in %s has format version %s, expected %s",
+                       path, manifest.get('version'), SNAPSHOT_VERSION)
+        return None
+
+    for filename, source in manifest['sources'].items():
+        if not _source_unchanged(os.path.join(data_dir, filename), source):
+            logger.warning("Catalog snapshot in %s is stale (%s changed), reading the CSVs", path, filename)
+            return None
+
+    return CatalogSnapshot(path, manifest)
+
+
+if __name__ == '__main__':
+    # Build step:  python snapshot.py build [output_dir]
+    if len(sys.argv) < 2 or sys.argv[1] != 'build':
+        print("Usage: python snapshot.py build [output_dir]")
+        sys.exit(1)
+
+    from context import ServingContext
+
+    output_dir = sys.argv[2] if len(sys.argv) > 2 else SNAPSHOT_DIR
+    write_snapshot(ServingContext(use_snapshot=False), output_dir)
+    print(f"Wrote catalog snapshot to {output_dir}")
@@ -0,0 +1,52 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Ratings posted by the tests go to a scratch log, not Data/ratings_log.ndjson
+os.environ.setdefault('RATINGS_LOG', os.path.join(tempfile.mkdtemp(prefix='ratings-'), 'ratings_log.ndjson'))
+
+
+def requires_cf_model():
+    """Skip unless the CF model can be read: exported embeddings, or the Keras model through TensorFlow."""
+    if not os.path.exists(os.path.join(ROOT, 'Model', 'cf_embeddings.npz')):
+        pytest.importorskip('tensorflow')
+
+
+def requires_tflite():
+    """Skip unless a TFLite interpreter is installed."""
+    from cf_engine import _load_tflite_interpreter_class
+    try:
+        _load_tflite_interpreter_class()
+    except ImportError:
+        pytest.skip('No TFLite interpreter installed')
+
+
+@pytest.fixture(scope='session')
+def server():
+    """The app module, serving the repository's data and models (paths are relative to the repo root)."""
+    requires_cf_model()
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.chdir(ROOT)
+        import app
+        app.flask_app = app.create_app()
+        yield app
+
+
+@pytest.fixture
+def client(server):
+    return server.flask_app.test_client()
+
+
+@pytest.fixture
+def recommend(client):
+    """POST a payload to /recommend and return the JSON response, asserting it succeeded."""
+    def post(payload):
+        response = client.post('/recommend', json=payload)
+        assert response.status_code == 200, response.get_json()
+        return response.get_json()
+    return post
@@ -0,0 +1,85 @@
+import os
+
+import numpy as np
+import pytest
+
+from ann_index import CandidateRetriever, IVFIndex, brute_force_search, recall_at_k
+from conftest import ROOT, requires_cf_model
+from context import ServingContext
+
+K = 10
+
+
+@pytest.fixture(scope='module')
+def ctx():
+    requires_cf_model()
+    return ServingContext(data_dir=os.path.join(ROOT, 'Data'), model_dir=os.path.join(ROOT, 'Model'),
+                          cf_backend='embedding')
+
+
+@pytest.fixture(scope='module')
+def retriever(ctx):
+    # Always through the IVF lists, however few places the filters leave
+    return CandidateRetriever(ctx.cf_scorer, ctx.merged_final, ctx.place_index, ctx.place_id_to_index,
+                              num_lists=16, num_probe=8, exhaustive_below=0)
+
+
+def exact_top_k(ctx, user_index, k, city=None, max_price=None):
+    """Place ids of the k best predicted ratings among the catalog places passing the filters."""
+    places = ctx.merged_final.drop_duplicates('Place_Id')
+    if city:
+        places = places[places['City'].str.contains(city, case=False, na=False)]
+    if max_price is not None:
+        places = places[places['Price'] <= max_price]
+    rows = places['Place_Id'].map(ctx.place_id_to_index)
+    places = places[rows < ctx.cf_scorer.num_places]
+
+    ratings = ctx.cf_scorer.score(user_index, places['Place_Id'].map(ctx.place_id_to_index).to_numpy())
+    order = np.argsort(-ratings, kind='stable')[:k]
+    return places['Place_Id'].to_numpy()[order], ratings[order]
+
+
+@pytest.mark.parametrize('city, max_price', [(None, None), ('Jakarta', None), ('bandung', 20000), (None, 0)])
+def test_filter_mask_matches_the_catalog(ctx, retriever, city, max_price):
+    mask = retriever.filter_mask(city=city, max_price=max_price)
+    expected, _ = exact_top_k(ctx, 0, len(ctx.place_ids), city, max_price)
+    assert set(retriever.place_ids[np.flatnonzero(mask)]) == set(expected)
+
+
+@pytest.mark.parametrize('city, max_price', [(None, None), ('Jakarta', None), ('Yogyakarta', 10000), (None, 0)])
+def test_retrieve_recall_against_exact_search(ctx, retriever, city, max_price):
+    users = range(0, ctx.cf_scorer.num_users, 10)
+    recalls = []
+    for user_index in users:
+        expected, _ = exact_top_k(ctx, user_index, K, city, max_price)
+        place_ids, scores = retriever.retrieve(user_index, K, city=city, max_price=max_price)
+
+        # Only places passing the filters, scored with their exact predicted rating
+        assert set(place_ids) <= set(exact_top_k(ctx, user_index, len(ctx.place_ids), city, max_price)[0])
+        rows = [ctx.place_id_to_index[place_id] for place_id in place_ids]
+        np.testing.assert_allclose(scores, ctx.cf_scorer.score(user_index, rows), rtol=1e-4, atol=1e-4)
+        assert (np.diff(scores) <= 1e-6).all()
+        recalls.append(len(set(place_ids) & set(expected)) / len(expected))
+
+        # Probing every list is exact
+        place_ids, _ = retriever.retrieve(user_index, K, city=city, max_price=max_price, num_probe=16)
+        assert set(place_ids) == set(expected)
+
+    assert np.mean(recalls) >= 0.85
+
+
+def test_ivf_recall_grows_with_num_probe():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(2000, 8)).astype(np.float32)
+    queries = rng.normal(size=(50, 8)).astype(np.float32)
+    index = IVFIndex(vectors, num_lists=32)
+
+    recalls = [recall_at_k(index, vectors, queries, K, num_probe) for num_probe in (1, 4, 32)]
+    assert recalls[0] <= recalls[1] <= recalls[2] == 1.0
+    assert recalls[1] >= 0.7
+
+    mask = rng.random(2000) < 0.1
+    for query in queries[:10]:
+        ids, _ = index.search(query, K, 4, mask)
+        assert mask[ids].all()
+        np.testing.assert_array_equal(np.sort(ids), np.sort(brute_force_search(vectors, query, K, mask)[0]))
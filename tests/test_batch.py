@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+JAKARTA = {'user_lat': -6.17, 'user_lng': 106.82, 'user_city': 'Jakarta', 'user_categories': ['Taman Hiburan'],
+           'days': 1}
+NEW_USER_ID = 999999
+
+
+def post_batch(client, payloads):
+    response = client.post('/recommend/batch', json=payloads)
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    return {line['index']: line for line in lines}
+
+
+def test_batch_matches_single_requests(client, recommend):
+    payloads = [dict(JAKARTA, user_id=user_id, user_lat=-6.1701) for user_id in (1, 2, 3)]
+    results = post_batch(client, payloads)
+
+    assert sorted(results) == [0, 1, 2]
+    for index, payload in enumerate(payloads):
+        expected = recommend(payload)
+        assert [place['Place_Id'] for place in results[index]['recommendations'][0]] == \
+            [place['Place_Id'] for place in expected['recommendations'][0]]
+
+
+def test_failing_member_does_not_fail_its_group(server, client, monkeypatch):
+    predict_ratings = server.predict_ratings
+
+    def failing_batch(user_ids, place_ids):
+        raise RuntimeError('batch scoring failed')
+
+    def failing_for_user_2(user_id, place_ids):
+        if user_id == 2:
+            raise RuntimeError('scoring user 2 failed')
+        return predict_ratings(user_id, place_ids)
+
+    monkeypatch.setattr(server, 'predict_ratings_batch', failing_batch)
+    monkeypatch.setattr(server, 'predict_ratings', failing_for_user_2)
+
+    payloads = [dict(JAKARTA, user_id=user_id, user_lat=-6.1702) for user_id in (1, 2, NEW_USER_ID)]
+    payloads.append(dict(JAKARTA, user_id=1, user_lat='not a number'))
+    results = post_batch(client, payloads)
+
+    assert 'error' not in results[0] and results[0]['recommendations'][0]
+    assert results[1]['error'] == 'scoring user 2 failed'
+    assert 'error' not in results[2] and results[2]['recommendations'][0]
+    assert 'error' in results[3]
+
+
+@pytest.mark.parametrize('body', [{'requests': 'nope'}, 42])
+def test_batch_rejects_non_lists(client, body):
+    assert client.post('/recommend/batch', json=body).status_code == 400
@@ -0,0 +1,69 @@
+import os
+
+import numpy as np
+import pytest
+
+from cbf_index import CBF_NUM_NEIGHBORS, build_cbf_index
+from conftest import ROOT
+from context import ServingContext
+
+
+@pytest.fixture(scope='module')
+def ctx():
+    return ServingContext(data_dir=os.path.join(ROOT, 'Data'), model_dir=os.path.join(ROOT, 'Model'))
+
+
+@pytest.fixture(scope='module')
+def places(ctx):
+    """The places the index holds neighbors of, one row each."""
+    return ctx.merged_final.drop_duplicates('Place_Id').dropna(subset=['City', 'Category']).reset_index(drop=True)
+
+
+@pytest.fixture(scope='module')
+def index(ctx):
+    return build_cbf_index(ctx.merged_final)
+
+
+def refit_neighbors(places, subset):
+    """Per-request neighbor search over a subset: exact cosine nearest neighbors of each place, itself excluded."""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.neighbors import NearestNeighbors
+
+    features = places['Place_Name'] + ' ' + places['Category']
+    tfidf = TfidfVectorizer(stop_words='english').fit_transform(features)[subset.index.to_numpy()]
+    num_neighbors = min(CBF_NUM_NEIGHBORS, len(subset) - 1)
+    search = NearestNeighbors(n_neighbors=num_neighbors, metric='cosine', algorithm='brute').fit(tfidf)
+    distances, _ = search.kneighbors()
+    similarity = (tfidf @ tfidf.T).toarray()
+    return 1 - distances, similarity
+
+
+def test_index_matches_a_nearest_neighbor_refit_per_subset(places, index):
+    cities = sorted(places['City'].unique())
+    categories = sorted(places['Category'].unique())
+    subsets = [(city, chosen) for city in cities for chosen in [categories[:1], categories[1:3], categories]]
+
+    for city, chosen in subsets:
+        subset = places[(places['City'] == city) & places['Category'].isin(chosen)]
+        if len(subset) < 2:
+            continue
+        expected_scores, similarity = refit_neighbors(places, subset)
+        recommendations = index.recommend(subset)
+
+        num_neighbors = expected_scores.shape[1]
+        assert len(recommendations) == len(subset) * num_neighbors, (city, chosen)
+        position = {place_id: row for row, place_id in enumerate(subset['Place_Id'])}
+        for row in range(len(subset)):
+            block = recommendations.iloc[row * num_neighbors:(row + 1) * num_neighbors]
+            neighbor_rows = block['Place_Id'].map(position).to_numpy()
+
+            # Same similarities in the same order; among tied places either may be listed
+            assert row not in neighbor_rows and len(set(neighbor_rows)) == num_neighbors
+            np.testing.assert_allclose(block['similarity_score'], expected_scores[row], atol=1e-5)
+            np.testing.assert_allclose(block['similarity_score'], similarity[row, neighbor_rows], atol=1e-5)
+
+
+def test_shipped_index_matches_a_fresh_build(ctx, index):
+    shipped = ctx.cbf_index
+    np.testing.assert_array_equal(shipped.place_ids, index.place_ids)
+    np.testing.assert_allclose(np.asarray(shipped.scores), index.scores, atol=1e-6)
@@ -0,0 +1,77 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from cf_engine import EmbeddingScorer, KerasScorer, TFLiteScorer, check_parity
+from conftest import ROOT, requires_tflite
+
+
+@pytest.fixture(scope='module')
+def keras_model():
+    keras = pytest.importorskip('tensorflow.keras.models')
+    return keras.load_model(os.path.join(ROOT, 'Model', 'cf_model.h5'), compile=False)
+
+
+@pytest.fixture(scope='module')
+def embedding_scorer(keras_model):
+    return EmbeddingScorer.from_keras_model(keras_model)
+
+
+@pytest.fixture(scope='module')
+def tflite_scorer():
+    requires_tflite()
+    return TFLiteScorer(os.path.join(ROOT, 'Model', 'cf_model.tflite'))
+
+
+def sample_users(scorer, count=20):
+    return np.linspace(0, scorer.num_users - 1, count).astype(int)
+
+
+def test_embedding_scorer_matches_keras(keras_model, embedding_scorer):
+    places = np.arange(embedding_scorer.num_places)
+    check_parity(KerasScorer(keras_model), embedding_scorer, sample_users(embedding_scorer), places)
+
+
+def test_tflite_scorer_matches_keras(keras_model, embedding_scorer, tflite_scorer):
+    assert (tflite_scorer.num_users, tflite_scorer.num_places) == \
+        (embedding_scorer.num_users, embedding_scorer.num_places)
+
+    places = np.arange(tflite_scorer.num_places)
+    check_parity(KerasScorer(keras_model), tflite_scorer, sample_users(tflite_scorer), places)
+
+
+def test_score_batch_matches_score(embedding_scorer, tflite_scorer):
+    users = sample_users(embedding_scorer, 5)
+    places = np.arange(0, embedding_scorer.num_places, 7)
+    for scorer in (embedding_scorer, tflite_scorer):
+        expected = np.stack([scorer.score(user, places) for user in users])
+        np.testing.assert_allclose(scorer.score_batch(users, places), expected, atol=1e-4)
+
+
+def test_embedding_scorer_round_trips_through_npz(embedding_scorer, tmp_path):
+    path = tmp_path / 'cf_embeddings.npz'
+    user_ids = list(range(100, 100 + embedding_scorer.num_users))
+    place_ids = list(range(1, 1 + embedding_scorer.num_places))
+    embedding_scorer.save(path, user_ids, place_ids)
+
+    loaded, loaded_user_ids, loaded_place_ids = EmbeddingScorer.load(path)
+    assert (loaded_user_ids, loaded_place_ids) == (user_ids, place_ids)
+    np.testing.assert_array_equal(loaded.score(3, [0, 5]), embedding_scorer.score(3, [0, 5]))
+
+
+def test_tflite_scorer_needs_metadata_naming_its_inputs(tmp_path):
+    requires_tflite()
+    model_path = str(tmp_path / 'cf_model.tflite')
+    shutil.copy(os.path.join(ROOT, 'Model', 'cf_model.tflite'), model_path)
+    with pytest.raises(ValueError, match='No metadata'):
+        TFLiteScorer(model_path)
+
+    with open(os.path.join(ROOT, 'Model', 'cf_model.tflite.json')) as f:
+        metadata = json.load(f)
+    with open(model_path + '.json', 'w') as f:
+        json.dump({**metadata, 'user_input': 'user'}, f)
+    with pytest.raises(ValueError, match='expected inputs'):
+        TFLiteScorer(model_path)
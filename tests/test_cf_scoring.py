@@ -0,0 +1,40 @@
+import numpy as np
+
+# Place 437 is in the catalog but past the last row of the CF model (437 places)
+UNSCORED_PLACE_ID = 437
+
+
+def test_model_has_fewer_places_than_the_catalog(server):
+    ctx = server.get_context()
+    assert ctx.place_id_to_index[UNSCORED_PLACE_ID] >= ctx.cf_scorer.num_places
+
+
+def test_predict_ratings_is_aligned_with_place_ids(server):
+    ctx = server.get_context()
+    place_ids = [1, UNSCORED_PLACE_ID, 2, 'unknown']
+    ratings = server.predict_ratings(ctx.user_ids[0], place_ids)
+
+    assert len(ratings) == len(place_ids)
+    assert np.isnan(ratings[[1, 3]]).all()
+    np.testing.assert_allclose(ratings[[0, 2]], server.predict_ratings(ctx.user_ids[0], [1, 2]))
+
+
+def test_predict_ratings_batch_is_aligned_with_place_ids(server):
+    ctx = server.get_context()
+    users = ctx.user_ids[:3]
+    ratings = server.predict_ratings_batch(users, [UNSCORED_PLACE_ID, 5])
+
+    assert ratings.shape == (3, 2)
+    assert np.isnan(ratings[:, 0]).all()
+    for row, user_id in enumerate(users):
+        np.testing.assert_allclose(ratings[row, 1], server.predict_ratings(user_id, [5])[0], rtol=1e-5)
+
+
+def test_recommend_with_an_unscored_candidate(server, recommend):
+    # Surabaya's places of worship include place 437
+    result = recommend({'user_id': 1, 'user_lat': -7.25, 'user_lng': 112.75, 'user_city': 'Surabaya',
+                        'user_categories': ['Tempat Ibadah'], 'days': 1})
+
+    places = [place for day in result['recommendations'] for place in day]
+    assert places
+    assert all((place['cf_rating'] is None) == (place['Place_Id'] == UNSCORED_PLACE_ID) for place in places)
@@ -0,0 +1,106 @@
+import os
+import subprocess
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+from cf_engine import EmbeddingScorer, TFLiteScorer
+from conftest import ROOT, requires_cf_model, requires_tflite
+from context import ServingContext
+
+
+def no_keras(self):
+    raise AssertionError('The Keras model was loaded')
+
+
+@pytest.fixture
+def tflite_model_dir(tmp_path):
+    """A model directory with the repository's TFLite model, indexes and snapshot, without the Keras model."""
+    requires_tflite()
+    for name in ['cf_model.tflite', 'cf_model.tflite.json', 'cbf_index', 'catalog_snapshot']:
+        os.symlink(os.path.join(ROOT, 'Model', name), tmp_path / name)
+    return tmp_path
+
+
+def tflite_context(model_dir):
+    return ServingContext(data_dir=os.path.join(ROOT, 'Data'), model_dir=str(model_dir), cf_backend='tflite')
+
+
+def test_warm_up_does_not_build_the_candidate_retriever(tflite_model_dir, monkeypatch):
+    monkeypatch.setattr(ServingContext, 'load_or_train_cf_model', no_keras)
+    ctx = tflite_context(tflite_model_dir)
+    ctx.warm_up()
+
+    assert isinstance(ctx.cf_scorer, TFLiteScorer)
+    assert 'candidate_retriever' not in ctx.__dict__
+
+
+def test_tflite_retriever_reads_the_exported_embeddings(tflite_model_dir, monkeypatch):
+    # Random tables exported next to the TFLite model, so they can be told apart from the Keras ones
+    ctx = tflite_context(tflite_model_dir)
+    rng = np.random.default_rng(0)
+    num_users, num_places = ctx.cf_scorer.num_users, ctx.cf_scorer.num_places
+    exported = EmbeddingScorer(rng.normal(size=(num_users, 8)), rng.normal(size=(num_places, 8)),
+                               rng.normal(size=num_users), rng.normal(size=num_places))
+    exported.save(tflite_model_dir / 'cf_embeddings.npz', ctx.user_ids, ctx.place_ids[:exported.num_places])
+
+    monkeypatch.setattr(ServingContext, 'load_or_train_cf_model', no_keras)
+    retriever = ctx.candidate_retriever
+    np.testing.assert_array_equal(retriever.scorer.place_embeddings, exported.place_embeddings)
+
+    place_ids, scores = retriever.retrieve(0, 5, city='Jakarta')
+    assert len(place_ids) == 5
+    assert (np.diff(scores) <= 0).all()
+
+
+def test_embeddings_of_other_places_are_ignored(tflite_model_dir):
+    requires_cf_model()
+    ctx = tflite_context(tflite_model_dir)
+    scorer = EmbeddingScorer(np.zeros((2, 4)), np.zeros((3, 4)), np.zeros(2), np.zeros(3))
+    scorer.save(tflite_model_dir / 'cf_embeddings.npz', ctx.user_ids[:2], [3, 2, 1])
+
+    assert ctx.load_cf_embeddings() is None
+
+
+def test_recommend_with_cf_candidates(server, recommend):
+    result = recommend({'user_id': 1, 'user_lat': -6.9, 'user_lng': 107.6, 'user_city': 'Bandung', 'days': 1,
+                        'cf_candidates': 5})
+    assert result['recommendations'][0]
+    assert 'candidate_retriever' in server.get_context().__dict__
+
+
+def test_cf_model_pairs_the_scorer_with_its_id_map():
+    requires_cf_model()
+    ctx = ServingContext(data_dir=os.path.join(ROOT, 'Data'), model_dir=os.path.join(ROOT, 'Model'),
+                         cf_backend='embedding')
+    scorer, user_ids = ctx.cf_scorer, list(ctx.user_ids)
+    stop = threading.Event()
+
+    def add_users():
+        # Each update appends a user, as the online updater does for new raters
+        tables = scorer
+        while not stop.is_set():
+            user_ids.append(f'new-{len(user_ids)}')
+            tables = EmbeddingScorer(np.vstack([tables.user_embeddings, tables.user_embeddings[:1]]),
+                                     tables.place_embeddings, np.append(tables.user_bias, 0), tables.place_bias)
+            ctx.swap_cf_model(tables, user_ids)
+
+    updater = threading.Thread(target=add_users)
+    updater.start()
+    try:
+        for _ in range(2000):
+            tables, user_id_to_index = ctx.cf_model()
+            assert len(user_id_to_index) == tables.num_users
+    finally:
+        stop.set()
+        updater.join()
+
+
+def test_warm_up_does_not_import_tensorflow():
+    # gunicorn preloads the app: TensorFlow in the master would be forked into every worker
+    script = ('import sys; from context import ServingContext; ServingContext(cf_backend="embedding").warm_up(); '
+              'print(sorted(name for name in ("tensorflow", "keras") if name in sys.modules))')
+    output = subprocess.run([sys.executable, '-c', script], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == '[]'
@@ -0,0 +1,71 @@
+import os
+
+import pandas as pd
+import pytest
+
+from conftest import ROOT
+from flight_index import FlightIndex, parse_departure_time
+
+JAKARTA = 'Bandar Udara Internasional Soekarno Hatta'
+SURABAYA = 'Bandar Udara Internasional Juanda'
+
+
+@pytest.fixture(scope='module')
+def flights():
+    return pd.read_csv(os.path.join(ROOT, 'Data', 'flightsCapstone_cleaned.csv'))
+
+
+@pytest.fixture(scope='module')
+def flight_index(flights):
+    return FlightIndex(flights)
+
+
+def test_every_departure_time_is_parsed(flight_index):
+    for rows, _, departure_times in flight_index.routes.values():
+        assert not pd.isna(departure_times).any()
+
+
+def test_window_around_every_flight_keeps_them_all(flight_index):
+    everything = flight_index.search(JAKARTA, SURABAYA)
+    assert len(everything) == 15
+    assert len(flight_index.search(JAKARTA, SURABAYA, departure_after='2024-01-01')) == len(everything)
+    assert len(flight_index.search(JAKARTA, SURABAYA, departure_before='2025-01-01')) == len(everything)
+
+
+def test_window_filters_by_departure_time(flight_index, flights):
+    cutoff = '2024-12-12 12:00'
+    departures = pd.to_datetime(flight_index.search(JAKARTA, SURABAYA)['departure_time'], format='mixed')
+    after = flight_index.search(JAKARTA, SURABAYA, departure_after=cutoff)
+    before = flight_index.search(JAKARTA, SURABAYA, departure_before=cutoff)
+
+    assert len(after) == (departures >= pd.Timestamp(cutoff)).sum()
+    assert len(after) + len(before) == len(departures)
+    assert 0 < len(after) < len(departures)
+
+
+def test_prices_are_sorted_and_capped(flight_index):
+    prices = flight_index.search(JAKARTA, SURABAYA, max_budget=1_000_000)['price']
+    assert prices.is_monotonic_increasing
+    assert (prices <= 1_000_000).all()
+
+
+@pytest.mark.parametrize('value', ['tomorrow-ish', '', 20240101, ['2024-01-01']])
+def test_parse_departure_time_rejects_malformed_values(value):
+    with pytest.raises(ValueError):
+        parse_departure_time(value, 'departure_after')
+
+
+def test_recommend_rejects_malformed_departure_window(client):
+    payload = {'user_id': 1, 'user_lat': -6.2, 'user_lng': 106.8, 'user_city': 'Jakarta', 'days': 1,
+               'departure_city': 'Jakarta', 'destination_city': 'Surabaya'}
+
+    response = client.post('/recommend', json=dict(payload, departure_after='not a date'))
+    assert response.status_code == 400
+    assert 'departure_after' in response.get_json()['error']
+
+    response = client.post('/recommend', json=dict(payload, departure_after='2024-12-13', departure_before='2024-12-12'))
+    assert response.status_code == 400
+
+    response = client.post('/recommend', json=dict(payload, departure_after='2024-01-01'))
+    assert response.status_code == 200
+    assert len(response.get_json()['recommended_flights']) == 15
@@ -0,0 +1,164 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from itinerary import AVERAGE_SPEED_KMH, _two_opt, haversine, plan_itinerary, plan_optimized_itinerary
+
+
+def greedy_reference(places, start_lat, start_lng, days, time=8, budget=None):
+    """The per-row planning loop plan_itinerary replaced, returning row positions instead of rows."""
+    def calculate_distance(start_lat, start_lng, end_lat, end_lng):
+        start_lat_rad, start_lng_rad = math.radians(start_lat), math.radians(start_lng)
+        end_lat_rad, end_lng_rad = math.radians(end_lat), math.radians(end_lng)
+        dlat = end_lat_rad - start_lat_rad
+        dlng = end_lng_rad - start_lng_rad
+        a = math.sin(dlat / 2)**2 + math.cos(start_lat_rad) * math.cos(end_lat_rad) * math.sin(dlng / 2)**2
+        distance_km = 6371.0 * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+        return distance_km, (distance_km / 60) * 60
+
+    day_plans, total_time_per_day, total_budget_per_day = [], [], []
+    visited = set()
+    for _ in range(days or 0):
+        positions, distances = [], []
+        day_total_time = 0
+        day_total_budget = 0
+        current_lat, current_lng = start_lat, start_lng
+
+        for position, (_, place) in enumerate(places.iterrows()):
+            if position in visited:
+                continue
+            distance_km, travel_time = calculate_distance(current_lat, current_lng, place['Lat'], place['Long'])
+            place_total_time = (place['Time_Minutes'] / 60) + (travel_time / 60)
+            if day_total_time + place_total_time > time:
+                continue
+            if budget and day_total_budget + place['Price'] > budget:
+                continue
+
+            positions.append(position)
+            distances.append(distance_km)
+            day_total_time += place_total_time
+            day_total_budget += place['Price']
+            current_lat, current_lng = place['Lat'], place['Long']
+            visited.add(position)
+
+        day_plans.append((positions, distances))
+        total_time_per_day.append(day_total_time)
+        total_budget_per_day.append(day_total_budget)
+
+    return day_plans, total_time_per_day, total_budget_per_day
+
+
+def random_places(rng, count, missing_time=0.0):
+    places = pd.DataFrame({
+        'Lat': rng.uniform(-7.0, -6.8, count),
+        'Long': rng.uniform(107.5, 107.7, count),
+        'Time_Minutes': rng.choice([30.0, 60.0, 90.0, 120.0, 240.0], count),
+        'Price': rng.choice([0.0, 5000.0, 20000.0, 75000.0], count),
+    })
+    places.loc[rng.random(count) < missing_time, 'Time_Minutes'] = np.nan
+    return places
+
+
+@pytest.mark.parametrize('days', [0, 1, 3])
+@pytest.mark.parametrize('budget', [None, 0, 30000])
+@pytest.mark.parametrize('time', [2, 8])
+@pytest.mark.parametrize('missing_time', [0.0, 0.1])
+def test_plan_itinerary_matches_the_row_loop(days, budget, time, missing_time):
+    rng = np.random.default_rng(days * 100 + time)
+    places = random_places(rng, 60, missing_time)
+    args = (-6.9, 107.6, days, time, budget)
+
+    day_plans, total_time, total_budget = plan_itinerary(
+        places['Lat'], places['Long'], places['Time_Minutes'], places['Price'], *args)
+    expected_plans, expected_time, expected_budget = greedy_reference(places, *args)
+
+    assert len(day_plans) == len(expected_plans) == days
+    for (positions, distances, travel_times), (expected_positions, expected_distances) in zip(day_plans,
+                                                                                               expected_plans):
+        assert list(positions) == expected_positions
+        np.testing.assert_allclose(distances, expected_distances, rtol=1e-9)
+        np.testing.assert_allclose(travel_times, expected_distances, rtol=1e-9)  # At 60 km/h
+    np.testing.assert_allclose(total_time, expected_time, rtol=1e-9)
+    np.testing.assert_allclose(total_budget, expected_budget, rtol=1e-9)
+
+
+def test_places_that_do_not_fit_are_left_out():
+    places = pd.DataFrame({'Lat': [-6.9, -6.9, -6.9], 'Long': [107.6, 107.6, 107.6],
+                           'Time_Minutes': [600.0, 60.0, 60.0], 'Price': [0.0, 50000.0, 10000.0]})
+    day_plans, total_time, total_budget = plan_itinerary(
+        places['Lat'], places['Long'], places['Time_Minutes'], places['Price'], -6.9, 107.6, 2, budget=20000)
+
+    # Too long for any day, over the budget on its own, and the one place that fits
+    assert [list(positions) for positions, _, _ in day_plans] == [[2], []]
+    assert total_time == [1.0, 0] and total_budget == [10000.0, 0]
+    assert greedy_reference(places, -6.9, 107.6, 2, budget=20000)[0] == [([2], [0.0]), ([], [])]
+
+
+def route_km(start_lat, start_lng, lats, lngs):
+    path_lats = np.concatenate([[start_lat], lats])
+    path_lngs = np.concatenate([[start_lng], lngs])
+    return sum(haversine(path_lats[i], path_lngs[i], path_lats[i + 1], path_lngs[i + 1])[0]
+               for i in range(len(lats)))
+
+
+def nearest_neighbor_order(start_lat, start_lng, lats, lngs):
+    order, remaining = [], list(range(len(lats)))
+    current_lat, current_lng = start_lat, start_lng
+    while remaining:
+        distances, _ = haversine(current_lat, current_lng, lats[remaining], lngs[remaining])
+        nearest = remaining.pop(int(np.argmin(distances)))
+        order.append(nearest)
+        current_lat, current_lng = lats[nearest], lngs[nearest]
+    return order
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('budget', [None, 30000])
+def test_optimized_itinerary_keeps_the_daily_limits(seed, budget):
+    rng = np.random.default_rng(seed)
+    places = random_places(rng, 80)
+    lats, lngs = places['Lat'].to_numpy(), places['Long'].to_numpy()
+    day_plans, total_time, total_budget = plan_optimized_itinerary(
+        lats, lngs, places['Time_Minutes'], places['Price'], -6.9, 107.6, 3, time=6, budget=budget)
+
+    positions = np.concatenate([day[0] for day in day_plans])
+    assert len(set(positions)) == len(positions)  # No place on two days, or twice on one
+    for (day_positions, distances, _), day_time, day_budget in zip(day_plans, total_time, total_budget):
+        assert day_time <= 6 + 1e-9
+        assert budget is None or day_budget <= budget
+        np.testing.assert_allclose(distances.sum(), route_km(-6.9, 107.6, lats[day_positions], lngs[day_positions]))
+        np.testing.assert_allclose(day_time, places['Time_Minutes'].to_numpy()[day_positions].sum() / 60
+                                   + distances.sum() / AVERAGE_SPEED_KMH)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_optimized_route_is_no_longer_than_the_nearest_neighbor_route(seed):
+    # Few enough places for one day, so the route visits all of them
+    rng = np.random.default_rng(seed)
+    places = random_places(rng, 12)
+    lats, lngs = places['Lat'].to_numpy(), places['Long'].to_numpy()
+    day_plans, _, _ = plan_optimized_itinerary(lats, lngs, np.zeros(12), places['Price'], -6.9, 107.6, 1, time=24)
+
+    positions, distances, _ = day_plans[0]
+    assert sorted(positions) == list(range(12))
+    seed_order = nearest_neighbor_order(-6.9, 107.6, lats, lngs)
+    assert distances.sum() <= route_km(-6.9, 107.6, lats[seed_order], lngs[seed_order]) + 1e-9
+
+
+def test_two_opt_only_shortens_routes():
+    rng = np.random.default_rng(0)
+    points = rng.uniform(0, 1, (10, 2))
+    distances = np.zeros((11, 11))
+    distances[:10, :10] = np.linalg.norm(points[:, None] - points[None, :], axis=2)
+
+    def length(route):
+        path = [0] + route + [10]
+        return distances[path[:-1], path[1:]].sum()
+
+    for _ in range(20):
+        route = list(rng.permutation(np.arange(1, 10)))
+        improved = _two_opt(route, distances)
+        assert sorted(improved) == sorted(route)
+        assert length(improved) <= length(route) + 1e-12
@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+import pytest
+
+from cf_engine import EmbeddingScorer
+from conftest import ROOT, requires_cf_model
+from context import ServingContext
+from online_updates import OnlineUpdater, RatingLog, load_checkpoint
+
+
+def make_context():
+    return ServingContext(os.path.join(ROOT, 'Data'), os.path.join(ROOT, 'Model'), cf_backend='embedding')
+
+
+@pytest.fixture
+def log(tmp_path):
+    return RatingLog(str(tmp_path / 'ratings_log.ndjson'))
+
+
+@pytest.fixture
+def checkpoint_path(tmp_path):
+    return str(tmp_path / 'ratings_log.checkpoint.npz')
+
+
+def make_updater(context, log, checkpoint_path):
+    return OnlineUpdater(context, log, checkpoint_path=checkpoint_path, checkpoint_interval=0)
+
+
+def test_resume_from_the_checkpoint(log, checkpoint_path):
+    requires_cf_model()
+    log.append([{'user_id': 1, 'place_id': 10, 'rating': 5}, {'user_id': 'new-user', 'place_id': 11, 'rating': 4}])
+    first = make_updater(make_context(), log, checkpoint_path)
+    assert first.update() == 2
+    checkpoint = load_checkpoint(checkpoint_path)
+    assert checkpoint['offset'] == first.offset and checkpoint['folded_in'] == {'new-user'}
+
+    # A second process takes the tables as they are, instead of stepping through the ratings again
+    context = make_context()
+    second = make_updater(context, log, checkpoint_path)
+    assert second.update() == 0
+    assert second.offset == first.offset and second.applied == 2
+    assert context.user_ids == first.context.user_ids
+    np.testing.assert_array_equal(context.cf_scorer.place_embeddings, first.context.cf_scorer.place_embeddings)
+    np.testing.assert_array_equal(context.cf_scorer.user_bias, first.context.cf_scorer.user_bias)
+    assert list(context.user_profiles.user_ratings('new-user')[0]) == [11]
+
+    # Later ratings are applied once, on top of the checkpoint
+    log.append([{'user_id': 'new-user', 'place_id': 12, 'rating': 3}])
+    assert first.update() == 1 and second.update() == 1
+    np.testing.assert_allclose(context.cf_scorer.user_embeddings, first.context.cf_scorer.user_embeddings, rtol=1e-6)
+    assert list(context.user_profiles.user_ratings('new-user')[0]) == [11, 12]
+
+
+def test_checkpoint_of_another_model_is_ignored(log, checkpoint_path):
+    requires_cf_model()
+    log.append([{'user_id': 1, 'place_id': 10, 'rating': 5}])
+    make_updater(make_context(), log, checkpoint_path).update()
+
+    # Retrained model
+    context = make_context()
+    scorer = context.cf_scorer
+    context.swap_cf_model(EmbeddingScorer(scorer.user_embeddings, scorer.place_embeddings * 2, scorer.user_bias,
+                                          scorer.place_bias), context.user_ids)
+    updater = make_updater(context, log, checkpoint_path)
+    assert updater.update() == 1  # Replayed from the start of the log
+    assert updater.applied == 1
+
+
+def test_checkpoint_past_the_end_of_the_log_is_ignored(tmp_path, log, checkpoint_path):
+    requires_cf_model()
+    log.append([{'user_id': 1, 'place_id': 10, 'rating': 5}])
+    make_updater(make_context(), log, checkpoint_path).update()
+
+    truncated = RatingLog(str(tmp_path / 'other_log.ndjson'))
+    updater = make_updater(make_context(), truncated, checkpoint_path)
+    assert updater.update() == 0
+    assert updater.offset == 0 and updater.applied == 0
@@ -0,0 +1,60 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import ROOT
+from context import ServingContext
+from place_index import PlaceIndex
+
+
+def mask_filter(places, city=None, categories=None):
+    """The boolean-mask filtering PlaceIndex replaced."""
+    filtered = places
+    if city:
+        filtered = filtered[filtered['City'].str.contains(city, case=False, na=False)]
+    if categories:
+        filtered = filtered[filtered['Category'].isin(categories)]
+    return filtered
+
+
+@pytest.fixture(scope='module')
+def places():
+    ctx = ServingContext(data_dir=os.path.join(ROOT, 'Data'), model_dir=os.path.join(ROOT, 'Model'))
+    return ctx.merged_final
+
+
+@pytest.fixture(scope='module')
+def index(places):
+    return PlaceIndex(places)
+
+
+CITIES = [None, '', 'Jakarta', 'jakarta', 'BANDUNG', 'yogya', 'a', 'Surabaya', 'Bali']
+CATEGORIES = [None, [], ['Budaya'], ['Taman Hiburan', 'Bahari'], ['Bahari', 'Budaya', 'Budaya'],
+              ['Cagar Alam', 'Unknown'], ['Unknown']]
+
+
+@pytest.mark.parametrize('city', CITIES)
+@pytest.mark.parametrize('categories', CATEGORIES)
+def test_lookup_matches_the_mask_filter(places, index, city, categories):
+    expected = mask_filter(places, city, categories)
+    filtered = places.iloc[index.lookup(city, categories)]
+    pd.testing.assert_frame_equal(filtered, expected)
+
+
+@pytest.mark.parametrize('city', ['Jakarta', 'bandung', 'a', 'Bali'])
+def test_category_ratings_match_the_mask_filter(places, index, city):
+    expected = mask_filter(places, city).groupby('Category')['Rating'].mean().sort_values(ascending=False)
+    pd.testing.assert_series_equal(index.category_ratings(city), expected)
+
+
+def test_rows_with_missing_city_or_category():
+    places = pd.DataFrame({'City': ['Jakarta', None, 'Jakarta', 'Bandung'],
+                           'Category': ['Budaya', 'Budaya', None, 'Bahari'],
+                           'Rating': [4.0, 3.0, 2.0, 1.0]})
+    index = PlaceIndex(places)
+    for city in [None, 'jakarta', 'Bandung']:
+        for categories in [None, ['Budaya'], ['Budaya', 'Bahari']]:
+            expected = mask_filter(places, city, categories).index.to_numpy()
+            np.testing.assert_array_equal(index.lookup(city, categories), expected)
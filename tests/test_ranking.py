@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ranking import HybridRanker, RankingWeights
+
+
+@pytest.fixture
+def ranker():
+    places = pd.DataFrame({
+        'Place_Id': [3, 1, 2, 4],
+        'Rating': [4.0, 5.0, 3.0, 4.5],
+        'Mean_Rating': [3.0, 5.0, 1.0, 4.0],
+        'Lat': [-6.2, -6.2, -6.2, -7.0],
+        'Long': [106.8, 106.8, 106.8, 110.0],
+    })
+    return HybridRanker(places)
+
+
+def test_rank_orders_by_hybrid_score(ranker):
+    weights = RankingWeights(similarity=1, cf=0, popularity=0, distance=0)
+    ranking = ranker.rank([1, 2, 2, 3, 99], [0.1, 0.2, 0.9, 0.5, 1.0], [], [], -6.2, 106.8, weights)
+
+    # Repeated places count with their best similarity, unknown ones are dropped
+    assert list(ranking.place_ids) == [2, 3, 1]
+    np.testing.assert_allclose(ranking.similarity, [0.9, 0.5, 0.1])
+
+
+def test_missing_cf_ratings_fall_back_to_popularity(ranker):
+    weights = RankingWeights(similarity=0, cf=1, popularity=0, distance=0)
+    ranking = ranker.rank([1, 2, 3], [0, 0, 0], [1, 2, 3], [1.0, 5.0, np.nan], -6.2, 106.8, weights)
+
+    assert list(ranking.place_ids) == [2, 3, 1]  # Place 3 ranks on its popularity (3 -> 0.5)
+    assert np.isnan(ranking.mse[1])
+    assert ranking.mean_mse == pytest.approx(np.mean([(3.0 - 5.0) ** 2, (5.0 - 1.0) ** 2]))
+
+
+def test_top_k_is_a_prefix_of_the_full_ranking(ranker):
+    args = ([1, 2, 3, 4], [0.3, 0.1, 0.2, 0.4], [4], [2.0], -6.2, 106.8, RankingWeights())
+    full = ranker.rank(*args)
+    for k in range(5):
+        assert list(ranker.rank(*args, top_k=k).place_ids) == list(full.place_ids[:k])
+
+
+def test_places_ranked_past_the_first_thirty_are_scheduled_when_they_fit(server, monkeypatch):
+    # Rank by similarity alone: 35 places over the budget first, then cheaper ones
+    monkeypatch.setattr(server, 'ranking_weights', RankingWeights(similarity=1, cf=0, popularity=0, distance=0))
+    places = server.get_context().merged_final.drop_duplicates('Place_Id')
+    places = places[places['City'] == 'Bandung']
+    expensive = places.loc[places['Price'] > 20000, 'Place_Id'].to_numpy()[:35]
+    cheap = places.loc[places['Price'] <= 20000, 'Place_Id'].to_numpy()[:20]
+    place_ids = np.concatenate([expensive, cheap])
+    candidates = pd.DataFrame({'Place_Id': place_ids, 'similarity_score': np.linspace(1, 0.1, len(place_ids))})
+    no_cf = pd.DataFrame({'Place_Id': np.array([], dtype=place_ids.dtype), 'cf_rating': np.array([])})
+
+    days, _, total_budget, _ = server.build_itineraries(candidates, no_cf, -6.9, 107.6, days=1, budget=20000)
+
+    scheduled = list(days[0]['Place_Id'])
+    assert scheduled and set(scheduled) <= set(cheap)
+    assert total_budget[0] <= 20000
+    assert scheduled[0] == cheap[0]  # Rank 36, the first place within the budget
+
+
+def test_itineraries_keep_the_daily_limits(server):
+    rng = np.random.default_rng(0)
+    for _ in range(30):
+        payload = {'user_id': int(rng.integers(1, 300)), 'user_lat': float(rng.uniform(-7.8, -6.1)),
+                   'user_lng': float(rng.uniform(106.7, 112.8)), 'days': int(rng.integers(1, 4)),
+                   'user_city': str(rng.choice(['Jakarta', 'Yogyakarta', 'Bandung', 'Semarang', 'Surabaya'])),
+                   'budget': [None, 50000, 200000][rng.integers(3)]}
+        days, total_time, total_budget, _, _ = server.recommend_tourist_destinations(
+            **server.parse_recommend_request(payload))
+
+        scheduled = [place_id for day in days for place_id in day['Place_Id']]
+        assert len(scheduled) == len(set(scheduled)), payload
+        assert all(day_time <= 8 for day_time in total_time), payload
+        assert payload['budget'] is None or all(spent <= payload['budget'] for spent in total_budget), payload
+
+
+def test_a_day_fills_beyond_the_old_ranking_cut(server):
+    # Planning only the top 30 of this ranking fit 4 places in the day
+    payload = {'user_id': 39, 'user_lat': -6.9, 'user_lng': 107.6, 'user_city': 'Bandung', 'days': 1}
+    days = server.recommend_tourist_destinations(**server.parse_recommend_request(payload))[0]
+    assert len(days[0]) == 5
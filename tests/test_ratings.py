@@ -0,0 +1,59 @@
+import pytest
+
+
+@pytest.fixture
+def updater(server):
+    updater = server.start_online_updater()
+    yield updater
+    updater.update()  # Leave nothing pending for the next test
+
+
+def test_ratings_reach_the_profiles(server, client, updater):
+    response = client.post('/ratings', json=[{'user_id': 555555, 'place_id': 10, 'rating': 5},
+                                             {'user_id': 'abc', 'place_id': 11, 'rating': 4}])
+    assert response.status_code == 202
+    assert response.get_json()['accepted'] == 2
+
+    updater.update()
+    profiles = server.get_context().user_profiles
+    assert profiles.exists(555555) and profiles.exists('abc')
+    assert list(profiles.user_ratings(555555)[0]) == [10]
+    if server.get_context().cf_backend == 'embedding':  # Only embedding tables are updated online
+        assert 555555 in server.get_context().user_id_to_index
+
+
+@pytest.mark.parametrize('rating', [
+    {'user_id': 1, 'place_id': 10, 'rating': 6},
+    {'user_id': 1, 'place_id': -1, 'rating': 3},
+    {'user_id': True, 'place_id': 10, 'rating': 3},
+    [],
+])
+def test_invalid_ratings_are_rejected(client, rating):
+    response = client.post('/ratings', json=rating)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_non_json_bodies_get_json_errors(client):
+    response = client.post('/ratings', data='user_id=1', content_type='application/x-www-form-urlencoded')
+    assert response.status_code == 415
+    assert response.is_json and response.get_json()['error']
+
+    response = client.post('/ratings', data='{"user_id": 1,', content_type='application/json')
+    assert response.status_code == 400
+    assert response.is_json and response.get_json()['error']
+
+    response = client.post('/recommend/batch', data='[', content_type='application/json')
+    assert response.status_code == 400
+    assert response.is_json
+
+
+@pytest.mark.parametrize('data, content_type, status', [
+    ('user_id=1', 'text/plain', 415),
+    ('{"user_id": 1,', 'application/json', 400),
+    ('[1, 2]', 'application/json', 400),
+])
+def test_recommend_answers_non_json_bodies_with_json_errors(client, data, content_type, status):
+    response = client.post('/recommend', data=data, content_type=content_type)
+    assert response.status_code == status
+    assert response.is_json and response.get_json()['error']
@@ -0,0 +1,80 @@
+import functools
+import os
+
+import pytest
+
+from conftest import ROOT, requires_cf_model, requires_tflite
+from context import ServingContext
+from registry import ContextRegistry, validate_context
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    """A copy of Model/ made of links, which a test can add files to."""
+    for name in os.listdir(os.path.join(ROOT, 'Model')):
+        os.symlink(os.path.join(ROOT, 'Model', name), tmp_path / name)
+    return tmp_path
+
+
+def make_registry(model_dir, cf_backend, **kwargs):
+    factory = functools.partial(ServingContext, cf_backend=cf_backend)
+    return ContextRegistry(os.path.join(ROOT, 'Data'), str(model_dir), context_factory=factory, **kwargs)
+
+
+@pytest.mark.parametrize('cf_backend', ['embedding', 'tflite'])
+def test_reload_publishes_a_new_version(model_dir, cf_backend):
+    if cf_backend == 'tflite':
+        requires_tflite()
+    else:
+        requires_cf_model()
+    swaps = []
+    registry = make_registry(model_dir, cf_backend, on_swap=lambda old, new: swaps.append((old.number, new.number)))
+    first = registry.current
+
+    # Nothing changed: no reload without force
+    assert registry.reload() is None
+
+    (model_dir / 'new_artifact.txt').write_text('changed')
+    version = registry.reload()
+    assert version is not None, registry.last_error
+    assert version.number == 2 and registry.current is version
+    assert version.context is not first.context and version.context.cf_backend == cf_backend
+    assert swaps == [(1, 2)]
+    assert registry.stats()['failed_reloads'] == 0
+
+
+def test_validation_scores_only_rows_the_model_has():
+    requires_tflite()
+    ctx = ServingContext(data_dir=os.path.join(ROOT, 'Data'), model_dir=os.path.join(ROOT, 'Model'),
+                         cf_backend='tflite')
+    assert ctx.cf_scorer.num_places < len(ctx.place_ids)
+    validate_context(ctx)
+
+
+def test_failed_reload_keeps_serving_the_current_version(model_dir):
+    requires_cf_model()
+    registry = make_registry(model_dir, 'embedding')
+    first = registry.current
+
+    def broken_context(**kwargs):
+        raise OSError('artifact is corrupt')
+
+    registry.context_factory = broken_context
+    assert registry.reload(force=True) is None
+    assert registry.current is first
+    assert registry.stats()['last_error'] == 'OSError: artifact is corrupt'
+
+    # The same artifacts are not retried until they change
+    registry.context_factory = functools.partial(ServingContext, cf_backend='embedding')
+    assert registry.reload() is None
+    (model_dir / 'new_artifact.txt').write_text('changed')
+    assert registry.reload().number == 2
+
+
+def test_admin_reload_requires_the_token(client, monkeypatch):
+    monkeypatch.delenv('ADMIN_TOKEN', raising=False)
+    assert client.post('/admin/reload').status_code == 403
+
+    monkeypatch.setenv('ADMIN_TOKEN', 's3cret')
+    assert client.post('/admin/reload', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+    assert client.get('/version').get_json()['version'] >= 1
@@ -0,0 +1,116 @@
+import gzip
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import response_format
+from response_format import MIN_COMPRESS_SIZE, build_response, compress, parse_response_options
+
+
+def make_result(day_sizes=(5, 2), num_flights=3):
+    days = [pd.DataFrame({'Place_Id': np.arange(size) + 10 * day, 'Place_Name': [f'Place {i}' for i in range(size)],
+                          'Price': np.where(np.arange(size) == 1, np.nan, 1000.0)})
+            for day, size in enumerate(day_sizes)]
+    flights = pd.DataFrame({'airline': ['A'] * num_flights, 'price': np.arange(num_flights, dtype=float),
+                            'departure_time': pd.date_range('2024-01-01', periods=num_flights, freq='h')})
+    return days, [1.5] * len(days), [np.nan] * len(days), 0.25, flights
+
+
+def respond(payload, result=None):
+    return build_response(result or make_result(), **parse_response_options(payload))
+
+
+def test_fields_projection():
+    response = respond({'fields': 'Place_Id, Price', 'flight_fields': ['price']})
+    assert response['recommendations'][0][1] == {'Place_Id': 1, 'Price': None}
+    assert response['recommended_flights'][0] == {'price': 0.0}
+    assert response['total_budget_per_day'] == [None, None] and response['mse'] == 0.25
+
+    with pytest.raises(ValueError, match='Unknown fields'):
+        respond({'fields': ['Rating']})
+    with pytest.raises(ValueError):
+        parse_response_options({'fields': []})
+
+
+def test_pages_until_next_cursor_is_none():
+    pages, payload = [], {'limit': 2, 'fields': ['Place_Id']}
+    while True:
+        response = respond(payload)
+        pages.append(response)
+        if response['next_cursor'] is None:
+            break
+        payload = {**payload, 'cursor': response['next_cursor']}
+
+    # The longest table (5 places on day 1) sets the number of pages
+    assert len(pages) == 3
+    assert [place['Place_Id'] for page in pages for place in page['recommendations'][0]] == [0, 1, 2, 3, 4]
+    assert [place['Place_Id'] for page in pages for place in page['recommendations'][1]] == [10, 11]
+    assert sum(len(page['recommended_flights']) for page in pages) == 3
+
+    assert 'next_cursor' not in respond({})
+    assert respond({'limit': 10})['next_cursor'] is None
+
+
+@pytest.mark.parametrize('options', [{'limit': 0}, {'limit': True}, {'cursor': 'not a cursor'}, {'format': 'csv'}])
+def test_invalid_options(options):
+    with pytest.raises(ValueError):
+        parse_response_options(options)
+
+
+def test_columnar_format():
+    records = respond({})
+    columnar = respond({'format': 'columnar'})
+
+    day = columnar['recommendations'][0]
+    assert list(day) == ['Place_Id', 'Place_Name', 'Price']
+    assert day['Price'] == [1000.0, None, 1000.0, 1000.0, 1000.0]
+    assert [dict(zip(day, row)) for row in zip(*day.values())] == records['recommendations'][0]
+    assert columnar['recommended_flights']['departure_time'][0] == '2024-01-01 00:00:00'
+
+
+@pytest.mark.parametrize('accept_encoding, expected', [
+    (None, None),
+    ('identity', None),
+    ('gzip', 'gzip'),
+    ('deflate, gzip;q=0.5', 'gzip'),
+    ('gzip;q=0', None),
+    ('GZIP', 'gzip'),
+])
+def test_accept_encoding_negotiation(monkeypatch, accept_encoding, expected):
+    monkeypatch.setattr(response_format, 'brotli', None)
+    body = json.dumps(list(range(MIN_COMPRESS_SIZE))).encode('utf-8')
+    encoded, content_encoding = compress(body, accept_encoding)
+
+    assert content_encoding == expected
+    assert (gzip.decompress(encoded) if expected == 'gzip' else encoded) == body
+
+
+def test_brotli_is_preferred_when_installed(monkeypatch):
+    class FakeBrotli:
+        @staticmethod
+        def compress(body, quality):
+            return b'br:' + body
+
+    monkeypatch.setattr(response_format, 'brotli', FakeBrotli)
+    body = b'x' * MIN_COMPRESS_SIZE
+    assert compress(body, 'gzip, br') == (b'br:' + body, 'br')
+    assert compress(body, 'gzip, br;q=0')[1] == 'gzip'
+
+
+def test_small_bodies_are_not_compressed():
+    assert compress(b'{}', 'gzip') == (b'{}', None)
+
+
+def test_recommend_negotiates_the_encoding(client):
+    payload = {'user_id': 1, 'user_lat': -6.9, 'user_lng': 107.6, 'user_city': 'Bandung', 'days': 2}
+    response = client.post('/recommend', json=payload, headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    compressed = json.loads(gzip.decompress(response.data))
+
+    response = client.post('/recommend', json=payload)
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_json() == compressed
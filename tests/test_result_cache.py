@@ -0,0 +1,71 @@
+from types import SimpleNamespace
+
+import pytest
+from flask import g
+
+import result_cache
+from result_cache import ResultCache
+
+PAYLOAD = {'user_id': 1, 'user_lat': -6.9, 'user_lng': 107.6, 'user_city': 'Bandung',
+           'user_categories': ['Budaya', 'Taman Hiburan'], 'days': 2}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(result_cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = ResultCache(max_size=2, ttl=None)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1  # 'b' is now the least recently used
+    cache.put('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1 and cache.stats()['size'] == 2
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = ResultCache(ttl=10)
+    cache.put('a', 1)
+    clock[0] += 9.9
+    assert cache.get('a') == 1
+    clock[0] += 0.1
+    assert cache.get('a') is None
+    assert cache.stats()['size'] == 0
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_zero_size_disables_caching():
+    cache = ResultCache(max_size=0)
+    cache.put('a', 1)
+    assert cache.get('a') is None
+
+
+def test_cache_key_ignores_what_does_not_change_the_result(server):
+    key = server.recommendation_cache_key(PAYLOAD)
+    assert key is not None
+    assert server.recommendation_cache_key({**PAYLOAD, 'user_city': 'BANDUNG'}) == key
+    assert server.recommendation_cache_key({**PAYLOAD, 'user_categories': ['Taman Hiburan', 'Budaya']}) == key
+    assert server.recommendation_cache_key({**PAYLOAD, 'user_lat': -6.9 + 1e-7}) == key
+    assert server.recommendation_cache_key({**PAYLOAD, 'fields': ['Place_Id'], 'limit': 1}) == key
+
+    assert server.recommendation_cache_key({**PAYLOAD, 'user_lat': -6.91}) != key
+    assert server.recommendation_cache_key({**PAYLOAD, 'days': 3}) != key
+    assert server.recommendation_cache_key({**PAYLOAD, 'budget': 50000}) != key
+    assert server.recommendation_cache_key({**PAYLOAD, 'user_id': 2}) != key
+    assert server.recommendation_cache_key({'user_id': 1}) is None  # Invalid, served without the cache
+
+
+def test_cache_key_includes_the_context_version(server):
+    key = server.recommendation_cache_key(PAYLOAD)
+    with server.flask_app.app_context():
+        g.context_version = SimpleNamespace(number=key[0] + 1, context=server.get_context())
+        reloaded_key = server.recommendation_cache_key(PAYLOAD)
+
+    assert reloaded_key[0] == key[0] + 1
+    assert reloaded_key[1:] == key[1:]
@@ -0,0 +1,82 @@
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import snapshot
+from snapshot import SNAPSHOT_TABLES, SOURCE_FILES, load_snapshot, write_snapshot
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    path = tmp_path / 'Data'
+    path.mkdir()
+    for filename in SOURCE_FILES:
+        (path / filename).write_text(f'{filename}\n1,2,3\n')
+    return path
+
+
+def make_context(data_dir):
+    places = pd.DataFrame({
+        'Place_Id': np.array([1, 2, 3, 4], dtype=np.int64),
+        'Price': np.array([0.0, 5000.0, np.nan, 20000.0]),
+        'In_City': np.array([True, False, True, True]),
+        'City': ['Jakarta', 'Jakarta', None, 'Jakarta'],  # Dictionary-encoded
+        'Place_Name': ['Monas', None, 'Kota Tua', 'Ancol'],  # Text
+    })
+    tables = {name: places for name in SNAPSHOT_TABLES}
+    return SimpleNamespace(data_dir=str(data_dir), user_ids=[10, 11], place_ids=[1, 2, 3, 4], **tables)
+
+
+def test_round_trip(tmp_path, data_dir):
+    path = str(tmp_path / 'catalog_snapshot')
+    context = make_context(data_dir)
+    write_snapshot(context, path)
+
+    loaded = load_snapshot(path, str(data_dir))
+    assert loaded is not None
+    for name in SNAPSHOT_TABLES:
+        table = loaded.table(name)
+        assert list(table.columns) == list(context.place.columns)
+        assert table['Place_Id'].dtype == np.int64 and table['Price'].dtype == np.float64
+        assert table['In_City'].dtype == bool
+        pd.testing.assert_frame_equal(table.copy(), context.place)
+        assert table['City'].isna().tolist() == [False, False, True, False]
+        assert table['Place_Name'].isna().tolist() == [False, True, False, False]
+    assert loaded.array('user_ids').tolist() == [10, 11]
+    assert loaded.array('place_ids').tolist() == [1, 2, 3, 4]
+
+
+def test_stale_sources_are_detected(tmp_path, data_dir):
+    path = str(tmp_path / 'catalog_snapshot')
+    write_snapshot(make_context(data_dir), path)
+    source = data_dir / SOURCE_FILES[0]
+    stat = os.stat(source)
+
+    # Touched but unchanged: hashed, and still fresh
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert load_snapshot(path, str(data_dir)) is not None
+
+    # Same size, other content
+    source.write_text(source.read_text().replace('1,2,3', '4,5,6'))
+    assert load_snapshot(path, str(data_dir)) is None
+
+    # Other size
+    source.write_text('changed\n')
+    assert load_snapshot(path, str(data_dir)) is None
+
+    os.remove(source)
+    assert load_snapshot(path, str(data_dir)) is None
+
+
+def test_unchanged_sources_are_not_hashed(tmp_path, data_dir, monkeypatch):
+    path = str(tmp_path / 'catalog_snapshot')
+    write_snapshot(make_context(data_dir), path)
+
+    def no_hash(path):
+        raise AssertionError(f'{path} was hashed')
+
+    monkeypatch.setattr(snapshot, 'file_sha256', no_hash)
+    assert load_snapshot(path, str(data_dir)) is not None
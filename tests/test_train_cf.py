@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from cf_engine import EmbeddingScorer, TFLiteScorer, check_parity
+from train_cf import evaluate, export, merge_splits, split_ratings, train_als, train_tfdata
+
+NUM_USERS, NUM_PLACES = 60, 40
+
+
+@pytest.fixture(scope='module')
+def ratings():
+    """Ratings of a rank-2 model with noise, on the 1-5 scale."""
+    rng = np.random.default_rng(0)
+    user_vectors, place_vectors = rng.normal(size=(NUM_USERS, 2)), rng.normal(size=(NUM_PLACES, 2))
+    users = rng.integers(0, NUM_USERS, 1500)
+    places = rng.integers(0, NUM_PLACES, 1500)
+    values = 3 + np.einsum('ij,ij->i', user_vectors[users], place_vectors[places]) + rng.normal(0, 0.1, 1500)
+    return users.astype(np.intp), places.astype(np.intp), np.clip(values, 1, 5).astype(np.float32)
+
+
+def test_split_is_a_disjoint_partition(ratings):
+    # Tag every rating with its position, so the parts can be traced back
+    positions = np.arange(len(ratings[2]))
+    train, validation, test = split_ratings(ratings[0], ratings[1], positions, test_fraction=0.1,
+                                            validation_fraction=0.2, seed=1)
+
+    assert (len(train[2]), len(validation[2]), len(test[2])) == (1050, 300, 150)
+    np.testing.assert_array_equal(np.sort(merge_splits(train, validation, test)[2]), positions)
+    np.testing.assert_array_equal(train[0], ratings[0][train[2]])
+
+
+def test_evaluate_skips_places_rated_in_training():
+    scorer = EmbeddingScorer(np.zeros((1, 1)), np.zeros((3, 1)), np.zeros(1), np.array([5.0, 4.0, 1.0]))
+    train = (np.array([0]), np.array([0]), np.array([5.0], dtype=np.float32))
+    test = (np.array([0]), np.array([1]), np.array([5.0], dtype=np.float32))
+
+    metrics = evaluate(scorer, train, test, k=1)
+    assert metrics['precision@1'] == 1.0  # Place 0 scores highest but was rated in training
+    assert metrics['rmse'] == pytest.approx(1.0)
+
+
+def test_als_beats_the_mean_on_the_test_split(ratings):
+    train, validation, test = split_ratings(*ratings, seed=0)
+    scorer = train_als(NUM_USERS, NUM_PLACES, train, validation, embedding_size=4, reg=0.05, iterations=10, workers=2)
+
+    mean_rmse = np.sqrt(np.mean((test[2] - train[2].mean()) ** 2))
+    assert evaluate(scorer, merge_splits(train, validation), test)['rmse'] < 0.5 * mean_rmse
+
+
+def test_tfdata_stops_on_validation_and_refits_for_that_many_epochs(ratings):
+    pytest.importorskip('tensorflow')
+    train, validation, _ = split_ratings(*ratings, seed=0)
+
+    model, best_epochs = train_tfdata(NUM_USERS, NUM_PLACES, train, validation, embedding_size=4, epochs=4,
+                                      patience=1, learning_rate=0.05)
+    assert 1 <= best_epochs <= 4
+    assert EmbeddingScorer.from_keras_model(model).num_places == NUM_PLACES
+
+    model, epochs = train_tfdata(NUM_USERS, NUM_PLACES, merge_splits(train, validation), None, embedding_size=4,
+                                 epochs=best_epochs)
+    assert epochs == best_epochs
+    assert len(model.history.epoch) == best_epochs
+
+
+def test_export_writes_the_tflite_metadata(tmp_path):
+    pytest.importorskip('tensorflow')
+    rng = np.random.default_rng(0)
+    scorer = EmbeddingScorer(rng.normal(size=(NUM_USERS, 4)), rng.normal(size=(NUM_PLACES, 4)),
+                             rng.normal(size=NUM_USERS), rng.normal(size=NUM_PLACES))
+    export(scorer, list(range(NUM_USERS)), list(range(NUM_PLACES)), str(tmp_path))
+
+    tflite_scorer = TFLiteScorer(str(tmp_path / 'cf_model.tflite'))
+    assert (tflite_scorer.metadata['user_input'], tflite_scorer.metadata['place_input']) == ('user', 'place')
+    assert (tflite_scorer.num_users, tflite_scorer.num_places) == (NUM_USERS, NUM_PLACES)
+    check_parity(scorer, tflite_scorer, range(NUM_USERS), np.arange(NUM_PLACES))
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from user_profiles import UserProfileStore
+
+
+@pytest.fixture
+def store():
+    ratings = pd.DataFrame({'User_Id': [1, 1, 1, 2], 'Place_Id': [10, 11, 12, 10], 'Place_Ratings': [5, 4, 3, 2]})
+    users = pd.DataFrame({'User_Id': [1, 2, 3], 'Location': ['Bandung', 'Jakarta', 'Bogor'], 'Age': [20, 30, 40]})
+    places = pd.DataFrame({'Place_Id': [10, 11, 12, 13], 'Category': ['Budaya', 'Budaya', 'Bahari', 'Taman Hiburan']})
+    return UserProfileStore(ratings, users, places)
+
+
+def test_profiles_from_the_rating_table(store):
+    assert store.exists(1) and store.exists(2)
+    assert not store.exists(3) and not store.exists('1')
+    assert store.top_categories(1) == ['Budaya', 'Bahari']
+    place_ids, ratings = store.user_ratings(1)
+    assert list(place_ids) == [10, 11, 12]
+    np.testing.assert_array_equal(ratings, [5, 4, 3])
+
+
+def test_add_ratings_with_mixed_id_types(store):
+    store.add_ratings([1, 'abc', 1], [13, 13, 13], [5, 4, 3])
+
+    assert store.user_ids == [1, 2, 'abc']
+    assert '1' not in store.user_row
+    assert store.exists('abc')
+    assert store.top_categories(1) == ['Budaya', 'Taman Hiburan']
+    assert list(store.user_ratings(1)[0]) == [10, 11, 12, 13, 13]
+    assert list(store.user_ratings('abc')[0]) == [13]
+
+
+def test_compact_keeps_every_rating(store):
+    store.add_ratings([2, 7], [11, 12], [1, 2])
+    before = {user_id: store.user_ratings(user_id) for user_id in store.user_ids}
+    store.compact()
+
+    assert not store.pending
+    for user_id, (place_ids, ratings) in before.items():
+        np.testing.assert_array_equal(store.user_ratings(user_id)[0], place_ids)
+        np.testing.assert_array_equal(store.user_ratings(user_id)[1], ratings)
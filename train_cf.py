@@ -0,0 +1,362 @@
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from cf_engine import EmbeddingScorer, TFLiteScorer, check_parity, save_tflite_metadata
+from context import EMBEDDING_SIZE, ServingContext, build_cf_model
+
+# Held-out ratings at or above this count as relevant for precision@k
+RELEVANT_RATING = 4
+
+# Rows per batch of the ALS solves handed to a worker thread
+ALS_CHUNK_ROWS = 1024
+
+# Ridge penalty of the ALS biases; the model has no global mean term, so the
+# biases must be free to carry the mean rating
+ALS_BIAS_REG = 1e-3
+
+
+def load_ratings(context):
+    """
+    Ratings as embedding row indices of the CF model.
+
+    Returns:
+        Arrays of user rows, place rows and ratings.
+    """
+    rating = context.rating
+    users = rating['User_Id'].map(context.user_id_to_index)
+    places = rating['Place_Id'].map(context.place_id_to_index)
+    known = users.notna() & places.notna() & rating['Place_Ratings'].notna()
+    return (
+        users[known].to_numpy(dtype=np.intp),
+        places[known].to_numpy(dtype=np.intp),
+        rating['Place_Ratings'][known].to_numpy(dtype=np.float32)
+    )
+
+
+def split_ratings(users, places, ratings, test_fraction=0.1, validation_fraction=0.1, seed=0):
+    """
+    Random train/validation/test split; each part is a (users, places, ratings) tuple.
+
+    The validation ratings are for model selection (early stopping, watching
+    ALS converge), so the test ratings stay untouched until the final
+    comparison. Both fractions are of all ratings.
+    """
+    order = np.random.default_rng(seed).permutation(len(ratings))
+    num_test = int(len(ratings) * test_fraction)
+    num_validation = int(len(ratings) * validation_fraction)
+    test, validation, train = np.split(order, [num_test, num_test + num_validation])
+    return tuple((users[part], places[part], ratings[part]) for part in (train, validation, test))
+
+
+def merge_splits(*splits):
+    """Concatenate (users, places, ratings) tuples."""
+    return tuple(np.concatenate(arrays) for arrays in zip(*splits))
+
+
+def evaluate(scorer, train, test, k=10):
+    """
+    Held-out accuracy of a CF model.
+
+    precision@k ranks every place a user did not rate in the training split
+    and counts how many of the top k are held-out ratings of at least
+    RELEVANT_RATING, averaged over users with such a rating.
+
+    Args:
+        scorer: EmbeddingScorer to evaluate.
+        train: Ratings the model was fitted or selected on (from
+            split_ratings, see merge_splits); their places are not ranked.
+        test: Held-out ratings.
+        k (int): Cutoff of precision@k.
+
+    Returns:
+        A dict with rmse and precision@k.
+    """
+    test_users, test_places, test_ratings = test
+    predictions = np.einsum('ij,ij->i', scorer.user_embeddings[test_users], scorer.place_embeddings[test_places])
+    predictions += scorer.user_bias[test_users] + scorer.place_bias[test_places]
+    rmse = float(np.sqrt(np.mean((predictions - test_ratings) ** 2))) if len(test_ratings) else float('nan')
+
+    relevant = test_ratings >= RELEVANT_RATING
+    eval_users = np.unique(test_users[relevant])
+    precisions = []
+    for start in range(0, len(eval_users), 1024):
+        users = eval_users[start:start + 1024]
+        scores = scorer.score_batch(users, np.arange(scorer.num_places))
+
+        # Places rated in training are not recommended again
+        row_of_user = {user: row for row, user in enumerate(users)}
+        seen = np.isin(train[0], users)
+        scores[[row_of_user[user] for user in train[0][seen]], train[1][seen]] = -np.inf
+
+        top = np.argpartition(-scores, min(k, scores.shape[1] - 1), axis=1)[:, :k]
+        for row, user in enumerate(users):
+            liked = test_places[(test_users == user) & relevant]
+            precisions.append(np.isin(top[row], liked).sum() / k)
+
+    return {'rmse': rmse, f'precision@{k}': float(np.mean(precisions)) if precisions else float('nan')}
+
+
+def _solve_rows(fixed_vectors, fixed_bias, indptr, columns, targets, reg, workers):
+    """
+    One half-step of ALS: the ridge solution of every row against the fixed side.
+
+    Row r minimizes sum((x_c . [w, b] + fixed_bias[c] - t)^2) + reg * n_r * |w|^2
+    over its ratings (columns c, targets t), with x_c = [fixed_vectors[c], 1].
+    The bias b only gets the small ALS_BIAS_REG penalty.
+
+    The normal equations of all rows are built with two sparse products (the
+    outer products x_c x_c^T are computed once per column, not per rating),
+    and the small systems are solved in batches spread over threads.
+
+    Returns:
+        Vectors of shape (num_rows, k) and biases of shape (num_rows,).
+    """
+    num_rows, num_columns = len(indptr) - 1, len(fixed_vectors)
+    size = fixed_vectors.shape[1] + 1
+    features = np.hstack([fixed_vectors, np.ones((num_columns, 1), dtype=np.float32)])
+
+    indicator = csr_matrix((np.ones(len(columns), dtype=np.float32), columns, indptr), shape=(num_rows, num_columns))
+    residuals = csr_matrix((targets - fixed_bias[columns], columns, indptr), shape=(num_rows, num_columns))
+    outer = (features[:, :, None] * features[:, None, :]).reshape(num_columns, -1)
+
+    gram = np.asarray(indicator @ outer, dtype=np.float32).reshape(num_rows, size, size)
+    rhs = np.asarray(residuals @ features, dtype=np.float32)
+
+    penalty = np.full(size, reg, dtype=np.float32)
+    penalty[-1] = ALS_BIAS_REG
+    counts = np.maximum(np.diff(indptr), 1)
+    gram[:, np.arange(size), np.arange(size)] += counts[:, None] * penalty
+
+    solution = np.empty((num_rows, size), dtype=np.float32)
+
+    def solve_chunk(first):
+        last = first + ALS_CHUNK_ROWS
+        solution[first:last] = np.linalg.solve(gram[first:last], rhs[first:last, :, None])[:, :, 0]
+
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(solve_chunk, range(0, num_rows, ALS_CHUNK_ROWS)))
+
+    return solution[:, :-1], solution[:, -1]
+
+
+def _csr(rows, columns, values, num_rows):
+    order = np.argsort(rows, kind='stable')
+    indptr = np.zeros(num_rows + 1, dtype=np.intp)
+    np.cumsum(np.bincount(rows, minlength=num_rows), out=indptr[1:])
+    return indptr, columns[order], values[order]
+
+
+def train_als(num_users, num_places, train, validation=None, embedding_size=EMBEDDING_SIZE, reg=0.5, iterations=15,
+              workers=None, seed=0, k=10):
+    """
+    Fit the CF model by alternating least squares with biases, in NumPy.
+
+    Each half-step solves every user (then every place) exactly against the
+    other side, as a batch of small ridge regressions split over threads.
+
+    Args:
+        num_users, num_places (int): Sizes of the embedding tables.
+        train: (users, places, ratings) tuple of embedding rows and ratings.
+        validation: Optional held-out tuple, evaluated after each iteration.
+        embedding_size (int): Embedding dimension.
+        reg (float): Ridge penalty, scaled by the number of ratings of each row.
+        iterations (int): Number of user + place sweeps.
+        workers (int): Threads; defaults to the number of CPU cores.
+        seed (int): Seed of the initial embeddings.
+        k (int): Cutoff of the precision@k evaluation.
+
+    Returns:
+        An EmbeddingScorer with the fitted tables.
+    """
+    users, places, ratings = train
+    workers = workers or os.cpu_count() or 1
+    rng = np.random.default_rng(seed)
+
+    user_embeddings = rng.normal(0, 0.1, (num_users, embedding_size)).astype(np.float32)
+    place_embeddings = rng.normal(0, 0.1, (num_places, embedding_size)).astype(np.float32)
+    user_bias = np.zeros(num_users, dtype=np.float32)
+    place_bias = np.full(num_places, ratings.mean(), dtype=np.float32)
+
+    by_user = _csr(users, places, ratings, num_users)
+    by_place = _csr(places, users, ratings, num_places)
+
+    for iteration in range(iterations):
+        user_embeddings, user_bias = _solve_rows(place_embeddings, place_bias, *by_user, reg, workers)
+        place_embeddings, place_bias = _solve_rows(user_embeddings, user_bias, *by_place, reg, workers)
+
+        if validation is not None:
+            metrics = evaluate(EmbeddingScorer(user_embeddings, place_embeddings, user_bias, place_bias), train,
+                               validation, k)
+            print(f"ALS iteration {iteration + 1}: " + ', '.join(f"{name} {value:.4f}" for name, value in metrics.items()))
+
+    return EmbeddingScorer(user_embeddings, place_embeddings, user_bias, place_bias)
+
+
+def train_tfdata(num_users, num_places, train, validation=None, embedding_size=EMBEDDING_SIZE, batch_size=1024,
+                 epochs=200, patience=5, learning_rate=0.01, seed=0):
+    """
+    Fit the Keras CF model from a tf.data pipeline with early stopping on the validation ratings.
+
+    Args:
+        num_users, num_places (int): Sizes of the embedding tables.
+        train, validation: (users, places, ratings) tuples of embedding rows
+            and ratings. Without validation ratings, the model is trained for
+            exactly `epochs` epochs (e.g. to refit on every rating for the
+            number of epochs early stopping picked).
+        embedding_size (int): Embedding dimension.
+        batch_size (int): Ratings per batch.
+        epochs (int): Upper bound on the number of epochs.
+        patience (int): Epochs without a better validation loss before stopping.
+        learning_rate (float): Adam learning rate.
+        seed (int): Seed of the shuffling and initialization.
+
+    Returns:
+        The trained Keras model (with the weights of its best epoch), and the
+        number of epochs of that best epoch.
+    """
+    import tensorflow as tf
+
+    tf.keras.utils.set_random_seed(seed)
+
+    def dataset(split, shuffle):
+        users, places, ratings = split
+        data = tf.data.Dataset.from_tensor_slices(((users[:, None].astype(np.float32), places[:, None].astype(np.float32)),
+                                                   ratings[:, None])).cache()
+        if shuffle:
+            data = data.shuffle(len(ratings), seed=seed, reshuffle_each_iteration=True)
+        return data.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+    cf_model = build_cf_model(num_users, num_places, embedding_size)
+    cf_model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate), loss='mean_squared_error')
+    if validation is None:
+        cf_model.fit(dataset(train, shuffle=True), epochs=epochs, verbose=2)
+        return cf_model, epochs
+
+    history = cf_model.fit(
+        dataset(train, shuffle=True),
+        validation_data=dataset(validation, shuffle=False),
+        epochs=epochs,
+        callbacks=[tf.keras.callbacks.EarlyStopping(patience=patience, restore_best_weights=True)],
+        verbose=2
+    )
+    return cf_model, int(np.argmin(history.history['val_loss'])) + 1
+
+
+def export(scorer, user_ids, place_ids, output_dir, keras_model=None):
+    """
+    Write the artifacts the server reads: cf_model.h5, cf_model.tflite (with its metadata) and cf_embeddings.npz.
+
+    Args:
+        scorer: EmbeddingScorer with the trained tables.
+        user_ids, place_ids: Ids of the embedding rows.
+        output_dir (str): Directory to write to (e.g. Model).
+        keras_model: The trained Keras model, if training produced one; otherwise
+            one is built from the tables.
+    """
+    import tensorflow as tf
+
+    os.makedirs(output_dir, exist_ok=True)
+    scorer.save(os.path.join(output_dir, 'cf_embeddings.npz'), user_ids, place_ids)
+
+    if keras_model is None:
+        keras_model = build_cf_model(scorer.num_users, scorer.num_places, scorer.user_embeddings.shape[1])
+        set_embedding_weights(keras_model, scorer)
+    keras_model.save(os.path.join(output_dir, 'cf_model.h5'))
+
+    tflite_path = os.path.join(output_dir, 'cf_model.tflite')
+    with open(tflite_path, 'wb') as f:
+        f.write(tf.lite.TFLiteConverter.from_keras_model(keras_model).convert())
+
+    # The serving signature names its inputs after the Keras inputs (user first, see build_cf_model)
+    user_input, place_input = (tensor.name for tensor in keras_model.inputs)
+    save_tflite_metadata(tflite_path, user_input, place_input, scorer.num_users, scorer.num_places)
+
+    # Make sure the converted model scores like the tables
+    users = range(min(scorer.num_users, 32))
+    difference = check_parity(scorer, TFLiteScorer(tflite_path), users, np.arange(scorer.num_places))
+    if difference > 1e-3:
+        raise ValueError(f"Exported TFLite model differs from the embeddings by {difference:.2e}")
+
+
+def set_embedding_weights(keras_model, scorer):
+    """Load the tables of an EmbeddingScorer into a model built by build_cf_model."""
+    user_input = keras_model.inputs[0]
+    tables = {
+        ('user', 'embeddings'): scorer.user_embeddings,
+        ('place', 'embeddings'): scorer.place_embeddings,
+        ('user', 'bias'): scorer.user_bias[:, None],
+        ('place', 'bias'): scorer.place_bias[:, None]
+    }
+    for layer in keras_model.layers:
+        if not hasattr(layer, 'output_dim') or not hasattr(layer, 'input_dim'):
+            continue
+        side = 'user' if layer.input is user_input else 'place'
+        kind = 'bias' if layer.output_dim == 1 else 'embeddings'
+        layer.set_weights([tables[(side, kind)]])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the collaborative filtering model and export its artifacts.")
+    parser.add_argument('backend', choices=['als', 'tfdata', 'compare'],
+                        help="Trainer to run; 'compare' runs both and exports nothing")
+    parser.add_argument('--data-dir', default='Data')
+    parser.add_argument('--output-dir', default='Model')
+    parser.add_argument('--test-fraction', type=float, default=0.1, help="Ratings held out for the reported metrics")
+    parser.add_argument('--validation-fraction', type=float, default=0.1,
+                        help="Ratings held out for early stopping and per-iteration monitoring")
+    parser.add_argument('--k', type=int, default=10, help="Cutoff of precision@k")
+    parser.add_argument('--embedding-size', type=int, default=EMBEDDING_SIZE)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--als-reg', type=float, default=0.5)
+    parser.add_argument('--als-iterations', type=int, default=15)
+    parser.add_argument('--workers', type=int, default=None, help="ALS threads (default: CPU cores)")
+    parser.add_argument('--batch-size', type=int, default=1024)
+    parser.add_argument('--epochs', type=int, default=200)
+    parser.add_argument('--patience', type=int, default=5)
+    parser.add_argument('--learning-rate', type=float, default=0.01)
+    args = parser.parse_args()
+
+    context = ServingContext(data_dir=args.data_dir)
+    num_users, num_places = len(context.user_ids), len(context.place_ids)
+    ratings = load_ratings(context)
+    train, validation, test = split_ratings(*ratings, test_fraction=args.test_fraction,
+                                            validation_fraction=args.validation_fraction, seed=args.seed)
+    print(f"{num_users} users, {num_places} places, {len(train[2])} training / {len(validation[2])} validation / "
+          f"{len(test[2])} test ratings")
+
+    def fit(backend, train, validation, epochs):
+        if backend == 'als':
+            return train_als(num_users, num_places, train, validation, args.embedding_size, args.als_reg,
+                             args.als_iterations, args.workers, args.seed, args.k), None, None
+        keras_model, best_epochs = train_tfdata(num_users, num_places, train, validation, args.embedding_size,
+                                                args.batch_size, epochs, args.patience, args.learning_rate, args.seed)
+        return EmbeddingScorer.from_keras_model(keras_model), keras_model, best_epochs
+
+    results = {}
+    for backend in (['als', 'tfdata'] if args.backend == 'compare' else [args.backend]):
+        start = time.perf_counter()
+        scorer, keras_model, best_epochs = fit(backend, train, validation, args.epochs)
+        seconds = time.perf_counter() - start
+
+        # Test ratings were used neither for fitting nor for early stopping
+        results[backend] = {'seconds': seconds, **evaluate(scorer, merge_splits(train, validation), test, args.k)}
+        if args.backend != 'compare':
+            # The metrics above are of the model fitted without the held-out ratings; the
+            # exported one is refitted on all of them with the same settings (and epochs)
+            print(f"Refitting {backend} on all {len(ratings[2])} ratings for export")
+            scorer, keras_model, _ = fit(backend, ratings, None, best_epochs)
+            export(scorer, context.user_ids, context.place_ids, args.output_dir, keras_model)
+            print(f"Exported cf_model.h5, cf_model.tflite and cf_embeddings.npz to {args.output_dir}")
+
+    for backend, metrics in results.items():
+        print(f"{backend:>7} (test split): " + ', '.join(f"{name} {value:.4f}" for name, value in metrics.items()))
+
+
+if __name__ == '__main__':
+    # Standalone training:  python train_cf.py als|tfdata|compare [options]
+    main()
@@ -0,0 +1,186 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+class UserProfileStore:
+    """
+    Per-user rating history and category preferences in compact arrays.
+
+    Ratings are stored CSR-style: the ratings of user row u are
+    place_ids[indptr[u]:indptr[u + 1]] and ratings[indptr[u]:indptr[u + 1]].
+    Alongside them the store keeps a (users x categories) count matrix, the
+    top categories of every user, and an existence bitmap over integer user
+    ids, so checking a user and picking their categories are O(1) per request.
+
+    New ratings go to a small per-user pending buffer and are counted
+    immediately; compact() folds the buffer into the CSR arrays.
+    """
+
+    def __init__(self, ratings, users, places, top_n=2):
+        """
+        Args:
+            ratings: DataFrame with User_Id, Place_Id and Place_Ratings columns
+                (tourism_rating.csv).
+            users: DataFrame with User_Id, Location and Age columns (user.csv).
+            places: DataFrame with Place_Id and Category columns (e.g. merged_final).
+            top_n (int): Number of top categories kept per user.
+        """
+        self.top_n = top_n
+        self._lock = threading.Lock()
+
+        places = places.drop_duplicates('Place_Id')
+        self.categories = sorted(places['Category'].dropna().unique())
+        category_to_code = {category: code for code, category in enumerate(self.categories)}
+        self.place_category = {
+            place_id: category_to_code[category]
+            for place_id, category in zip(places['Place_Id'], places['Category'])
+            if category in category_to_code
+        }
+
+        self.user_ids = list(pd.unique(ratings['User_Id']))
+        self.user_row = {user_id: row for row, user_id in enumerate(self.user_ids)}
+
+        rows = ratings['User_Id'].map(self.user_row).to_numpy()
+        order = np.argsort(rows, kind='stable')
+        self.indptr = np.zeros(len(self.user_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(self.user_ids)), out=self.indptr[1:])
+        self.place_ids = ratings['Place_Id'].to_numpy()[order]
+        self.ratings = pd.to_numeric(ratings['Place_Ratings'], errors='coerce').to_numpy(dtype=np.float32)[order]
+        self.pending = {}  # user row -> list of (place_id, rating) not yet in the CSR arrays
+
+        self.category_counts = np.zeros((len(self.user_ids), len(self.categories)), dtype=np.int32)
+        codes = np.array([self.place_category.get(place_id, -1) for place_id in self.place_ids], dtype=np.intp)
+        user_rows = np.repeat(np.arange(len(self.user_ids)), np.diff(self.indptr))
+        known = codes >= 0
+        np.add.at(self.category_counts, (user_rows[known], codes[known]), 1)
+        self.top_category_codes = self._rank_categories(self.category_counts)
+
+        self.exists_bitmap = np.zeros(0, dtype=bool)
+        self._mark_existing(self.user_ids)
+
+        users = users.drop_duplicates('User_Id').set_index('User_Id')
+        self.user_attributes = users[['Location', 'Age']].to_dict(orient='index')
+
+    def _rank_categories(self, counts):
+        """Top category codes per row (most rated first, ties alphabetical), -1 where a user has fewer."""
+        order = np.argsort(-counts, axis=1, kind='stable')[:, :self.top_n]
+        ranked = np.take_along_axis(counts, order, axis=1)
+        return np.where(ranked > 0, order, -1)
+
+    def _mark_existing(self, user_ids):
+        int_ids = [user_id for user_id in user_ids if _is_int(user_id) and user_id >= 0]
+        if not int_ids:
+            return
+        size = max(int_ids) + 1
+        if size > len(self.exists_bitmap):
+            bitmap = np.zeros(size, dtype=bool)
+            bitmap[:len(self.exists_bitmap)] = self.exists_bitmap
+            self.exists_bitmap = bitmap
+        self.exists_bitmap[int_ids] = True
+
+    def exists(self, user_id):
+        """Whether the user has any ratings."""
+        if _is_int(user_id):
+            return 0 <= user_id < len(self.exists_bitmap) and bool(self.exists_bitmap[user_id])
+        try:
+            return user_id in self.user_row
+        except TypeError:
+            return False
+
+    def top_categories(self, user_id):
+        """The user's most frequently rated categories, most frequent first."""
+        row = self.user_row.get(user_id) if self.exists(user_id) else None
+        if row is None:
+            return []
+        return [self.categories[code] for code in self.top_category_codes[row] if code >= 0]
+
+    def user_ratings(self, user_id):
+        """
+        All ratings of a user, including ones not yet compacted.
+
+        Returns:
+            Arrays of place ids and ratings.
+        """
+        with self._lock:
+            row = self.user_row.get(user_id) if self.exists(user_id) else None
+            if row is None:
+                return np.empty(0, dtype=self.place_ids.dtype), np.empty(0, dtype=np.float32)
+
+            start, stop = self.indptr[row], self.indptr[row + 1]
+            place_ids, ratings = self.place_ids[start:stop], self.ratings[start:stop]
+            if row in self.pending:
+                pending_places, pending_ratings = zip(*self.pending[row])
+                place_ids = np.concatenate([place_ids, pending_places])
+                ratings = np.concatenate([ratings, np.asarray(pending_ratings, dtype=np.float32)])
+            return place_ids, ratings
+
+    def add_ratings(self, user_ids, place_ids, ratings):
+        """
+        Record new ratings, updating existence and top categories of the affected users only.
+
+        Args:
+            user_ids, place_ids, ratings: Equal-length sequences, one entry per rating.
+        """
+        with self._lock:
+            # Unique ids in order, each keeping its own type: a NumPy array of
+            # 1 and 'abc' would turn 1 into the new user '1'
+            new_users = [user_id for user_id in dict.fromkeys(user_ids) if user_id not in self.user_row]
+            if new_users:
+                for user_id in new_users:
+                    self.user_row[user_id] = len(self.user_ids)
+                    self.user_ids.append(user_id)
+                self.indptr = np.concatenate([self.indptr, np.full(len(new_users), self.indptr[-1])])
+                self.category_counts = np.vstack([
+                    self.category_counts, np.zeros((len(new_users), len(self.categories)), dtype=np.int32)
+                ])
+                self.top_category_codes = np.vstack([
+                    self.top_category_codes, np.full((len(new_users), self.top_n), -1)
+                ])
+
+            touched = set()
+            for user_id, place_id, rating in zip(user_ids, place_ids, ratings):
+                row = self.user_row[user_id]
+                self.pending.setdefault(row, []).append((place_id, float(rating)))
+                code = self.place_category.get(place_id)
+                if code is not None:
+                    self.category_counts[row, code] += 1
+                touched.add(row)
+
+            touched = np.fromiter(touched, dtype=np.intp)
+            self.top_category_codes[touched] = self._rank_categories(self.category_counts[touched])
+            self._mark_existing(new_users)
+
+    def compact(self):
+        """Fold the pending ratings into the CSR arrays."""
+        with self._lock:
+            if not self.pending:
+                return
+
+            counts = np.diff(self.indptr)
+            extra = np.zeros(len(counts), dtype=np.int64)
+            for row, entries in self.pending.items():
+                extra[row] = len(entries)
+
+            indptr = np.zeros(len(counts) + 1, dtype=np.int64)
+            np.cumsum(counts + extra, out=indptr[1:])
+            place_ids = np.empty(indptr[-1], dtype=self.place_ids.dtype)
+            ratings = np.empty(indptr[-1], dtype=np.float32)
+
+            # Existing ratings keep their relative order, each user's pending ones follow
+            old_positions = np.arange(len(self.place_ids)) + np.repeat(indptr[:-1] - self.indptr[:-1], counts)
+            place_ids[old_positions] = self.place_ids
+            ratings[old_positions] = self.ratings
+            for row, entries in self.pending.items():
+                start = indptr[row] + counts[row]
+                pending_places, pending_ratings = zip(*entries)
+                place_ids[start:start + len(entries)] = pending_places
+                ratings[start:start + len(entries)] = pending_ratings
+
+            self.indptr, self.place_ids, self.ratings = indptr, place_ids, ratings
+            self.pending = {}
+
+
+def _is_int(value):
+    return isinstance(value, (int, np.integer)) and not isinstance(value, bool)
@@ -0,0 +1,27 @@
+"""
+WSGI entry point for production serving:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+With preload_app (see gunicorn.conf.py) this module is imported once in the
+gunicorn master. It loads the catalog, indexes and CF embeddings there, and the
+workers forked afterwards share that memory copy-on-write instead of each
+loading its own copy.
+"""
+import gc
+import logging
+import os
+
+from app import create_app
+
+# Application logs go to stderr next to gunicorn's error log; LOG_LEVEL=DEBUG
+# also logs per-request details and stage timings
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
+                    format='%(asctime)s [%(process)d] %(levelname)s %(name)s: %(message)s')
+
+app = create_app(warm_up_on_start=os.environ.get('WARM_UP', '1') == '1')
+
+# Move everything loaded so far out of the garbage collector's generations.
+# Collections in the workers then never write to these objects' headers, which
+# would otherwise copy the shared pages into every worker.
+gc.freeze()